@@ -1,11 +1,17 @@
 import xarray as xr
 import numpy as np
 import pandas as pd
+import logging
 
 from OceInterp.topology import topology
-from OceInterp.utils import create_tree
+from OceInterp.spatial_index import create_index,auto_index_type
+from OceInterp.grid_cache import GridCache,grid_fingerprint
+from OceInterp.RuntimeConf import rcParam
+from OceInterp.get_masks import MaskManager
 from OceInterp.lat2ind import *
 
+logger = logging.getLogger(__name__)
+
 no_alias = {
     'XC':'XC',
     'YC':'YC',
@@ -27,8 +33,17 @@ no_alias = {
 class OceData(object):
     def __init__(self,data,
                  alias = None,
-                 memory_limit = 1e7):
+                 memory_limit = 1e7,
+                 index = 'auto',# or 'tree','bucket','rectilinear', see spatial_index.create_index
+                 cache_dir = None,# default to rcParam['grid_cache_dir']
+                 cache_key = None# name the grid in the cache yourself, see grid_cache.grid_fingerprint
+                ):
         self._ds = data
+        self.index_type = index
+        if cache_dir is None:
+            cache_dir = rcParam['grid_cache_dir']
+        self.cache_dir = cache_dir
+        self.cache_key = cache_key
         self.tp = topology(data)
         if alias == None:
             self.alias = no_alias
@@ -38,17 +53,20 @@ class OceData(object):
             self.alias = alias
             
         self.too_large = self._ds['XC'].nbytes>memory_limit
+        self.masks = MaskManager(self)
+        self.var_info = dict()
         ready,missing = self.check_readiness()
         if ready:
             self.grid2array()
         else:
-            print(f'''
+            logger.warning(f'''
             use add_missing_variables or set_alias to create {missing},
             then call OceData.grid2array.
             ''')
 
     def __setitem__(self, key, item):
         if isinstance(item,xr.DataArray):
+            self.__dict__.get('var_info',dict()).pop(self.alias.get(key,key),None)
             if key in self.alias.keys():
                 self._ds[self.alias[key]] = item
             else:
@@ -65,6 +83,47 @@ class OceData(object):
             else:
                 return self._ds[key]
     
+    def describe(self,varName):
+        '''
+        what interpolation needs to know about a variable,
+        worked out from the dataset the first time and kept in var_info.
+        Setting the variable through OceData.__setitem__ forgets it.
+        '''
+        var_info = self.__dict__.setdefault('var_info',dict())
+        if varName in var_info.keys():
+            return var_info[varName]
+        da = self._ds[varName]
+        raw_dims = tuple(da.dims)
+        dims = tuple([i[:1] if i in ['Xp1','Yp1'] else i for i in raw_dims])
+        if 'Zl' in dims:
+            vertical,mask,bottom_scheme = 'Zl','Wvel',None
+        elif 'Z' in dims:
+            vertical,mask,bottom_scheme = 'Z','C','no_flux'
+        else:
+            vertical,mask,bottom_scheme = None,'C','no_flux'
+        horizontal = 'X' in dims and 'Y' in dims
+        if not horizontal:
+            mask = None
+        chunks = da.chunks
+        info = {
+            'raw_dims':raw_dims,
+            'dims':dims,
+            'rx_shift':0.5 if 'Xp1' in raw_dims else 0.,
+            'ry_shift':0.5 if 'Yp1' in raw_dims else 0.,
+            'vertical':vertical,
+            'time':'time' in dims,
+            'horizontal':horizontal,
+            'mask':mask,
+            'bottom_scheme':bottom_scheme,
+            # which of the index arrays the mask is looked up with
+            'mask_axes':tuple([i for i,dim in enumerate(dims) if dim != 'time']),
+            'shape':tuple(da.shape),
+            'dtype':da.dtype,
+            'chunks':None if chunks is None else tuple([len(c) for c in chunks]),
+        }
+        var_info[varName] = info
+        return info
+
     def check_readiness(self):
         # TODO:
         return True,[]
@@ -104,9 +163,51 @@ class OceData(object):
             self['CS'] = cs
             self['SN'] = sn
         
+    def grid_cache(self):
+        '''
+        the on-disk cache of this grid,
+        None if rcParam['grid_cache_dir'] is not set.
+        '''
+        if self.cache_dir is None:
+            return None
+        return GridCache(self.cache_dir,grid_fingerprint(self,key = self.cache_key))
+
     def grid2array(self,all_of_them = False):
+        cache = self.grid_cache()
+        self.cache = cache
+        if cache is not None and cache.load_grid(self):
+            if self.too_large:
+                logger.info('numpy arrays of grid loaded from cache')
+        else:
+            self.load_grid_arrays()
+            if cache is not None:
+                cache.save_grid(self)
+        
+        self.t_base = 0
+        self.ts = np.array(self['time'])
+        self.ts = (self.ts).astype(float)/1e9
+        try:
+            self.time_midp = np.array(self['time_midp'])
+            self.time_midp = (self.time_midp).astype(float)/1e9
+        except:
+            self.time_midp = (self.ts[1:]+self.ts[:-1])/2
+        
+        self.index = None
+        self._corners = None
+        if self.index_type == 'auto':
+            self.index_type = auto_index_type(self.XC,self.YC)
+        if cache is not None and isinstance(self.index_type,str):
+            self.index = cache.load_index(self.index_type)
+        if self.index is None:
+            self.index = create_index(self.XC,self.YC,self.index_type)
+            if cache is not None and isinstance(self.index_type,str):
+                cache.save_index(self.index_type,self.index)
+            if self.too_large:
+                logger.info('spatial index created')
+
+    def load_grid_arrays(self):
         if self.too_large:
-            print("Loading grid into memory, it's a large dataset please be patient")
+            logger.info("Loading grid into memory, it's a large dataset please be patient")
         self.Z = np.array(self['Z'])
         self.dZ = np.array(self['dZ'])
         self.Zl = np.array(self['Zl'])
@@ -125,28 +226,16 @@ class OceData(object):
         self.CS = np.array(self['CS']).astype('float32')
         self.SN = np.array(self['SN']).astype('float32')
         
-        self.t_base = 0
-        self.ts = np.array(self['time'])
-        self.ts = (self.ts).astype(float)/1e9
-        try:
-            self.time_midp = np.array(self['time_midp'])
-            self.time_midp = (self.time_midp).astype(float)/1e9
-        except:
-            self.time_midp = (self.ts[1:]+self.ts[:-1])/2
-        
         # add optional ones here
         if not self.too_large:
             for var in ['XG','YG','dX','dY','rA']:
                 try:
                     self[var] = np.array(self[var]).astype('float32')
                 except:
-                    print(f'no {var} in dataset, skip')
+                    logger.info(f'no {var} in dataset, skip')
         
         if self.too_large:
-            print('numpy arrays of grid loaded into memory')
-        self.tree = create_tree(self.XC,self.YC)  
-        if self.too_large:
-            print('cKD created')
+            logger.info('numpy arrays of grid loaded into memory')
 
     def find_rel_h(self,x,y):
         # give find_rel_h a new cover
@@ -156,15 +245,31 @@ class OceData(object):
                                                                            self.dX,self.dY,
                                                                            self.CS,self.SN,
                                                                            self.XG,self.YG,
-                                                                           self.tree,self.tp)
+                                                                           self.index,self.tp,
+                                                                           table = self.corners(build = False))
         except AttributeError:
             faces,iys,ixs,rx,ry,cs,sn,dx,dy,bx,by = find_rel_h_naive(x,y,
                                                      self.XC,self.YC,
                                                      self.dX,self.dY,
                                                      self.CS,self.SN,
-                                                     self.tree)
+                                                     self.index)
         return faces,iys,ixs,rx,ry,cs,sn,dx,dy,bx,by
     
+    def corners(self,build = True):
+        '''
+        the corners of every cell (see lat2ind.corner_table),
+        about 64 bytes per cell, made the first time it is asked for
+        with build = True (particle.get_px_py does, every step).
+        With build = False it is only returned if it already exists,
+        locating points once does not pay for making it.
+        None if the grid is too large to keep it in memory.
+        '''
+        if self.too_large:
+            return None
+        if self.__dict__.get('_corners') is None and build:
+            self._corners = corner_table(self.XG,self.YG,self.tp)
+        return self.__dict__.get('_corners')
+
     def find_rel_vl(self,t):
         iz,rz,dz,bz = find_rel_nearest(t,self.Zl)
         return iz.astype(int),rz,dz,bz
@@ -194,7 +299,7 @@ class OceData(object):
                                                      self.XC,self.YC,
                                                      self.dX,self.dY,
                                                      self.CS,self.SN,
-                                                     self.tree)
+                                                     self.index)
         iz,rz,dz,bz = find_rel_z(z,self.Zl,self.dZl)
         iz = iz.astype(int)
         return iz.astype(int),faces,iys,ixs,rx,ry,rz,cs,sn,dx,dy,dz,bx,by,bz
@@ -204,7 +309,7 @@ class OceData(object):
                                                      self.XC,self.YC,
                                                      self.dX,self.dY,
                                                      self.CS,self.SN,
-                                                     self.tree)
+                                                     self.index)
         iz,rz,dz,bz = find_rel_z(z,self.Zl,self.dZl)
         iz = iz.astype(int)
         it,rt,dt,bt = find_rel_time(t,self.ts)
@@ -2,19 +2,62 @@ from OceInterp.lagrangian import particle,uknw,vknw
 from OceInterp.eulerian import position
 from OceInterp.OceData import OceData
 from OceInterp.kernelNweight import KnW
+from OceInterp.stream import eulerian_stream,point_bytes
+from OceInterp.lazy import eulerian_lazy,default_partition_size
+from OceInterp.profiler import profiled
 
 import numpy as np
 import warnings
+import logging
+
+logger = logging.getLogger(__name__)
 
 lagrange_token = '__particle.'
 
+def _var_kernel_lists(varList,kernelList,kernel_kwarg):
+    '''
+    turn whatever is passed in into a list of variables
+    and a list of kernels of the same length.
+    '''
+    if isinstance(varList,dict):
+        kernelList = list(varList.values())
+        varList    = list(varList.keys())
+        logger.info(f"result will be in the order of {varList}")
+    elif isinstance(varList,str):
+        varList = [varList]
+    elif isinstance(varList,list):
+        pass
+    else:
+        raise Exception("varList type not recognized.")
+
+    if isinstance(kernelList,list):
+        pass
+    elif kernelList is None:
+        kernelList = []
+        the_kernel = KnW(**kernel_kwarg)
+        for i in varList:
+            if isinstance(i,str):
+                kernelList.append(the_kernel)
+            elif isinstance(i,list):
+                if kernel_kwarg != dict():
+                    kernelList.append([the_kernel,the_kernel])
+                else:
+                    kernelList.append([uknw,vknw])
+    return varList,kernelList
+
+@profiled
 def OceInterp(od,varList,x,y,z,t,
               kernelList = None,
               lagrangian = False,
               lagrange_kwarg = {},
+              checkpoint_kwarg = {},
               update_stops = 'default',
               return_in_between  =True,
               return_pt_time = True,
+              batch_memory = None,
+              out = None,
+              reorder = False,
+              lazy = False,
               **kernel_kwarg):
     '''
     The center piece function of the package, from here 
@@ -39,6 +82,10 @@ def OceInterp(od,varList,x,y,z,t,
     lagrange_kwarg: dict
         keyward argument passed into the OceInterp.lagrangia
         n.particle object.
+    checkpoint_kwarg: dict
+        checkpoint, checkpoint_every and resume passed into
+        particle.to_list_of_time, to save the particles
+        every few stops and restart from there.
     update_stops: None, 'defalut', iterable of float
         time to update the prefetch the velocity.
     return_in_between: bool
@@ -46,37 +93,47 @@ def OceInterp(od,varList,x,y,z,t,
         at t, but also at whenever the speed is updated.
     return_pt_time: bool
         whether to return time of all the steps.
+    batch_memory: None or float
+        in Eulerian scheme, do the interpolation batch by batch,
+        using roughly this many bytes at a time.
+        See OceInterp.stream.
+        In Lagrangian scheme, the snapshots are interpolated
+        together, this caps how many of them at a time.
+    out: None, str or list
+        where the results of the batches are written,
+        a directory name means memory-mapped .npy files.
+    reorder: bool
+        in Eulerian scheme, sort the points by time, face,
+        chunk and location before reading the data,
+        the results are still in the original order.
+    lazy: bool
+        in Eulerian scheme, return dask arrays instead,
+        each chunk of points is one task. The chunk size
+        is set by batch_memory if given. See OceInterp.lazy.
+        (the dask arrays are computed after the call returns,
+        so rcParam['profile'] only sees the graph being built.)
     '''
     if not isinstance(od,OceData):
         od = OceData(od)
 
-    if isinstance(varList,dict):
-        kernelList = list(varList.values())
-        varList    = list(varList.keys())
-        print(f"result will be in the order of {varList}")
-    elif isinstance(varList,str):
-        varList = [varList]
-    elif isinstance(varList,list):
-        pass
-    else:
-        raise Exception("varList type not recognized.")
-
-    if isinstance(kernelList,list):
-        pass
-    elif kernelList is None:
-        kernelList = []
-        the_kernel = KnW(**kernel_kwarg)
-        for i in varList:
-            if isinstance(i,str):
-                kernelList.append(the_kernel)
-            elif isinstance(i,list):
-                if kernel_kwarg != dict():
-                    kernelList.append([the_kernel,the_kernel])
-                else:
-                    kernelList.append([uknw,vknw])
+    varList,kernelList = _var_kernel_lists(varList,kernelList,kernel_kwarg)
     if not lagrangian:
+        if batch_memory is not None or lazy:
+            for var in varList:
+                if lagrange_token in var:
+                    raise AttributeError('__particle variables is only available for Lagrangian particles')
+        if lazy:
+            if batch_memory is None:
+                partition_size = default_partition_size
+            else:
+                partition_size = batch_memory//point_bytes(kernelList)
+            return eulerian_lazy(od,varList,kernelList,x,y,z,t,
+                                 partition_size = partition_size,reorder = reorder)
+        if batch_memory is not None:
+            return eulerian_stream(od,varList,kernelList,x,y,z,t,
+                                   batch_memory,out = out,reorder = reorder)
         pt = position()
-        pt.from_latlon(x = x,y=y,z=z,t=t,data = od)
+        pt.from_latlon(x = x,y=y,z=z,t=t,data = od,reorder = reorder)
         R = []
         for i,var in enumerate(varList):
             if lagrange_token in var:
@@ -92,9 +149,14 @@ def OceInterp(od,varList,x,y,z,t,
         t_start = t[0]
         t_nec = t[1:]
         pt = particle(x = x,y=y,z=z,t=np.ones_like(x)*t_start,data = od,**lagrange_kwarg)
+        keep = [var[len(lagrange_token):] for var in varList
+                if isinstance(var,str) and var.startswith(lagrange_token)
+                and var != lagrange_token+'raw']
         stops,raw = pt.to_list_of_time(t_nec,
                                        update_stops = update_stops,
-                                       return_in_between = return_in_between)
+                                       return_in_between = return_in_between,
+                                       snapshot_fields = keep,
+                                       **checkpoint_kwarg)
         R = []
         for i,var in enumerate(varList):
             if var == lagrange_token+'raw':
@@ -105,10 +167,7 @@ def OceInterp(od,varList,x,y,z,t,
                     sublist.append(snap.__dict__[var[len(lagrange_token):]])
                 R.append(sublist)
             else:
-                sublist = []
-                for snap in raw:
-                    sublist.append(snap.interpolate(var,kernelList[i]))
-                R.append(sublist)
+                R.append(raw.interpolate(var,kernelList[i],batch_memory = batch_memory))
                 
         if return_pt_time:
             return stops,R
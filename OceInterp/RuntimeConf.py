@@ -1,5 +1,23 @@
 rcParam = {
     'compilable':True,
     'debug_level':'not that high',
-    'dump_masks_to_local':False,
-}
\ No newline at end of file
+    'dump_masks_to_local':False,# keep derived masks in the grid cache, needs grid_cache_dir
+    'grid_cache_dir':None,# a directory to keep the grid and spatial index between sessions
+    'precision':'float64',# or 'float32' for weights, stencils and relative coordinates
+    'profile':False,# record timers and counters, see OceInterp.profiler
+    'progress':False,# default of particle(progress = ...), see OceInterp.progress
+    'progress_interval':10.,# least seconds between two progress reports
+}
+
+def working_float():
+    '''
+    the float type of weights, gathered stencils,
+    relative coordinates and particle velocities.
+    Absolute time, lon and lat are always float64.
+    float32 particles drift away from float64 ones step after step,
+    it is not meant for long integrations,
+    see benchmarks/precision_drift.py.
+    '''
+    if rcParam['precision'] not in ['float32','float64']:
+        raise ValueError("rcParam['precision'] can only be 'float32' or 'float64'")
+    return rcParam['precision']
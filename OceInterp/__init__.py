@@ -2,6 +2,7 @@ from OceInterp.OceData import OceData
 from OceInterp.eulerian import position
 from OceInterp.lagrangian import particle
 from OceInterp.OceInterp import OceInterp
+from OceInterp.regrid import OceRegrid
 from OceInterp.topology import topology
 from OceInterp.kernelNweight import KnW
 from OceInterp.RuntimeConf import rcParam
\ No newline at end of file
@@ -0,0 +1,184 @@
+import numpy as np
+from numba import njit
+
+# Masks are 0 or 1, storing them as float64 (or even bool) is a waste.
+# Two compact forms are here, both read level by level when built,
+# and both answer "is this node wet" with a compiled lookup.
+# A mask is anything with a shape whose levels mask[k] can be read
+# one at a time: numpy array, DataArray, get_masks.DerivedMask,
+# or one of the compact forms themselves.
+# index passed to lookup is a tuple of integer arrays like the ones
+# passed to smart_read, the first one being the vertical index.
+
+@njit
+def _flat_h_index(ind,h_shape,n):
+    '''
+    the flattened horizontal index of each point,
+    negative index counts from the end like numpy,
+    -1 if out of range.
+    '''
+    flat = np.empty(n,np.int64)
+    for j in range(n):
+        f = 0
+        for d in range(len(h_shape)):
+            i = ind[d+1,j]
+            if i<0:
+                i+=h_shape[d]
+            if i<0 or i>=h_shape[d]:
+                f = -1
+                break
+            f = f*h_shape[d]+i
+        flat[j] = f
+    return flat
+
+@njit
+def _packed_lookup(bits,ind,h_shape):
+    n = ind.shape[1]
+    nz = bits.shape[0]
+    flat = _flat_h_index(ind,h_shape,n)
+    wet = np.zeros(n,np.uint8)
+    for j in range(n):
+        k = ind[0,j]
+        if k<0:
+            k+=nz
+        if flat[j]<0 or k<0 or k>=nz:
+            continue
+        wet[j] = (bits[k,flat[j]>>3]>>(7-(flat[j]&7)))&1
+    return wet
+
+@njit
+def _kmt_lookup(kmt,ind,h_shape,nz):
+    n = ind.shape[1]
+    flat = _flat_h_index(ind,h_shape,n)
+    wet = np.zeros(n,np.uint8)
+    for j in range(n):
+        k = ind[0,j]
+        if k<0:
+            k+=nz
+        if flat[j]<0 or k<0 or k>=nz:
+            continue
+        if k<kmt[flat[j]]:
+            wet[j] = 1
+    return wet
+
+def _stack_index(ind):
+    the_shape = np.shape(ind[0])
+    ind = np.array([np.asarray(i).ravel() for i in np.broadcast_arrays(*ind)]).astype('int64')
+    return ind,the_shape
+
+def _packed_level(level):
+    return np.packbits(np.asarray(level).ravel()!=0)
+
+class PackedMask(object):
+    '''
+    1 bit per node, each level packed separately.
+    Works for any mask.
+    When the packed bits are given, mask can just be its shape.
+    '''
+    def __init__(self,mask,bits = None):
+        self.shape = tuple(mask) if isinstance(mask,tuple) else tuple(mask.shape)
+        self.h_shape = np.array(self.shape[1:],'int64')
+        if bits is None:
+            nh = int(np.prod(self.shape[1:]))
+            bits = np.empty((self.shape[0],(nh+7)//8),'uint8')
+            for k in range(self.shape[0]):
+                bits[k] = _packed_level(mask[k])
+        self.bits = bits
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def __getitem__(self,k):
+        '''
+        level k as a 0/1 array.
+        '''
+        nh = int(np.prod(self.shape[1:]))
+        return np.unpackbits(self.bits[k],count = nh).reshape(self.shape[1:])
+
+    def lookup(self,ind):
+        ind,the_shape = _stack_index(ind)
+        return _packed_lookup(self.bits,ind,self.h_shape).reshape(the_shape)
+
+    def to_array(self):
+        nh = int(np.prod(self.shape[1:]))
+        return np.unpackbits(self.bits,axis = 1,count = nh).reshape(self.shape)
+
+class KmtMask(object):
+    '''
+    For masks where every column is wet from the surface down to
+    some level and dry below, only the number of wet levels
+    of each column (kmt) needs to be stored.
+    '''
+    def __init__(self,mask,kmt = None):
+        self.shape = tuple(mask.shape)
+        self.h_shape = np.array(self.shape[1:],'int64')
+        if kmt is None:
+            kmt = column_kmt(mask)
+            if kmt is None:
+                raise ValueError('mask is not wet from the surface down, use PackedMask')
+        self.kmt = kmt.ravel()
+
+    @property
+    def nbytes(self):
+        return self.kmt.nbytes
+
+    def __getitem__(self,k):
+        '''
+        level k as a 0/1 array.
+        '''
+        if k<0:
+            k+=self.shape[0]
+        return (k<self.kmt.reshape(self.shape[1:])).astype('uint8')
+
+    def lookup(self,ind):
+        ind,the_shape = _stack_index(ind)
+        return _kmt_lookup(self.kmt,ind,self.h_shape,self.shape[0]).reshape(the_shape)
+
+    def to_array(self):
+        k = np.arange(self.shape[0]).reshape((-1,)+(1,)*(len(self.shape)-1))
+        return (k<self.kmt.reshape(self.shape[1:])).astype('uint8')
+
+def _kmt_dtype(nz):
+    return 'int16' if nz<np.iinfo(np.int16).max else 'int32'
+
+def column_kmt(mask):
+    '''
+    number of wet levels in each column,
+    None if there is a dry level above a wet one anywhere.
+    '''
+    nz = mask.shape[0]
+    kmt = np.zeros(mask.shape[1:],_kmt_dtype(nz))
+    for k in range(nz):
+        level = np.asarray(mask[k])!=0
+        if np.any(np.logical_and(level,kmt<k)):
+            return None
+        kmt[level] = k+1
+    return kmt
+
+def compact_mask(mask):
+    '''
+    the smallest representation that fits the mask,
+    every level of mask is read once and nothing dense is kept.
+    The columns are counted (like column_kmt) until a dry level
+    is found above a wet one, the levels read so far are then
+    packed from the counts and the rest are packed as they come.
+    '''
+    shape = tuple(mask.shape)
+    nz = shape[0]
+    nh = int(np.prod(shape[1:]))
+    kmt = np.zeros(shape[1:],_kmt_dtype(nz))
+    bits = None
+    for k in range(nz):
+        level = np.asarray(mask[k])!=0
+        if bits is None:
+            if not np.any(np.logical_and(level,kmt<k)):
+                kmt[level] = k+1
+                continue
+            bits = np.empty((nz,(nh+7)//8),'uint8')
+            for j in range(k):
+                bits[j] = _packed_level(kmt>j)
+        bits[k] = _packed_level(level)
+    if bits is None:
+        return KmtMask(mask,kmt = kmt)
+    return PackedMask(mask,bits = bits)
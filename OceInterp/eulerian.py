@@ -2,13 +2,15 @@ from OceInterp.OceData import OceData
 from OceInterp.kernelNweight import KnW
 from OceInterp.kernel_and_weight import translate_to_tendency,find_pk_4d
 from OceInterp.smart_read import smart_read as sread
-from OceInterp.get_masks import get_masked
 from OceInterp.utils import local_to_latlon
 from OceInterp.lat2ind import find_px_py,weight_f_node
+from OceInterp.gather import source_array,weighted_sum,rotated_weighted_sum,rotate_mask
+from OceInterp.profiler import timed,count
 
 import warnings
 import numpy as np
 import copy
+from numba import njit
 
 def to_180(x):
     '''
@@ -93,15 +95,97 @@ def _in_required(name,required):
     else:
         return name in required
     
+# the per point arrays position.interpolate reads,
+# subset(which,fields = location_fields) carries only these.
+location_fields = ['lon','lat','dep','t',
+                   'face','iy','ix','rx','ry','cs','sn',
+                   'iz','rz','izl','rzl','it','rt',
+                   'iz_lin','rz_lin','dz_bin','bz_lin',
+                   'izl_lin','rzl_lin','dzl_bin','bzl_lin',
+                   'it_lin','rt_lin','dt_bin','bt_lin']
+
 def _general_len(thing):
     try:
         return len(thing)
     except:
         return 1
 
+@njit
+def hilbert_key(iy,ix,n):
+    '''
+    position along a Hilbert curve filling a n*n square (n a power of 2),
+    nearby cells are (mostly) close on the curve.
+    '''
+    keys = np.empty(len(iy),np.int64)
+    for i in range(len(iy)):
+        x = ix[i]
+        y = iy[i]
+        d = 0
+        s = n//2
+        while s>0:
+            rx = 1 if (x & s)>0 else 0
+            ry = 1 if (y & s)>0 else 0
+            d += s*s*((3*rx)^ry)
+            if ry == 0:
+                if rx == 1:
+                    x = n-1-x
+                    y = n-1-y
+                x,y = y,x
+            s//=2
+        keys[i] = d
+    return keys
+
+def chunk_key(ds,iy,ix):
+    '''
+    which horizontal dask chunk each point is in
+    '''
+    try:
+        chunks = ds.chunks
+    except ValueError:
+        # inconsistent chunks, not worth guessing
+        chunks = {}
+    key = np.zeros(len(iy),int)
+    for dim,ind in [('Y',iy),('X',ix)]:
+        if dim in chunks.keys() and len(chunks[dim])>1:
+            bounds = np.cumsum(chunks[dim])
+            key = key*len(bounds)+np.searchsorted(bounds,ind,side = 'right')
+    return key
+
+def locality_order(pt):
+    '''
+    order the points by time index, face, chunk and then
+    along a Hilbert curve on the horizontal grid,
+    so that the reads in interpolate jump around as little as possible.
+    '''
+    keys = []
+    if pt.iy is not None:
+        iy = np.asarray(pt.iy).astype('int64')
+        ix = np.asarray(pt.ix).astype('int64')
+        n = 1<<int(np.ceil(np.log2(max(iy.max(),ix.max(),1)+1)))
+        keys.append(hilbert_key(iy,ix,n))
+        keys.append(chunk_key(pt.ocedata._ds,iy,ix))
+        if pt.face is not None:
+            keys.append(np.asarray(pt.face))
+    if pt.it is not None:
+        keys.append(np.asarray(pt.it))
+    if len(keys) == 0:
+        return np.arange(pt.N)
+    return np.lexsort(keys)
+
+def _contiguous(index):
+    '''
+    index as a slice if it is a run of consecutive points,
+    so that selecting with it makes views.
+    '''
+    if len(index) == 0:
+        return slice(0,0)
+    if index[-1]-index[0] == len(index)-1 and (len(index) == 1 or (np.diff(index) == 1).all()):
+        return slice(int(index[0]),int(index[-1])+1)
+    return index
+
 class position():
 #     self.ind_h_dict = {}
-    def from_latlon(self,x = None,y = None,z = None,t = None,**kwarg):
+    def from_latlon(self,x = None,y = None,z = None,t = None,reorder = False,**kwarg):
         try:
             self.ocedata
         except AttributeError:
@@ -110,6 +194,7 @@ class position():
             self.ocedata = kwarg['data']
         self.tp = self.ocedata.tp
         self.N = max([_general_len(i) for i in [x,y,z,t]])
+        count('points',self.N)
         if isinstance(x,float):
             x = np.array([1.0])*x
         if isinstance(y,float):
@@ -119,6 +204,40 @@ class position():
         if isinstance(z,float):
             t = np.array([1.0])*t
 
+        self.set_h(x,y)
+        self.set_v(z)
+        self.set_t(t)
+        self.sort_order = None
+        self.unsort = None
+        if reorder:
+            self.reorder(locality_order(self))
+        return self
+
+    def reorder(self,order):
+        '''
+        put the points in the given order internally,
+        interpolate still returns them in the original order.
+        '''
+        N = self.N
+        for key,item in self.__dict__.items():
+            if isinstance(item,np.ndarray) and item.ndim == 1 and len(item) == N:
+                self.__dict__[key] = item[order]
+        self.sort_order = order
+        self.unsort = np.empty_like(order)
+        self.unsort[order] = np.arange(N)
+
+    def restore_order(self,R):
+        if self.__dict__.get('unsort') is None:
+            return R
+        if isinstance(R,tuple) or isinstance(R,list):
+            return type(R)([r[self.unsort] for r in R])
+        return R[self.unsort]
+
+    @timed('locate')
+    def set_h(self,x,y):
+        '''
+        the horizontal part of from_latlon
+        '''
         if (x is not None) and (y is not None):
             self.lon = x
             self.lat = y
@@ -149,6 +268,15 @@ class position():
             self.dy   = None
             self.bx   = None
             self.by   = None
+
+    @timed('locate')
+    def set_v(self,z):
+        '''
+        the vertical part of from_latlon
+        '''
+        for key in ['iz_lin','rz_lin','dz_bin','bz_lin',
+                    'izl_lin','rzl_lin','dzl_bin','bzl_lin']:
+            self.__dict__.pop(key,None)
         if (z is not None):
             (
                 self.iz,
@@ -175,7 +303,14 @@ class position():
                 self.bzl,
                 self.dep
             ) = [None for i in range(9)]
-            
+
+    @timed('locate')
+    def set_t(self,t):
+        '''
+        the temporal part of from_latlon
+        '''
+        for key in ['it_lin','rt_lin','dt_bin','bt_lin']:
+            self.__dict__.pop(key,None)
         if (t is not None):
             (
                 self.it,
@@ -192,22 +327,46 @@ class position():
                 self.bt,
                 self.tim
             ) = [None for i in range(5)]
-        return self
     
-    def subset(self,which):
+    def subset(self,which,fields = None):
+        '''
+        a position of the points in which (boolean mask, index or slice).
+        If which is a single contiguous run of points
+        (every point, a slice, or a mask/index that happens to be one),
+        the arrays are views of these ones, not copies,
+        so treat them as read only.
+        Scattered points are copied.
+        fields: None or list of names
+            only these of the per point arrays are carried over,
+            e.g. location_fields for interpolation.
+        '''
+        if which is not None and not isinstance(which,slice):
+            which = np.asarray(which)
+            if which.dtype == bool:
+                which = np.flatnonzero(which)
+            which = _contiguous(which)
+        if isinstance(which,slice):
+            start,stop,step = which.indices(self.N)
+            if step == 1 and start == 0 and stop == self.N:
+                which = None
         p = position()
-        keys = self.__dict__.keys()
-        for i in keys:
-            item = self.__dict__[i]
-            if isinstance(item,np.ndarray):
-                if len(item.shape) ==1:
-                    p.__dict__[i] = item[which]
-                    p.N = len(p.__dict__[i])
-                else:
-                    p.__dict__[i] = item
+        for i,item in self.__dict__.items():
+            if isinstance(item,np.ndarray) and len(item.shape) ==1:
+                if fields is not None and i not in fields:
+                    continue
+                p.__dict__[i] = item if which is None else item[which]
             else:
                 p.__dict__[i] = item
+        if which is None:
+            p.N = self.N
+        elif isinstance(which,slice):
+            p.N = len(range(*which.indices(self.N)))
+        else:
+            p.N = len(which)
         # p.N = max([_general_len(i) for i in p.__dict__.values()])
+        # the subset is in the internal order
+        p.sort_order = None
+        p.unsort = None
         return p
         
     def fatten_h(self,knw):
@@ -242,22 +401,30 @@ class position():
         else:
             illegal = tp.check_illegal((n_iys,n_ixs))
 
-        redo = np.array(np.where(illegal)).T
-        for num,loc in enumerate(redo):
-            j,i = loc
+        redo_j,redo_i = np.where(illegal)
+        if len(redo_j)>0:
+            # points in the same cell need the same moves,
+            # walk each (cell,node) only once.
             if self.face is not None:
-                ind = (self.face[j],self.iy[j],self.ix[j])
+                cells = [np.asarray(self.face)[redo_j]]
             else:
-                ind = (self.iy[j],self.ix[j])
-            # everyone start from the [0,0] node
-            moves = kernel_tends[i]
-            # moves is a list of operations to get to a single point
-            #[2,2] means move to the left and then move to the left again.
-            n_ind = tp.ind_moves(ind,moves)
+                cells = []
+            cells += [np.asarray(self.iy)[redo_j],np.asarray(self.ix)[redo_j],redo_i]
+            unique,inverse = np.unique(np.stack(cells,axis = 1).astype('int64'),
+                                       axis = 0,return_inverse = True)
+            found = np.empty((len(unique),len(cells)-1))
+            for num,loc in enumerate(unique):
+                ind = tuple(loc[:-1])
+                # everyone start from the [0,0] node
+                moves = kernel_tends[loc[-1]]
+                # moves is a list of operations to get to a single point
+                #[2,2] means move to the left and then move to the left again.
+                found[num] = tp.ind_moves(ind,moves)
+            found = found[inverse.reshape(-1)]
             if self.face is not None:
-                n_faces[j,i],n_iys[j,i],n_ixs[j,i] = n_ind
-            else:
-                n_iys[j,i],n_ixs[j,i] = n_ind
+                n_faces[redo_j,redo_i] = found[:,0]
+            n_iys[redo_j,redo_i] = found[:,-2]
+            n_ixs[redo_j,redo_i] = found[:,-1]
         if self.face is not None:
             return n_faces.astype('int'),n_iys.astype('int'),n_ixs.astype('int')
         else:
@@ -322,6 +489,7 @@ class position():
         else:
             raise Exception('vkernel not supported')
     
+    @timed('fatten')
     def fatten(self,knw,fourD = False,required = 'all'):
         if required!='all' and isinstance(required,str):
             required = tuple([required])
@@ -374,13 +542,15 @@ class position():
                               self.ocedata.YG,
                               self.ocedata.tp,
                               self.face,
-                              self.iy,self.ix
+                              self.iy,self.ix,
+                              table = self.ocedata.corners()
                              )
         else:
             return find_px_py(self.ocedata.XG,
                               self.ocedata.YG,
                               self.ocedata.tp,
-                              self.iy,self.ix
+                              self.iy,self.ix,
+                              table = self.ocedata.corners()
                              )
     def get_f_node_weight(self):
         return weight_f_node(self.rx,self.ry)
@@ -393,9 +563,9 @@ class position():
             
     
     def get_needed(self,varName,knw,**kwarg):
-        dims = self.ocedata._ds[varName].dims
+        dims = self.ocedata.describe(varName)['raw_dims']
         ind = self.fatten(knw,required = dims,**kwarg)
-        if len(ind)!= len(self.ocedata._ds[varName].dims):
+        if len(ind)!= len(dims):
             raise Exception("""dimension mismatch.
                             Please check if the position objects have all the dimensions needed""")
         return sread(self.ocedata[varName],ind)
@@ -407,7 +577,7 @@ class position():
         if len(ind)!=len(self.ocedata._ds['maskC'].dims):
             raise Exception("""dimension mismatch.
                             Please check if the position objects have all the dimensions needed""")
-        return get_masked(self.ocedata,ind,gridtype = gridtype)
+        return self.ocedata.masks.lookup(ind,gridtype = gridtype)
     
     def find_pk4d(self,knw,gridtype = 'C'):
         masked = self.get_masked(knw,gridtype = gridtype)
@@ -417,6 +587,44 @@ class position():
     def interpolate(self,varName,knw,
                     vec_transform = True,
                     prefetched = None,i_min = None):
+        '''
+        interpolate varName with the kernel knw,
+        the results are in the order the points were given,
+        even if from_latlon(reorder = True) sorted them.
+        '''
+        R = self._interpolate(varName,knw,
+                              vec_transform = vec_transform,
+                              prefetched = prefetched,i_min = i_min)
+        return self.restore_order(R)
+
+    def _rz(self,info,knw):
+        '''
+        the relative vertical position for a variable described by info
+        '''
+        if info['vertical'] is None or self.rz is None:
+            return 0
+        if info['vertical'] == 'Z':
+            return self.rz if knw.vkernel == 'nearest' else self.rz_lin
+        return self.rzl if knw.vkernel == 'nearest' else self.rzl_lin
+
+    def _rt(self,knw):
+        if self.rt is None:
+            return 0
+        return self.rt if knw.tkernel == 'nearest' else self.rt_lin
+
+    def _ind_for_mask(self,info,ind):
+        '''
+        the index arrays without time,
+        with a surface level added if the variable has no depth.
+        '''
+        ind_for_mask = tuple([ind[i] for i in info['mask_axes']])
+        if info['vertical'] is None:
+            ind_for_mask = (np.zeros_like(ind[0]),)+ind_for_mask
+        return ind_for_mask
+
+    def _interpolate(self,varName,knw,
+                    vec_transform = True,
+                    prefetched = None,i_min = None):
         # implement shortcut u,v,w
         if prefetched is not None:
             # TODO: I could have a warning about prefetch
@@ -424,20 +632,14 @@ class position():
             # But should I?
             pass
         if isinstance(varName,str):
-            old_dims = self.ocedata._ds[varName].dims
-            dims = []
-            for i in old_dims:
-                if i in ['Xp1','Yp1']:
-                    dims.append(i[:1])
-                else:
-                    dims.append(i)
-            dims = tuple(dims)
-            if 'Xp1' in old_dims:
-                rx = self.rx+0.5
+            info = self.ocedata.describe(varName)
+            dims = info['dims']
+            if info['rx_shift']:
+                rx = self.rx+info['rx_shift']
             else:
                 rx = self.rx
-            if 'Yp1' in old_dims:
-                ry = self.ry+0.5
+            if info['ry_shift']:
+                ry = self.ry+info['ry_shift']
             else:
                 ry = self.ry
             ind = self.fatten(knw,required = dims,fourD = True)
@@ -448,59 +650,24 @@ class position():
                     a_ind = ind_dic[dim]
                     a_ind-= i_min[i]
                     temp_ind.append(a_ind)
-                temp_ind = tuple(temp_ind)
-                needed = np.nan_to_num(prefetched[temp_ind])
+                ind = tuple(temp_ind)
+                source = prefetched
             else:
-                needed = np.nan_to_num(sread(self.ocedata[varName],ind))
+                source = source_array(self.ocedata[varName])
+            if source is None:
+                needed = sread(self.ocedata[varName],ind)
             
-            if 'Z' in dims:
-                if self.rz is not None:
-                    if knw.vkernel == 'nearest':
-                        rz = self.rz
-                    else:
-                        rz = self.rz_lin
-                else:
-                    rz = 0
-            elif 'Zl' in dims:
-                if self.rz is not None:
-                    if knw.vkernel == 'nearest':
-                        rz = self.rzl
-                    else:
-                        rz = self.rzl_lin
-                else:
-                    rz = 0
-            else:
-                rz = 0
-
-            if self.rt is not None:
-                if knw.tkernel == 'nearest':
-                    rt = self.rt
-                else:
-                    rt = self.rt_lin
-            else:
-                rt = 0
+            rz = self._rz(info,knw)
+            rt = self._rt(knw)
             
-            if not ('X' in dims and 'Y' in dims):
+            if info['mask'] is None:
                 # if it does not have a horizontal dimension, then we don't have to mask
                 masked = np.ones_like(ind[0])
             else:
-                if 'Zl' in dims:
-                    # something like wvel
-                    ind_for_mask = tuple([ind[i] for i in range(len(ind)) if dims[i] not in ['time']])
-                    masked = get_masked(self.ocedata,ind_for_mask,gridtype = 'Wvel')
-                    this_bottom_scheme = None
-                elif 'Z' in dims:
-                    # something like salt
-                    ind_for_mask = tuple([ind[i] for i in range(len(ind)) if dims[i] not in ['time']])
-                    masked = get_masked(self.ocedata,ind_for_mask,gridtype = 'C')
-                    this_bottom_scheme = 'no_flux'
-                else:
-                    # something like etan
-                    ind_for_mask = [ind[i] for i in range(len(ind)) if dims[i] not in ['time']]
-                    ind_for_mask.insert(0,np.zeros_like(ind[0]))
-                    ind_for_mask = ind_for_mask
-                    masked = get_masked(self.ocedata,ind_for_mask,gridtype = 'C')
-                    this_bottom_scheme = 'no_flux'
+                # Wvel for something like wvel, C for salt or etan
+                masked = self.ocedata.masks.lookup(self._ind_for_mask(info,ind),
+                                                   gridtype = info['mask'])
+            this_bottom_scheme = info['bottom_scheme']
                     
             pk4d = find_pk_4d(masked,russian_doll = knw.inheritance)
 
@@ -509,11 +676,9 @@ class position():
                                     pk4d = pk4d,
                                     bottom_scheme = this_bottom_scheme)
 
-            needed = partial_flatten(needed)
-            weight = partial_flatten(weight)
-
-            R = np.einsum('nj,nj->n',needed,weight)
-            return R
+            if source is None:
+                return weighted_sum(weight,needed = needed)
+            return weighted_sum(weight,source = source,ind = ind)
         elif isinstance(varName,list) or isinstance(varName,tuple):
             if len(varName)!=2:
                 raise Exception('list varName can only have length 2, representing horizontal vectors')
@@ -528,9 +693,9 @@ class position():
                 
             if self.face is None:
                 # treat them as scalar then. 
-                u = self.interpolate(uname,uknw,
+                u = self._interpolate(uname,uknw,
                     prefetched = upre,i_min = i_min)
-                v = self.interpolate(vname,vknw,
+                v = self._interpolate(vname,vknw,
                     prefetched = vpre,i_min = i_min)
             else:
                 if not uknw.same_size(vknw):
@@ -539,14 +704,8 @@ class position():
                                     'use a kernel that include both of the uv kernels'
                                    )
 
-                old_dims = self.ocedata._ds[uname].dims
-                dims = []
-                for i in old_dims:
-                    if i in ['Xp1','Yp1']:
-                        dims.append(i[:1])
-                    else:
-                        dims.append(i)
-                dims = tuple(dims)
+                info = self.ocedata.describe(uname)
+                dims = info['dims']
                 ind = self.fatten(uknw,required = dims,fourD = True)
                 ind_dic = dict(zip(dims,ind))
 
@@ -556,103 +715,41 @@ class position():
                         a_ind = ind_dic[dim]
                         a_ind-= i_min[i]
                         temp_ind.append(a_ind)
-                    temp_ind = tuple(temp_ind)
-                    n_u = np.nan_to_num(upre[temp_ind])
-                    n_v = np.nan_to_num(vpre[temp_ind])
-                else:  
-                    n_u = np.nan_to_num(sread(self.ocedata[uname],ind))
-                    n_v = np.nan_to_num(sread(self.ocedata[vname],ind))
-    #             np.nan_to_num(n_u,copy = False)
-    #             np.nan_to_num(n_v,copy = False)
-
-
-                if 'Z' in dims:
-                    if self.rz is not None:
-                        if uknw.vkernel == 'nearest':
-                            rz = self.rz
-                        else:
-                            rz = self.rz_lin
-                    else:
-                        rz = 0
-                elif 'Zl' in dims:
-                    if self.rz is not None:
-                        if uknw.vkernel == 'nearest':
-                            rz = self.rzl
-                        else:
-                            rz = self.rzl_lin
-                    else:
-                        rz = 0
+                    ind = tuple(temp_ind)
+                    usource,vsource = upre,vpre
                 else:
-                    rz = 0
+                    usource = source_array(self.ocedata[uname])
+                    vsource = source_array(self.ocedata[vname])
+                if usource is None or vsource is None:
+                    n_u = sread(self.ocedata[uname],ind)
+                    n_v = sread(self.ocedata[vname],ind)
+                    usource,vsource = None,None
 
-                if self.rt is not None:
-                    if uknw.tkernel == 'nearest':
-                        rt = self.rt
-                    else:
-                        rt = self.rt_lin
-                else:
-                    rt = 0
+                rz = self._rz(info,uknw)
+                rt = self._rt(uknw)
 
-                if not ('X' in dims and 'Y' in dims):
-                    # if it does not have a horizontal dimension, then we don't have to mask
-                    umask = np.ones_like(ind[0])
-                    vmask = np.ones_like(ind[0])
-                else:
-                    if 'Zl' in dims:
-                        warnings.warn('the vertical value of vector is between cells, may result in wrong masking')
-                        ind_for_mask = tuple([ind[i] for i in range(len(ind)) if dims[i] not in ['time']])
-                        this_bottom_scheme = None
-                        if knw.vkernel == 'nearest':
-                            rz = self.rzl
-                        else:
-                            rz = self.rzl_lin
-                    elif 'Z' in dims:
-                        # something like salt
-                        ind_for_mask = tuple([ind[i] for i in range(len(ind)) if dims[i] not in ['time']])
-                        this_bottom_scheme = 'no_flux'
-                    else:
-                        # something like 
-                        ind_for_mask = [ind[i] for i in range(len(ind)) if dims[i] not in ['time']]
-                        ind_for_mask.insert(0,np.zeros_like(ind[0]))
-                        ind_for_mask = ind_for_mask
-                        this_bottom_scheme = 'no_flux'
-
-                umask = get_masked(self.ocedata,ind_for_mask,gridtype = 'U')
-                vmask = get_masked(self.ocedata,ind_for_mask,gridtype = 'V')
-                if self.face is not None:
-    #                 hface = ind4d[2][:,:,0,0]
-                    (UfromUvel,
-                     UfromVvel,
-                     VfromUvel,
-                     VfromVvel) = self.ocedata.tp.four_matrix_for_uv(ind_dic['face'][:,:,0,0])
-
-                    temp_n_u = (np.einsum('nijk,ni->nijk',n_u,UfromUvel)
-                               +np.einsum('nijk,ni->nijk',n_v,UfromVvel))
-                    temp_n_v = (np.einsum('nijk,ni->nijk',n_u,VfromUvel)
-                               +np.einsum('nijk,ni->nijk',n_v,VfromVvel))
-
-                    n_u = temp_n_u
-                    n_v = temp_n_v
-
-                    temp_umask = np.round(np.einsum('nijk,ni->nijk',umask,UfromUvel)+
-                                     np.einsum('nijk,ni->nijk',vmask,UfromVvel))
-                    temp_vmask = np.round(np.einsum('nijk,ni->nijk',umask,VfromUvel)+
-                                     np.einsum('nijk,ni->nijk',vmask,VfromVvel))
-
-                    umask = temp_umask
-                    vmask = temp_vmask
+                if info['vertical'] == 'Zl':
+                    warnings.warn('the vertical value of vector is between cells, may result in wrong masking')
+                ind_for_mask = self._ind_for_mask(info,ind)
+
+                umask = self.ocedata.masks.lookup(ind_for_mask,gridtype = 'U')
+                vmask = self.ocedata.masks.lookup(ind_for_mask,gridtype = 'V')
+                four_matrix = self.ocedata.tp.four_matrix_for_uv(ind_dic['face'][:,:,0,0])
+                UfromUvel,UfromVvel,VfromUvel,VfromVvel = four_matrix
+                umask,vmask = (rotate_mask(umask,vmask,UfromUvel,UfromVvel),
+                               rotate_mask(umask,vmask,VfromUvel,VfromVvel))
 
                 upk4d = find_pk_4d(umask,russian_doll = uknw.inheritance)
                 vpk4d = find_pk_4d(vmask,russian_doll = vknw.inheritance)
                 uweight = uknw.get_weight(self.rx+1/2,self.ry,rz = rz,rt = rt,pk4d = upk4d)
                 vweight = vknw.get_weight(self.rx,self.ry+1/2,rz = rz,rt = rt,pk4d = vpk4d)
 
-    #             n_u    = partial_flatten(n_u   )
-    #             uweight = partial_flatten(uweight)
-    #             n_v    = partial_flatten(n_v   )
-    #             vweight = partial_flatten(veight)
-                u = np.einsum('nijk,nijk->n',n_u,uweight)
-                v = np.einsum('nijk,nijk->n',n_v,vweight)
+                if usource is None:
+                    u,v = rotated_weighted_sum(four_matrix,uweight,vweight,
+                                               n_u = n_u,n_v = n_v)
+                else:
+                    u,v = rotated_weighted_sum(four_matrix,uweight,vweight,
+                                               usource = usource,vsource = vsource,ind = ind)
 
             if vec_transform:
                 u,v = local_to_latlon(u,v,self.cs,self.sn)
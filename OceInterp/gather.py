@@ -0,0 +1,186 @@
+import numpy as np
+from numba import njit,prange
+
+from OceInterp.profiler import timed,count
+
+# Compiled replacements for
+#   needed = np.nan_to_num(array[ind])
+#   np.einsum('nj,nj->n',partial_flatten(needed),partial_flatten(weight))
+# and the rotation of u,v on the complex grid.
+# The stencil values are read one at a time from the source array
+# (or from the values smart_read already gathered),
+# NaN counts as 0, and nothing of size n*m*nz*nt is created.
+# index, stencil and weight arrays are all (n,m,nz,nt) like in position.interpolate.
+# The stencil values are cast to the dtype of the weights (working_float())
+# and summed in that dtype, so rcParam['precision'] = 'float32' holds here too.
+
+@njit
+def _offset(shape,ind,n,i,j,k):
+    '''
+    the flat offset of one stencil node,
+    negative index counts from the end like numpy.
+    '''
+    f = 0
+    for d in range(len(ind)):
+        a = ind[d][n,i,j,k]
+        if a<0:
+            a+=shape[d]
+        if a<0 or a>=shape[d]:
+            raise IndexError('index out of bounds')
+        f = f*shape[d]+a
+    return f
+
+@njit
+def _no_nan(value):
+    if np.isnan(value):
+        return 0.0
+    return value
+
+@njit(parallel = True)
+def _dot(needed,weight):
+    n,m,nz,nt = weight.shape
+    wt = weight.dtype.type
+    R = np.empty(n,weight.dtype)
+    for p in prange(n):
+        acc = wt(0.0)
+        for i in range(m):
+            for j in range(nz):
+                for k in range(nt):
+                    acc+=wt(_no_nan(needed[p,i,j,k]))*weight[p,i,j,k]
+        R[p] = acc
+    return R
+
+@njit(parallel = True)
+def _gather_dot(flat,shape,ind,weight):
+    n,m,nz,nt = weight.shape
+    wt = weight.dtype.type
+    R = np.empty(n,weight.dtype)
+    for p in prange(n):
+        acc = wt(0.0)
+        for i in range(m):
+            for j in range(nz):
+                for k in range(nt):
+                    acc+=wt(_no_nan(flat[_offset(shape,ind,p,i,j,k)]))*weight[p,i,j,k]
+        R[p] = acc
+    return R
+
+@njit(parallel = True)
+def _uv_dot(n_u,n_v,UfromU,UfromV,VfromU,VfromV,uweight,vweight):
+    n,m,nz,nt = uweight.shape
+    wt = uweight.dtype.type
+    u = np.empty(n,uweight.dtype)
+    v = np.empty(n,vweight.dtype)
+    for p in prange(n):
+        uacc = wt(0.0)
+        vacc = wt(0.0)
+        for i in range(m):
+            for j in range(nz):
+                for k in range(nt):
+                    a = wt(_no_nan(n_u[p,i,j,k]))
+                    b = wt(_no_nan(n_v[p,i,j,k]))
+                    uacc+=(a*UfromU[p,i]+b*UfromV[p,i])*uweight[p,i,j,k]
+                    vacc+=(a*VfromU[p,i]+b*VfromV[p,i])*vweight[p,i,j,k]
+        u[p] = uacc
+        v[p] = vacc
+    return u,v
+
+@njit(parallel = True)
+def _gather_uv_dot(uflat,vflat,shape,ind,UfromU,UfromV,VfromU,VfromV,uweight,vweight):
+    n,m,nz,nt = uweight.shape
+    wt = uweight.dtype.type
+    u = np.empty(n,uweight.dtype)
+    v = np.empty(n,vweight.dtype)
+    for p in prange(n):
+        uacc = wt(0.0)
+        vacc = wt(0.0)
+        for i in range(m):
+            for j in range(nz):
+                for k in range(nt):
+                    f = _offset(shape,ind,p,i,j,k)
+                    a = wt(_no_nan(uflat[f]))
+                    b = wt(_no_nan(vflat[f]))
+                    uacc+=(a*UfromU[p,i]+b*UfromV[p,i])*uweight[p,i,j,k]
+                    vacc+=(a*VfromU[p,i]+b*VfromV[p,i])*vweight[p,i,j,k]
+        u[p] = uacc
+        v[p] = vacc
+    return u,v
+
+@njit(parallel = True)
+def _rotate_mask(umask,vmask,A,B):
+    n,m,nz,nt = umask.shape
+    R = np.empty(umask.shape,np.float64)
+    for p in prange(n):
+        for i in range(m):
+            for j in range(nz):
+                for k in range(nt):
+                    R[p,i,j,k] = np.round(umask[p,i,j,k]*A[p,i]+vmask[p,i,j,k]*B[p,i])
+    return R
+
+def source_array(thing):
+    '''
+    the numpy array to read the stencil from directly,
+    None if it has to go through smart_read (chunked or lazy data).
+    '''
+    if isinstance(thing,np.ndarray):
+        return thing
+    if getattr(thing,'chunks',None) is None and isinstance(getattr(thing,'data',None),np.ndarray):
+        return thing.data
+    return None
+
+def _flat_and_shape(array):
+    return np.ascontiguousarray(array).reshape(-1),np.array(array.shape,'int64')
+
+def _index_tuple(ind,shape):
+    ind = tuple(np.asarray(i,'int64') for i in ind)
+    for i in ind:
+        if i.shape != shape:
+            return None
+    return ind
+
+@timed('contract')
+def weighted_sum(weight,needed = None,source = None,ind = None):
+    '''
+    sum of stencil values times weight for each point,
+    from the gathered stencil values (needed),
+    or straight from a numpy array (source) at index ind.
+    '''
+    if weight.ndim != 4:
+        raise ValueError('weight should be (n,m,nz,nt)')
+    if source is not None:
+        count('read_bytes',weight.size*source.itemsize)
+        index = _index_tuple(ind,weight.shape)
+        if index is not None and len(index) == source.ndim:
+            flat,shape = _flat_and_shape(source)
+            return _gather_dot(flat,shape,index,weight)
+        needed = source[tuple(ind)]
+    return _dot(needed.reshape(weight.shape),weight)
+
+@timed('contract')
+def rotated_weighted_sum(four_matrix,uweight,vweight,
+                         n_u = None,n_v = None,
+                         usource = None,vsource = None,ind = None):
+    '''
+    the u,v of the points after turning every stencil node
+    into the orientation of the face the point is on.
+    '''
+    UfromU,UfromV,VfromU,VfromV = [np.ascontiguousarray(a,uweight.dtype) for a in four_matrix]
+    if usource is not None:
+        count('read_bytes',uweight.size*(usource.itemsize+vsource.itemsize))
+        index = _index_tuple(ind,uweight.shape)
+        if (index is not None and usource.shape == vsource.shape
+            and len(index) == usource.ndim):
+            uflat,shape = _flat_and_shape(usource)
+            vflat,_ = _flat_and_shape(vsource)
+            return _gather_uv_dot(uflat,vflat,shape,index,
+                                  UfromU,UfromV,VfromU,VfromV,uweight,vweight)
+        n_u = usource[tuple(ind)]
+        n_v = vsource[tuple(ind)]
+    return _uv_dot(n_u.reshape(uweight.shape),n_v.reshape(vweight.shape),
+                   UfromU,UfromV,VfromU,VfromV,uweight,vweight)
+
+@timed('mask')
+def rotate_mask(umask,vmask,A,B):
+    '''
+    np.round(umask*A+vmask*B) with A,B broadcast along the last two axis
+    '''
+    return _rotate_mask(umask,vmask,np.asarray(A,'float64'),np.asarray(B,'float64'))
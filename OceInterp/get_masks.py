@@ -1,10 +1,123 @@
 import numpy as np
 import xarray as xr 
-import copy
 import warnings
+import logging
 from OceInterp.topology import topology
 from OceInterp.smart_read import smart_read
 from OceInterp.RuntimeConf import rcParam
+from OceInterp.grid_cache import mask_checksum
+from OceInterp.compact_mask import compact_mask
+from OceInterp.profiler import timed
+
+logger = logging.getLogger(__name__)
+
+def edge_neighbours(tp,tend):
+    '''
+    the neighbours (in direction tend) of the points on the edge of the faces
+    are not just a shift of the index,
+    find them one by one with the topology object,
+    there are only a few of those points.
+    return the horizontal index of the points and their neighbours,
+    points without a neighbour (out of the domain) are dropped.
+    '''
+    h_shape = tp.h_shape
+    axis = len(h_shape)-1 if tend in [2,3] else len(h_shape)-2
+    edge = 0 if tend in [1,2] else h_shape[axis]-1
+    ind = [np.arange(n) for n in h_shape]
+    ind[axis] = np.array([edge])
+    ind = [i.ravel() for i in np.meshgrid(*ind,indexing = 'ij')]
+    keep = []
+    nind = []
+    for j in range(len(ind[0])):
+        old = tuple([int(i[j]) for i in ind])
+        try:
+            new = tp.ind_tend(old,tend)
+        except Exception:
+            # This is Antarctica
+            continue
+        if tp.check_illegal(tuple([int(i) for i in new])):
+            continue
+        keep.append(j)
+        nind.append(new)
+    keep = np.array(keep,int)
+    nind = np.array(nind,int).reshape(-1,len(h_shape)).T
+    return tuple([i[keep] for i in ind]),tuple(nind)
+
+def shifted_neighbour(level,tend,edge):
+    '''
+    the value of the neighbour in direction tend for every point of a level,
+    0 if there is no neighbour.
+    '''
+    nb = np.zeros_like(level)
+    axis = level.ndim-1 if tend in [2,3] else level.ndim-2
+    dst = [slice(None)]*level.ndim
+    src = [slice(None)]*level.ndim
+    if tend in [1,2]:
+        dst[axis] = slice(1,None)
+        src[axis] = slice(None,-1)
+    else:
+        dst[axis] = slice(None,-1)
+        src[axis] = slice(1,None)
+    nb[tuple(dst)] = level[tuple(src)]
+    ind,nind = edge
+    nb[ind] = level[nind]
+    return nb
+
+def unmask_interface(level,tend,edge):
+    '''
+    unmask the dry points of one level whose neighbour in direction tend is wet,
+    edge is from edge_neighbours.
+    '''
+    nb = shifted_neighbour(level,tend,edge)
+    level = level.copy()
+    level[np.logical_and(level==0,nb!=0)] = 1
+    return level
+
+class DerivedMask(object):
+    '''
+    maskU,maskV or maskWvel derived from maskC,
+    one level at a time and only when that level is asked for (mask[k]).
+    maskC is read a level at a time and never as a whole,
+    so it can be something lazy like a DataArray.
+    '''
+    def __init__(self,maskC,tp,gridtype):
+        if gridtype not in func_dic.keys():
+            raise NotImplementedError('gridtype for mask not supported')
+        self.maskC = maskC
+        self.gridtype = gridtype
+        self.shape = tuple(maskC.shape)
+        if gridtype in ['U','V']:
+            self.tend = 2 if gridtype == 'U' else 1
+            self.edge = edge_neighbours(tp,self.tend)
+        # the last level of maskC read, W needs the one above as well
+        self._last = (None,None)
+
+    def _maskC(self,k):
+        if self._last[0] != k:
+            self._last = (k,np.asarray(self.maskC[k]))
+        return self._last[1]
+
+    def __getitem__(self,k):
+        k = int(k)
+        if k<0:
+            k+=self.shape[0]
+        if self.gridtype == 'Wvel':
+            # W is on the top of the cell, wet if the cell or the one above is.
+            if k == 0:
+                return (self._maskC(k)!=0).astype(int)
+            above = self._maskC(k-1)
+            return np.logical_or(above,self._maskC(k)).astype(int)
+        return unmask_interface(self._maskC(k),self.tend,self.edge)
+
+    def to_array(self):
+        '''
+        the whole mask in memory, like get_masks returns it.
+        '''
+        return np.array([self[k] for k in range(self.shape[0])])
+
+    def __array__(self,dtype = None,copy = None):
+        mask = self.to_array()
+        return mask if dtype is None else mask.astype(dtype)
 
 def mask_u_node(maskC,tp):
     '''
@@ -14,16 +127,7 @@ def mask_u_node(maskC,tp):
     b. on the interface, where the cell to the left is wet.
     if b is the case, we need to unmask the udata
     '''
-        
-    maskU = copy.deepcopy(maskC)
-    indexes = np.array(np.where(maskC==0)).T
-    ### find out which points are masked will make the search faster.
-    nind = tp.ind_tend_vec(indexes.T[1:],np.ones_like(indexes.T[0],int)*2)
-    nind = np.vstack([indexes.T[0],nind])
-    switch = indexes[np.where(maskC[tuple(nind)])]
-    maskU[tuple(switch.T)] = 1
-    
-    return maskU
+    return DerivedMask(maskC,tp,'U')
 
 def mask_v_node(maskC,tp):
     '''
@@ -33,15 +137,7 @@ def mask_v_node(maskC,tp):
     b. on the interface, where the cell to the downside is wet.
     if b is the case, we need to unmask the vdata
     '''
-    maskV = copy.deepcopy(maskC)
-    indexes = np.array(np.where(maskC==0)).T
-    ### find out which points are masked will make the search faster.
-    nind = tp.ind_tend_vec(indexes.T[1:],np.ones_like(indexes.T[0],int)*1)
-    nind = np.vstack([indexes.T[0],nind])
-    switch = indexes[np.where(maskC[tuple(nind)])]
-    maskV[tuple(switch.T)] = 1
-    return maskV
-
+    return DerivedMask(maskC,tp,'V')
 
 def mask_w_node(maskC,tp = None):
     # this one does not need tp object
@@ -53,11 +149,42 @@ def mask_w_node(maskC,tp = None):
     b. on the interface, where the cell above is wet.
     if b is the case, we need to unmask the wdata
     '''
-    temp = np.zeros_like(maskC)
-    temp[1:] = maskC[:-1]
-    maskW = np.logical_or(temp,maskC).astype(int)
-    return maskW
+    return DerivedMask(maskC,tp,'Wvel')
     
+func_dic = {'U':mask_u_node,'V':mask_v_node,'Wvel':mask_w_node}
+
+def local_mask_cache(od):
+    '''
+    where to dump the derived masks,
+    None if rcParam['dump_masks_to_local'] is off.
+    '''
+    if not rcParam['dump_masks_to_local']:
+        return None
+    cache = getattr(od,'cache',None)
+    if cache is None:
+        warnings.warn("dump_masks_to_local needs rcParam['grid_cache_dir'] to be set, masks are not dumped.")
+    return cache
+
+def derive_mask(od,gridtype,maskC,tp,checksum = None):
+    '''
+    derive maskU,maskV or maskWvel from maskC in compact form (see compact_mask),
+    read it from the local cache if it was derived before from the same maskC.
+    maskC is read one level at a time,
+    checksum is its mask_checksum if that is already known.
+    '''
+    name = 'mask'+gridtype
+    cache = local_mask_cache(od)
+    if cache is not None:
+        if checksum is None:
+            checksum = mask_checksum(maskC)
+        mask = cache.load_mask(name,checksum)
+        if mask is not None:
+            return compact_mask(mask)
+    mask = compact_mask(func_dic[gridtype](maskC,tp))
+    if cache is not None:
+        cache.save_mask(name,mask,checksum)
+    return mask
+
 def get_masks(od,tp):
     '''
     just put the above functions together.
@@ -66,7 +193,6 @@ def get_masks(od,tp):
     keys = od._ds.keys()
     if 'maskC' not in keys:
         warnings.warn('no maskC in the dataset, assuming nothing is masked.')
-        print('no maskC in the dataset, assuming nothing is masked.')
         # od._ds.C_GRID_VARIABLE.to_masked_array().mask
         maskC = np.ones_like(od._ds.XC+od._ds.Z)
         # it is inappropriate to fill in the dataset, 
@@ -74,23 +200,23 @@ def get_masks(od,tp):
         return maskC,maskC,maskC,maskC
     maskC = np.array(od._ds['maskC'])
     if 'maskU' not in keys:
-        print('creating maskU,this is going to be very slow!')
-        maskU = mask_u_node(maskC,tp)
+        logger.info('creating maskU,this is going to be very slow!')
+        maskU = derive_mask(od,'U',maskC,tp).to_array()
         od._ds['maskU'] = od._ds['Z']+od._ds['XG']
         od._ds['maskU'].values = maskU
     else:
         maskU = np.array(od._ds['maskU'])
     if 'maskV' not in keys:
-        print('creating maskV,this is going to be very slow!')
-        maskV = mask_v_node(maskC,tp)
+        logger.info('creating maskV,this is going to be very slow!')
+        maskV = derive_mask(od,'V',maskC,tp).to_array()
         od._ds['maskV'] = od._ds['Z']+od._ds['YG']
         od._ds['maskV'].values = maskV
     else:
         maskV = np.array(od._ds['maskV'])
     if 'maskWvel' not in keys:
         # there is a maskW with W meaning West in ECCO
-        print('creating maskW,this is going to be somewhat slow')
-        maskW = mask_w_node(maskC)
+        logger.info('creating maskW,this is going to be somewhat slow')
+        maskW = derive_mask(od,'Wvel',maskC,tp).to_array()
         od._ds['maskWvel'] = od._ds['Z']+od._ds['YC']
         od._ds['maskWvel'].values = maskW
         # this dimension is actually not quite right
@@ -100,46 +226,70 @@ def get_masks(od,tp):
         maskW = np.array(od._ds['maskWvel'])
     return maskC,maskU,maskV,maskW
 
+# The derived masks are shared by every OceData of the process
+# (OceInterp makes a new one each time it is given a Dataset),
+# keyed by the grid type, the mask_checksum of maskC and the mask name.
+# They are compact, so they are simply kept.
+derived_masks = {}
+
+class MaskManager(object):
+    '''
+    Owned by OceData (OceData.masks).
+    Every mask is read from the dataset one level at a time (see compact_mask)
+    and kept in its compact form, masks missing from the dataset
+    are derived from the compact maskC once per process (derived_masks).
+    All the lookups go through MaskManager.lookup.
+    '''
+    def __init__(self,od):
+        self.od = od
+        self.compact = {}
+        self.has_maskC = 'maskC' in od._ds.keys()
+        self._checksum = None
+
+    def checksum(self):
+        '''
+        mask_checksum of maskC, worked out from its compact form.
+        '''
+        if self._checksum is None:
+            self._checksum = mask_checksum(self.get('C'))
+        return self._checksum
+
+    def get(self,gridtype = 'C'):
+        '''
+        the compact mask of the gridtype,
+        derived from maskC if not in the dataset.
+        '''
+        name = 'mask'+gridtype
+        if name in self.compact.keys():
+            return self.compact[name]
+        if name in self.od._ds.keys():
+            self.compact[name] = compact_mask(self.od._ds[name])
+        else:
+            key = (self.od.tp.typ,self.checksum(),name)
+            if key not in derived_masks.keys():
+                logger.debug(f'creating {name}')
+                derived_masks[key] = derive_mask(self.od,gridtype,self.get('C'),self.od.tp,
+                                                 checksum = self.checksum())
+            self.compact[name] = derived_masks[key]
+        return self.compact[name]
+
+    @timed('mask')
+    def lookup(self,ind,gridtype = 'C'):
+        '''
+        whether the nodes at ind are wet, 
+        ind is a tuple of integer arrays, with the vertical index first.
+        '''
+        if gridtype not in ['C','U','V','Wvel']:
+            raise NotImplementedError('gridtype for mask not supported')
+        if not self.has_maskC:
+            warnings.warn('no maskC in the dataset, assuming nothing is masked.')
+            return np.ones_like(ind[0])
+        return self.get(gridtype).lookup(ind)
+
 def get_masked(od,ind,gridtype = 'C'):
-    if gridtype not in ['C','U','V','Wvel']:
-        raise NotImplementedError('gridtype for mask not supported')
-    keys = od._ds.keys()
-    if 'maskC' not in keys:
-        warnings.warn('no maskC in the dataset, assuming nothing is masked.')
-#         print('no maskC in the dataset, assuming nothing is masked.')
-        # od._ds.C_GRID_VARIABLE.to_masked_array().mask
-        return np.ones_like(ind[0])
-    elif gridtype == 'C':
-        return smart_read(od._ds.maskC,ind)
-    
-    name = 'mask'+gridtype
-    tp = topology(od)
-    maskC = np.array(od._ds['maskC'])
-    func_dic = {'U':mask_u_node,'V':mask_v_node,'Wvel':mask_w_node}
-    rename_dic = {
-        'U':lambda x: x if x!='X' else 'Xp1',
-        'V':lambda x: x if x!='Y' else 'Xp1',
-        'Wvel':lambda x: x if x!='Z' else 'Zl',
-    }
-    if name not in keys:
-        if rcParam['debug_level'] in ['high','very_high']:
-            print(f'creating {name}, this is going to be slow!')
-        small_mask = func_dic[gridtype](maskC,tp)
-        dims = tuple(map(
-                                           rename_dic[gridtype],
-                                           od._ds.maskC.dims
-                                       ))
-        sizes = tuple([len(od._ds[dim]) for dim in dims])
-#         print(sizes)
-        mask = np.zeros(sizes)
-        #indexing sensitive
-        old_size = small_mask.shape
-        slices = tuple([slice(0,i) for i in old_size])
-#         print(ind_str)
-        mask[slices] = small_mask
-        od._ds[name] = xr.DataArray(mask,
-                                    dims = dims
-                                   )
-        return mask[ind]
-    else:
-        return smart_read(od._ds[name],ind)
\ No newline at end of file
+    '''
+    kept for backward compatibility, see MaskManager.lookup
+    '''
+    if 'masks' not in od.__dict__.keys():
+        od.masks = MaskManager(od)
+    return od.masks.lookup(ind,gridtype = gridtype)
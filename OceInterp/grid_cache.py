@@ -0,0 +1,190 @@
+import os
+import shutil
+import hashlib
+import numpy as np
+
+from OceInterp.spatial_index import index_dict
+from OceInterp.compact_mask import PackedMask
+
+# bump this whenever what is stored in the cache changes
+cache_version = 3
+# the numpy arrays created by OceData.grid2array
+grid_vars = ['Z','dZ','Zl','dZl','dX','dY','XC','YC','CS','SN','XG','YG','rA']
+
+# the size of the corner tiles of XC,YC that go into the fingerprint
+corner_tile = 4
+
+def _corner_tiles(da,n = None):
+    '''
+    the first and the last n by n horizontal points of every face/tile,
+    at most two chunks of each face are read.
+    '''
+    if n is None:
+        n = corner_tile
+    if len(da.shape)<2:
+        return [np.array(da[:n]),np.array(da[-n:])]
+    return [np.array(da[...,:n,:n]),np.array(da[...,-n:,-n:])]
+
+def grid_fingerprint(od,key = None):
+    '''
+    A fingerprint of the model grid, computed on every OceData,
+    so it only reads metadata and a few values:
+    the dimensions and shape of XC,YC,XG,YG,
+    the corner tiles of every face of XC and YC (see _corner_tiles),
+    and the vertical grid (1d, hashed entirely).
+    Two grids that only differ away from the face corners
+    get the same fingerprint, give them different keys then.
+    If key is given, it is the fingerprint instead of the grid.
+    The masks are not part of it, derived masks carry
+    the checksum of the maskC they come from (mask_checksum).
+    '''
+    sha = hashlib.sha1()
+    sha.update(f'version{cache_version}'.encode())
+    if key is not None:
+        sha.update(f'key{key}'.encode())
+        return sha.hexdigest()
+    # the dataset, not the arrays OceData may have loaded already
+    def dataset(var):
+        return od._ds[od.alias.get(var,var)]
+    for var in ['XC','YC','XG','YG']:
+        try:
+            da = dataset(var)
+        except KeyError:
+            continue
+        sha.update(var.encode())
+        sha.update(repr((tuple(da.dims),tuple(da.shape))).encode())
+        if var in ['XC','YC']:
+            for tile in _corner_tiles(da):
+                sha.update(tile.astype('float32').tobytes())
+    for var in ['Z','Zl','dZ','dZl']:
+        sha.update(np.array(dataset(var)).astype('float64').tobytes())
+    return sha.hexdigest()
+
+def mask_checksum(maskC):
+    '''
+    derived masks are only valid for the maskC they are derived from.
+    maskC is read one level at a time (see compact_mask).
+    '''
+    sha = hashlib.sha1()
+    sha.update(repr(tuple(maskC.shape)).encode())
+    for k in range(maskC.shape[0]):
+        sha.update(np.packbits(np.asarray(maskC[k]).ravel()!=0).tobytes())
+    return sha.hexdigest()
+
+def _write_atomic(path,write):
+    '''
+    write into a temporary directory and rename it to path,
+    so that other processes never see a half written cache.
+    '''
+    tmp = f'{path}.tmp{os.getpid()}'
+    os.makedirs(tmp,exist_ok = True)
+    try:
+        write(tmp)
+        os.rename(tmp,path)
+    except OSError:
+        # somebody else has written it first
+        pass
+    finally:
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp,ignore_errors = True)
+
+class GridCache(object):
+    '''
+    On-disk cache of the grid arrays, the spatial index
+    and the derived masks of an OceData, stored in cache_dir/fingerprint/.
+    Everything is opened memory-mapped and read-only,
+    so a new OceData on a known grid opens almost instantly,
+    and the pages are shared by all the processes on a node.
+    '''
+    def __init__(self,cache_dir,fingerprint):
+        self.cache_dir = cache_dir
+        self.fingerprint = fingerprint
+        self.path = os.path.join(cache_dir,fingerprint)
+
+    def grid_path(self):
+        return os.path.join(self.path,'grid')
+
+    def index_path(self,index_type):
+        return os.path.join(self.path,'index_'+index_type)
+
+    def load_grid(self,od):
+        '''
+        put the cached arrays into od,
+        return whether the cache exists.
+        '''
+        path = self.grid_path()
+        if not os.path.isdir(path):
+            return False
+        for var in grid_vars:
+            fname = os.path.join(path,var+'.npy')
+            if os.path.exists(fname):
+                od[var] = np.asarray(np.load(fname,mmap_mode = 'r'))
+        return True
+
+    def save_grid(self,od):
+        os.makedirs(self.path,exist_ok = True)
+        def write(tmp):
+            for var in grid_vars:
+                if var in od.__dict__.keys():
+                    np.save(os.path.join(tmp,var+'.npy'),od.__dict__[var])
+        _write_atomic(self.grid_path(),write)
+
+    def load_index(self,index_type):
+        path = self.index_path(index_type)
+        if index_type not in index_dict.keys() or not os.path.isdir(path):
+            return None
+        return index_dict[index_type].load(path)
+
+    def save_index(self,index_type,index):
+        if index_type not in index_dict.keys():
+            return
+        os.makedirs(self.path,exist_ok = True)
+        _write_atomic(self.index_path(index_type),index.save)
+
+    def mask_path(self):
+        return os.path.join(self.path,'masks')
+
+    def load_mask(self,name,checksum):
+        '''
+        return the cached mask as a PackedMask,
+        None if it is not there or derived from a different maskC.
+        '''
+        fname = os.path.join(self.mask_path(),name+'.npz')
+        if not os.path.exists(fname):
+            return None
+        try:
+            with np.load(fname) as npz:
+                if str(npz['checksum']) != checksum:
+                    return None
+                bits = npz['bits']
+                shape = tuple([int(i) for i in npz['shape']])
+        except (OSError,ValueError,KeyError):
+            # half written or from an older version
+            return None
+        nh = int(np.prod(shape[1:]))
+        if bits.shape != (shape[0],(nh+7)//8):
+            return None
+        return PackedMask(shape,bits = bits)
+
+    def save_mask(self,name,mask,checksum):
+        '''
+        masks are 0 or 1, so they are stored bit-packed (like PackedMask)
+        and compressed, mask is read one level at a time.
+        '''
+        path = self.mask_path()
+        os.makedirs(path,exist_ok = True)
+        fname = os.path.join(path,name+'.npz')
+        tmp = f'{fname}.tmp{os.getpid()}.npz'
+        if not isinstance(mask,PackedMask):
+            mask = PackedMask(mask)
+        try:
+            np.savez_compressed(tmp,
+                                bits = mask.bits,
+                                shape = np.array(mask.shape),
+                                checksum = np.array(checksum))
+            os.replace(tmp,fname)
+        except OSError:
+            pass
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
@@ -6,7 +6,8 @@ import copy
 from OceInterp.kernel_and_weight import kernel_weight,get_weight_cascade
 from OceInterp.topology import topology
 from OceInterp.utils import get_combination
-from OceInterp.RuntimeConf import rcParam
+from OceInterp.RuntimeConf import rcParam,working_float
+from OceInterp.profiler import timed
 
 default_kernel = np.array([
     [0,0],
@@ -152,6 +153,7 @@ class KnW(object):
                      only_size[self.vkernel],
                      only_size[self.tkernel]))
     
+    @timed('weight')
     def get_weight(self,rx,ry,rz=0,rt=0,
                       pk4d = None,# All using the largest 
                       bottom_scheme = 'no flux'# None
@@ -195,7 +197,7 @@ class KnW(object):
         elif self.vkernel == 'nearest':
             zweight = [1]
 
-        weight = np.zeros((len(rx),len(self.kernel),nz,nt))
+        weight = np.zeros((len(rx),len(self.kernel),nz,nt),working_float())
         for jt in range(nt):
             for jz in range(nz):
                 weight[:,:,jz,jt] =   get_weight_cascade(rx,ry,
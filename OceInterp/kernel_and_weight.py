@@ -5,6 +5,7 @@ import copy
 
 from OceInterp.utils import get_combination
 from OceInterp.topology import topology
+from OceInterp.profiler import timed
 
 # default kernel for interpolation.
 default_kernel = np.array([
@@ -644,6 +645,7 @@ def get_weight_2layer(rx,ry,rz,pk1,pk2,bc = 'no_flux',
                 weight[i,m] = 0
     return weight
 
+@timed('cascade')
 def find_pk_4d(masked,russian_doll = default_russian_doll):
     maskedT = masked.T
     ind_shape = maskedT.shape
@@ -1,10 +1,17 @@
+import os
 import numpy as np
-import copy
+import logging
 from numba import njit
 
 from OceInterp.kernelNweight import KnW
-from OceInterp.eulerian import position
+from OceInterp.eulerian import position,location_fields
 from OceInterp.lat2ind import find_rel_time,find_rx_ry_oceanparcel
+from OceInterp.RuntimeConf import working_float
+from OceInterp.profiler import timed,count
+from OceInterp.progress import make_progress
+from OceInterp.snapshot import snapshots
+
+logger = logging.getLogger(__name__)
 
 deg2m = 6271e3*np.pi/180
 
@@ -108,6 +115,7 @@ class particle(position):
                  save_raw = False,
                  transport = False,
                  stop_criterion = None,
+                 progress = None,
                 **kwarg
                 ):
         self.from_latlon(**kwarg)
@@ -118,6 +126,7 @@ class particle(position):
             self.dzl_lin,
             self.bzl_lin
         ) = self.ocedata.find_rel_vl_lin(self.dep)
+        self.relative_precision()
         
         self.uname = uname
         self.vname = vname
@@ -139,6 +148,8 @@ class particle(position):
         
         #  user defined function to stop integration. 
         self.stop_criterion = stop_criterion
+        # None, bool, callback or OceInterp.progress.progress object
+        self.progress = make_progress(progress)
         
         # whether u,v,w is in m^3/s or m/s
         self.transport = transport
@@ -171,7 +182,7 @@ class particle(position):
             self.dv,
             self.dw,
             self.Vol
-        ) = [np.zeros(self.N).astype(float) for i in range(7)]
+        ) = [np.zeros(self.N,working_float()) for i in range(7)]
         if self.transport==True:
             self.get_vol()
         self.fillna()
@@ -197,12 +208,16 @@ class particle(position):
             self.yylist = [[] for i in range(self.N)]
             self.zzlist = [[] for i in range(self.N)]
             
-    def update_uvw_array(self
+    def update_uvw_array(self,itmin = None,itmax = None
                         ):
+        '''
+        prefetch the velocity for the time steps itmin to itmax,
+        by default those the particles are in.
+        '''
         uname = self.uname
         vname = self.vname
         wname = self.wname
-        if 'time' not in self.ocedata[uname].dims:
+        if not self.ocedata.describe(uname)['time']:
             try:
                 self.uarray
                 self.varray
@@ -216,8 +231,8 @@ class particle(position):
                         # I think it's fine
                         self.warray[0] = 0.0
         else:
-            self.itmin = int(np.min(self.it))
-            self.itmax = int(np.max(self.it))
+            self.itmin = int(np.min(self.it)) if itmin is None else itmin
+            self.itmax = int(np.max(self.it)) if itmax is None else itmax
             if self.itmax!=self.itmin:
                 self.uarray = np.array(self.ocedata[uname][self.itmin:self.itmax+1])
                 self.varray = np.array(self.ocedata[vname][self.itmin:self.itmax+1])
@@ -240,27 +255,31 @@ class particle(position):
             Vol = self.ocedata['vol'][sub.iz,sub.iy,sub.ix]
         self.Vol[which] = Vol
         
+    @timed('velocity')
     def get_u_du(self,which = None):
         if which is None:
             which = np.ones(self.N).astype(bool)
+        # w is on the izl levels, u,v use iz = izl_lin-1 set below
+        wsub = self.subset(which,fields = location_fields)
         if self.too_large:
             if self.wname is not None:
-                w     = self.subset(which).interpolate(self.wname,self.wknw)
-                dw    = self.subset(which).interpolate(self.wname,self.dwknw)
+                w     = wsub.interpolate(self.wname,self.wknw)
+                dw    = wsub.interpolate(self.wname,self.dwknw)
             else:
-                w  = np.zeros(self.subset(which).N,float)
-                dw = np.zeros(self.subset(which).N,float)
+                w  = np.zeros(wsub.N,float)
+                dw = np.zeros(wsub.N,float)
             self.iz = self.izl_lin-1
-            u,v   = self.subset(which).interpolate([self.uname,self.vname],
-                                                   [self.uknw ,self.vknw  ],
-                                                   vec_transform = False
-                                                  )
-            du,dv = self.subset(which).interpolate([self.uname,self.vname],
-                                                   [self.duknw,self.dvknw],
-                                                   vec_transform = False
-                                                  )
+            sub = self.subset(which,fields = location_fields)
+            u,v   = sub.interpolate([self.uname,self.vname],
+                                    [self.uknw ,self.vknw  ],
+                                    vec_transform = False
+                                  )
+            du,dv = sub.interpolate([self.uname,self.vname],
+                                    [self.duknw,self.dvknw],
+                                    vec_transform = False
+                                  )
         else:
-            if 'time' not in self.ocedata[self.uname].dims:
+            if not self.ocedata.describe(self.uname)['time']:
                 ifirst = 0
             else:
                 ifirst = self.itmin
@@ -268,27 +287,28 @@ class particle(position):
             if self.wname is not None:
                 i_min = [0 for i in self.warray.shape]
                 i_min[0] = ifirst
-                w     = self.subset(which).interpolate(self.wname,
-                                                       self.wknw ,
-                                                       prefetched = self.warray,
-                                                       i_min = i_min)
-                dw    = self.subset(which).interpolate(self.wname,
-                                                       self.dwknw,
-                                                       prefetched = self.warray,
-                                                       i_min = i_min)
+                w     = wsub.interpolate(self.wname,
+                                           self.wknw ,
+                                           prefetched = self.warray,
+                                           i_min = i_min)
+                dw    = wsub.interpolate(self.wname,
+                                           self.dwknw,
+                                           prefetched = self.warray,
+                                           i_min = i_min)
             else:
-                w = np.zeros(self.subset(which).N,float)
-                dw = np.zeros(self.subset(which).N,float)
+                w = np.zeros(wsub.N,float)
+                dw = np.zeros(wsub.N,float)
             
             self.iz = self.izl_lin-1
+            sub = self.subset(which,fields = location_fields)
             i_min = [0 for i in self.uarray.shape]
             i_min[0] = ifirst
-            u,v   = self.subset(which).interpolate([self.uname,self.vname],
+            u,v   = sub.interpolate([self.uname,self.vname],
                                     [self.uknw,self.vknw],vec_transform = False,
                                     prefetched = [self.uarray,self.varray],
                                     i_min = i_min,
                                    )
-            du,dv = self.subset(which).interpolate([self.uname,self.vname],
+            du,dv = sub.interpolate([self.uname,self.vname],
                                     [self.duknw,self.dvknw],vec_transform = False,
                                     prefetched = [self.uarray,self.varray],
                                     i_min = i_min,
@@ -563,6 +583,72 @@ class particle(position):
         self.yylist = [[] for i in range(self.N)]
         self.zzlist = [[] for i in range(self.N)]
         
+    def save_checkpoint(self,path,schedule = None):
+        '''
+        write the state of the particles to path as an uncompressed .npz,
+        every array of the particle ending with a particle axis
+        (like rx, or px of shape (4,N)), the recorder lists
+        (flattened, with their lengths) and the schedule of
+        to_list_of_time if given. The prefetched velocity
+        arrays are not saved, they are read again on load.
+        The file is written to path+'.tmp' first, so a run
+        killed while saving leaves the last checkpoint intact.
+        '''
+        arrays = {'N':np.array(self.N)}
+        for name,item in self.__dict__.items():
+            if name in ['uarray','varray','warray']:
+                continue
+            if isinstance(item,np.ndarray) and item.ndim>0 and item.shape[-1] == self.N:
+                arrays['state.'+name] = item
+            elif name.endswith('list') and isinstance(item,list) and len(item) == self.N:
+                lengths = np.array([len(i) for i in item],'int64')
+                values = [np.asarray(i) for i in item if len(i)>0]
+                arrays['list.'+name] = np.concatenate(values) if len(values)>0 else np.zeros(0)
+                arrays['length.'+name] = lengths
+        for name in ['itmin','itmax']:
+            if hasattr(self,name):
+                arrays['scalar.'+name] = np.array(getattr(self,name))
+        if schedule is not None:
+            stops,update,next_stop = schedule
+            arrays['schedule.stops'] = np.array(stops,'float64')
+            arrays['schedule.update'] = np.array(update,'float64')
+            arrays['schedule.next'] = np.array(next_stop)
+        with open(path+'.tmp','wb') as f:
+            np.savez(f,**arrays)
+        os.replace(path+'.tmp',path)
+
+    def load_checkpoint(self,path):
+        '''
+        put the state saved by save_checkpoint into this particle,
+        which should be created the same way as the one saved
+        (same dataset and keyword arguments).
+        return the schedule (stops,update,next stop) or None.
+        '''
+        with np.load(path) as f:
+            if int(f['N']) != self.N:
+                raise ValueError(f"checkpoint has {int(f['N'])} particles, not {self.N}")
+            for key in f.files:
+                kind,_,name = key.partition('.')
+                if kind == 'state':
+                    self.__dict__[name] = f[key]
+                elif kind == 'scalar':
+                    self.__dict__[name] = f[key].item()
+                elif kind == 'list':
+                    values = f[key].tolist()
+                    ends = np.cumsum(f['length.'+name])
+                    starts = ends-f['length.'+name]
+                    self.__dict__[name] = [values[a:b] for a,b in zip(starts,ends)]
+            if 'schedule.stops' in f.files:
+                schedule = (tuple(f['schedule.stops'].tolist()),
+                            tuple(f['schedule.update'].tolist()),
+                            int(f['schedule.next']))
+            else:
+                schedule = None
+        if not self.too_large:
+            self.update_uvw_array(itmin = self.__dict__.get('itmin'),
+                                  itmax = self.__dict__.get('itmax'))
+        return schedule
+
     def out_of_bound(self):
         x_out = np.logical_or(self.rx >0.5,self.rx < -0.5)
         y_out = np.logical_or(self.ry >0.5,self.ry < -0.5)
@@ -572,6 +658,9 @@ class particle(position):
     
     def trim(self,verbose = False,tol = 1e-6):
         # tol = 1e-6 # about 10 m horizontal
+        # closer to the wall than rx can resolve is on the wall,
+        # (only matters for rcParam['precision'] = 'float32')
+        tol = max(tol,4*np.finfo(self.rx.dtype).eps)
         xmax = np.nanmax(self.rx)
         xmin = np.nanmin(self.rx)
         ymax = np.nanmax(self.ry)
@@ -662,6 +751,7 @@ class particle(position):
         
         self.t[out] += contract_time
         
+    @timed('cell_change')
     def update_after_cell_change(self):
         self.iz,self.rz,self.dz,self.bz = self.ocedata.find_rel_v(self.dep)
         if self.face is not None:
@@ -713,7 +803,19 @@ class particle(position):
             self.rx = (dlon*np.cos(self.by*np.pi/180)*self.cs+dlat*self.sn)*deg2m/self.dx
             self.ry = (dlat*self.cs-dlon*self.sn*np.cos(self.by*np.pi/180))*deg2m/self.dy
         self.rzl_lin= (self.dep - self.bzl_lin)/self.dzl_lin
+        self.relative_precision()
+
+    def relative_precision(self):
+        '''
+        keep the relative coordinates in rcParam['precision'],
+        lon, lat, dep and t stay float64.
+        '''
+        dtype = working_float()
+        self.rx = self.rx.astype(dtype,copy = False)
+        self.ry = self.ry.astype(dtype,copy = False)
+        self.rzl_lin = self.rzl_lin.astype(dtype,copy = False)
     
+    @timed('step')
     def analytical_step(self,tf,which = None):
         
         if which is None:
@@ -726,9 +828,12 @@ class particle(position):
         if self.out_of_bound().any():
             raise Exception('this step should always be after trim...')
 
-        xs = [self.rx[which],self.ry[which],self.rzl_lin[which]-1/2]
-        us = [self.u[which],self.v[which],self.w[which]]
-        dus= [self.du[which],self.dv[which],self.dw[which]]
+        # the time to the walls and the move are worked out in float64 whatever
+        # rcParam['precision'] is, in float32 log(1+du/u*(0.5-x0)) rounds to 0
+        # for a particle close to a wall, and the wall would be skipped.
+        xs = [np.asarray(a,'float64') for a in [self.rx[which],self.ry[which],self.rzl_lin[which]-1/2]]
+        us = [np.asarray(a,'float64') for a in [self.u[which],self.v[which],self.w[which]]]
+        dus= [np.asarray(a,'float64') for a in [self.du[which],self.dv[which],self.dw[which]]]
         
         ts = time2wall(xs,us,dus)
             
@@ -810,23 +915,25 @@ class particle(position):
         else:
             self.iy[which],self.ix[which],self.izl_lin[which] = tiy,tix,tiz
     
-    def deepcopy(self):
+    def snapshot(self,fields = None):
+        '''
+        a position holding a copy of the per particle arrays
+        (only those in fields if given) and of the recorder lists.
+        '''
         p = position()
         p.ocedata = self.ocedata
         p.N = self.N
-        keys = self.__dict__.keys()
-        for i in keys:
-            item = self.__dict__[i]
+        for i,item in self.__dict__.items():
             if isinstance(item,np.ndarray):
-                if len(item.shape) ==1:
-                    p.__dict__[i] = copy.deepcopy(item)
-                else:
-                    pass
+                if len(item.shape) ==1 and (fields is None or i in fields):
+                    p.__dict__[i] = item.copy()
             elif isinstance(item,list):
-                p.__dict__[i] = copy.deepcopy(item)
-            else:
-                pass
+                # the lists only hold numbers, one level is enough
+                p.__dict__[i] = [list(j) if isinstance(j,list) else j for j in item]
         return p
+
+    def deepcopy(self):
+        return self.snapshot()
         
     def to_next_stop(self,t1):
         tol = 0.5
@@ -845,7 +952,9 @@ class particle(position):
             elif i > 10:
                 trim_tol = 1e-10
             self.trim(tol = trim_tol)
-            print(sum(todo),'left',end = ' ')
+            n_steps = np.sum(todo)
+            logger.debug('%d left',n_steps)
+            count('steps')
             self.analytical_step(tf,todo)
             self.update_after_cell_change()
             if self.transport==True:
@@ -855,24 +964,53 @@ class particle(position):
             todo = abs(tf)>tol
             if self.stop_criterion is not None:
                 todo = np.logical_and(todo,self.stop_criterion(self))
-            if sum(todo) == 0:
+            n_crossings = np.sum(todo)
+            if self.progress is not None:
+                self.progress.step(n_steps,n_crossings)
+            if n_crossings == 0:
                 break
             if self.save_raw:
                 # record those who cross the wall
                 self.note_taking(todo)
 #             self.contract()
         if i ==199:
-            print('maximum iteration count reached')
+            logger.warning('maximum iteration count reached')
         self.t = np.ones(self.N)*t1
         self.it,self.rt,self.dt,self.bt = self.ocedata.find_rel_t(self.t)
         self.it,_,_,_ = find_rel_time(self.t,self.ocedata.time_midp)
         self.it += 1
         
-    def to_list_of_time(self,normal_stops,update_stops = 'default',return_in_between  =True):
+    def to_list_of_time(self,normal_stops,update_stops = 'default',return_in_between  =True,
+                        checkpoint = None,checkpoint_every = 1,resume = False,
+                        snapshot_fields = None):
+        '''
+        returns the stops and an OceInterp.snapshot.snapshots
+        of the particles at each of them.
+        snapshot_fields: None or list
+            particle arrays (like 'u') to keep in the snapshots
+            on top of the location.
+        checkpoint: None or str
+            save the particles to this file (see save_checkpoint)
+            after every checkpoint_every stops.
+        resume: bool
+            start from the checkpoint file instead,
+            the particle should be created the same way as the one saved.
+            Only the stops after the checkpoint are returned,
+            and normal_stops and update_stops are taken from the file.
+        '''
+        if resume:
+            if checkpoint is None:
+                raise ValueError('resume needs the checkpoint file')
+            schedule = self.load_checkpoint(checkpoint)
+            if schedule is None:
+                raise ValueError(f'{checkpoint} was not saved by to_list_of_time, nothing to resume')
+            stops,update,start = schedule
+            return self._run_stops(stops,update,start,return_in_between,
+                                   checkpoint,checkpoint_every,snapshot_fields)
         t_min = np.minimum(np.min(normal_stops),self.t[0])
         t_max = np.maximum(np.max(normal_stops),self.t[0])
         
-        if 'time' not in self.ocedata[self.uname].dims:
+        if not self.ocedata.describe(self.uname)['time']:
             pass
         else:
             data_tmin = self.ocedata.ts.min()
@@ -888,10 +1026,18 @@ class particle(position):
         stops,update = list(zip(*temp))
 #         return stops,update
         self.get_u_du()
-        R = []
-        for i,tl in enumerate(stops):
-            print()
-            print(np.datetime64(round(tl),'s'))
+        return self._run_stops(stops,update,0,return_in_between,
+                               checkpoint,checkpoint_every,snapshot_fields)
+
+    def _run_stops(self,stops,update,start,return_in_between,
+                   checkpoint = None,checkpoint_every = 1,snapshot_fields = None):
+        n_out = len([i for i in range(start,len(stops)) if return_in_between or not update[i]])
+        R = snapshots(self.ocedata,self.N,n_out,fields = snapshot_fields)
+        if self.progress is not None:
+            self.progress.start(len(stops)-start)
+        for i in range(start,len(stops)):
+            tl = stops[i]
+            logger.debug('to %s',np.datetime64(round(tl),'s'))
             if self.save_raw:
                 # save the very start of everything. 
                 self.note_taking()
@@ -901,9 +1047,13 @@ class particle(position):
                     self.update_uvw_array()
                 self.get_u_du()
                 if return_in_between:
-                    R.append(self.deepcopy())
+                    R.append(self)
             else:
-                R.append(self.deepcopy())
+                R.append(self)
             if self.save_raw:
                 self.empty_lists()
-        return stops,R
\ No newline at end of file
+            if self.progress is not None:
+                self.progress.end_stop(i-start,tl)
+            if checkpoint is not None and ((i+1)%checkpoint_every == 0 or i+1 == len(stops)):
+                self.save_checkpoint(checkpoint,schedule = (stops,update,i+1))
+        return stops[start:],R
\ No newline at end of file
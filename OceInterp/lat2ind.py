@@ -1,5 +1,5 @@
 import numpy as np
-from numba import njit
+from numba import njit,prange
 from scipy import spatial
 
 @njit
@@ -42,13 +42,46 @@ def spherical2cartesian(Y, X, R=6371.0):
 
     return x, y, z
 
+@njit
+def bisect_nearest(array,value):
+    '''
+    index of the element nearest to value in an array sorted either way,
+    by binary search.
+    Same as np.argmin(np.abs(array - value)), the first one wins a tie.
+    '''
+    n = len(array)
+    if np.isnan(value):
+        return 0
+    ascending = array[n-1]>=array[0]
+    lo = 0
+    hi = n
+    while lo<hi:
+        mid = (lo+hi)//2
+        if ascending:
+            before = array[mid]<value
+        else:
+            before = array[mid]>value
+        if before:
+            lo = mid+1
+        else:
+            hi = mid
+    if lo == n:
+        idx = n-1
+    elif lo>0 and np.abs(array[lo-1]-value)<=np.abs(array[lo]-value):
+        idx = lo-1
+    else:
+        idx = lo
+    while idx>0 and array[idx-1] == array[idx]:
+        idx-=1
+    return idx
+
 @njit
 def find_ind_z(array, value):
     '''
     find the nearest level that is lower than the given level
     '''
     array = np.asarray(array)
-    idx = np.argmin(np.abs(array - value))
+    idx = bisect_nearest(array,value)
     if array[idx]>value:
     #z is special because it does not make much sense to interpolate beyond the two layers
         idx+=1
@@ -61,7 +94,7 @@ def find_ind_t(array, value):
     find the latest time that is before the given time
     '''
     array = np.asarray(array)
-    idx = np.argmin(np.abs(array - value))
+    idx = bisect_nearest(array,value)
     if array[idx]>value:
         idx-=1
     idx = int(idx)
@@ -73,7 +106,7 @@ def find_ind_nearest(array,value):
     just find the nearest
     '''
     array = np.asarray(array)
-    idx = np.argmin(np.abs(array - value))
+    idx = bisect_nearest(array,value)
     idx = int(idx)
     return idx,array[idx]
     
@@ -84,11 +117,15 @@ def find_ind_h(Xs,Ys,tree,h_shape):
     use ckd tree to find the indexes,
     2-index case can be thinked about as having only 1 face,
     we don't support that yet. but i think it would be easy.
+    tree can also be any index object from OceInterp.spatial_index.
     '''
-    x,y,z = spherical2cartesian(Ys,Xs)
-    _,index1d = tree.query(
-                np.array([x,y,z]).T
-            )
+    if isinstance(tree,spatial.cKDTree):
+        x,y,z = spherical2cartesian(Ys,Xs)
+        _,index1d = tree.query(
+                    np.array([x,y,z]).T
+                )
+    else:
+        index1d = tree.query(Xs,Ys)
     if len(h_shape) == 3:
         faces,iys,ixs = np.unravel_index((index1d), h_shape)    
     elif len(h_shape) ==2:
@@ -96,22 +133,22 @@ def find_ind_h(Xs,Ys,tree,h_shape):
         iys,ixs = np.unravel_index((index1d), h_shape)  
     return faces,iys,ixs
 
-@njit
+@njit(parallel = True)
 def find_rel_nearest(value,ts):
     its = np.zeros_like(value)
-    rts = np.ones_like(value)*0.0#the way to create zeros with float32 type
-    dts = np.ones_like(value)*0.0
-    bts = np.ones_like(value)*0.0
+    rts = np.zeros_like(value)# keep the float32 type
+    dts = np.zeros_like(value)
+    bts = np.zeros_like(value)
     
     DT = np.zeros(len(ts)+1)
     DT[1:-1] = ts[1:] - ts[:-1]
     DT[0] = DT[1]
     DT[-1] = DT[-2]
-    for i in range(len(value)):
+    for i in prange(len(value)):
         t = value[i]
         it,bt = find_ind_nearest(ts,t)
         delta_t = t-bt
-        if delta_t*DT[i]>0:   
+        if delta_t*DT[it+1]>0:   
             Delta_t = DT[it+1]
         else:
             Delta_t = DT[it]
@@ -122,7 +159,7 @@ def find_rel_nearest(value,ts):
         bts[i] = bt
     return its,rts,dts,bts
 
-@njit
+@njit(parallel = True)
 def find_rel_z(depth,some_z,some_dz):
     '''
     iz = the index
@@ -130,10 +167,11 @@ def find_rel_z(depth,some_z,some_dz):
     dz = cell_size
     '''
     izs = np.zeros_like(depth)
-    rzs = np.ones_like(depth)*0.0#the way to create zeros with float32 type
-    dzs = np.ones_like(depth)*0.0
-    bzs = np.ones_like(depth)*0.0
-    for i,d in enumerate(depth):
+    rzs = np.zeros_like(depth)# keep the float32 type
+    dzs = np.zeros_like(depth)
+    bzs = np.zeros_like(depth)
+    for i in prange(len(depth)):
+        d = depth[i]
         iz,bz = find_ind_z(some_z,d)
         izs[i] = iz 
         bzs[i] = bz
@@ -146,7 +184,7 @@ def find_rel_z(depth,some_z,some_dz):
         rzs[i] = delta_z/Delta_z
     return izs,rzs,dzs,bzs
 
-@njit
+@njit(parallel = True)
 def find_rel_time(time,ts):
     '''
     it = the index
@@ -158,7 +196,8 @@ def find_rel_time(time,ts):
     dts = np.ones(time.shape)*0.0
     bts = np.ones(time.shape)*0.0
     
-    for i,t in enumerate(time):
+    for i in prange(len(time)):
+        t = time[i]
         it,bt = find_ind_t(ts,t)
         delta_t = t-bt
         Delta_t = ts[it+1]-ts[it]
@@ -269,7 +308,7 @@ def find_rel_h_naive(Xs,Ys,some_x,some_y,some_dx,some_dy,CS,SN,tree):
     rx,ry = find_rx_ry_naive(Xs,Ys,bx,by,cs,sn,dx,dy)
     return faces,iys,ixs,rx,ry,cs,sn,dx,dy,bx,by
 
-def find_rel_h_oceanparcel(x,y,some_x,some_y,some_dx,some_dy,CS,SN,XG,YG,tree,tp):
+def find_rel_h_oceanparcel(x,y,some_x,some_y,some_dx,some_dy,CS,SN,XG,YG,tree,tp,table = None):
     h_shape = some_x.shape
     faces,iys,ixs = find_ind_h(x,
                                y,
@@ -288,7 +327,7 @@ def find_rel_h_oceanparcel(x,y,some_x,some_y,some_dx,some_dy,CS,SN,XG,YG,tree,tp
                                                ixs)
         px,py = find_px_py(XG,YG,tp,faces,
                                                iys,
-                                               ixs)
+                                               ixs,table = table)
     else:
         cs,sn,dx,dy,bx,by = read_h_without_face(some_x,
                                                some_y,
@@ -299,7 +338,7 @@ def find_rel_h_oceanparcel(x,y,some_x,some_y,some_dx,some_dy,CS,SN,XG,YG,tree,tp
                                                iys,
                                                ixs)
         px,py = find_px_py(XG,YG,tp,iys,
-                                               ixs)
+                                               ixs,table = table)
     rx,ry = find_rx_ry_oceanparcel(x,y,px,py)
     return faces,iys,ixs,rx,ry,cs,sn,dx,dy,bx,by
     
@@ -324,7 +363,22 @@ def find_cs_sn(thetaA,phiA,thetaB,phiB):
     CS = np.sign(thetaB-thetaA)*np.sqrt(1-SN**2)
     return CS,SN
 
-def find_px_py(XG,YG,tp,*ind,gridoffset = -1):
+def corner_table(XG,YG,tp):
+    '''
+    find_px_py of every cell of the grid,
+    two (4,number of cells) arrays, the cell is the flat index.
+    '''
+    ind = tuple(i.ravel() for i in np.indices(XG.shape))
+    return find_px_py(XG,YG,tp,*ind)
+
+def find_px_py(XG,YG,tp,*ind,gridoffset = -1,table = None):
+    '''
+    the longitude and latitude of the 4 corners of the cells,
+    read from table (see corner_table) if given.
+    '''
+    if table is not None and gridoffset == -1:
+        cell = np.ravel_multi_index(tuple(np.asarray(i,'int64') for i in ind),XG.shape)
+        return table[0][:,cell],table[1][:,cell]
     N = len(ind[0])
     ind1 = tuple(i for i in tp.ind_tend_vec(ind,np.ones(N)*3,gridoffset = gridoffset))
     ind2 = tuple(i for i in tp.ind_tend_vec(ind1,np.zeros(N),gridoffset = gridoffset))
@@ -346,41 +400,92 @@ def find_px_py(XG,YG,tp,*ind,gridoffset = -1):
     return px,py
 
 @njit
-def find_rx_ry_oceanparcel(x,y,px,py):
-    rx = np.ones_like(x)*0.0
-    ry = np.ones_like(y)*0.0
-    x0 = px[0]
-    
-    x = to_180(x-x0)
-    px = to_180(px-x0)
-    
-    invA = np.array([[1., 0., 0., 0.],
-                         [-1., 1., 0., 0.],
-                         [-1., 0., 0., 1.],
-                         [1., -1., 1., -1.]])
-    a = np.dot(invA,px)
-    b = np.dot(invA,py)
-    
-    aa = a[3]*b[2] - a[2]*b[3]
-    bb = a[3]*b[0] - a[0]*b[3] + a[1]*b[2] - a[2]*b[1] + x*b[3] - y*a[3]
-    cc = a[1]*b[0] - a[0]*b[1] + x*b[1] - y*a[1]
-    
+def _bilinear_inverse_one(x,y,px0,px1,px2,px3,py0,py1,py2,py3):
+    '''
+    rx,ry in [0,1] of (x,y) in the cell with corners p0,p1,p2,p3
+    (counterclockwise from the south west corner),
+    the x of the corners are already relative to p0.
+    '''
+    a0 = px0
+    a1 = px1-px0
+    a2 = px3-px0
+    a3 = px0-px1+px2-px3
+    b0 = py0
+    b1 = py1-py0
+    b2 = py3-py0
+    b3 = py0-py1+py2-py3
+
+    aa = a3*b2 - a2*b3
+    bb = a3*b0 - a0*b3 + a1*b2 - a2*b1 + x*b3 - y*a3
+    cc = a1*b0 - a0*b1 + x*b1 - y*a1
+
     det2 = bb*bb-4*aa*cc
-    
-    order1 = np.abs(aa)<1e-12
-    order2 = np.logical_and(~order1,det2>=0)
-#     nans   = np.logical_and(~order1,det2< 0)
-    
-#     ry[order1] = -(cc/bb)[order1]
-    ry = -(cc/bb) # if it is supposed to be nan, just try linear solve. 
-    ry[order2] = ((-bb+np.sqrt(det2))/(2*aa))[order2]
-#     ry[nans  ] = np.nan
-    
-    rot_rectilinear = np.abs(a[1]+a[3]*ry) < 1e-12
-    rx[rot_rectilinear ] = ((y-py[0])/(py[1]-py[0]) + (y-py[3])/(py[2]-py[3]))[rot_rectilinear] * .5
-    rx[~rot_rectilinear] = ((x-a[0]-a[2]*ry) / (a[1]+a[3]*ry))[~rot_rectilinear]
-        
-    return rx-1/2,ry-1/2
+    if abs(aa)<1e-12 or det2<0:
+        # (almost) a parallelogram, linear in ry
+        ry = -cc/bb if bb != 0 else np.nan
+    elif bb>0:
+        # the same root as (-bb+sqrt(det2))/(2*aa) without the cancellation
+        ry = 2*cc/(-bb-np.sqrt(det2))
+    else:
+        ry = (-bb+np.sqrt(det2))/(2*aa)
+
+    den = a1+a3*ry
+    if abs(den)>=1e-12:
+        rx = (x-a0-a2*ry)/den
+    else:
+        # the cell is rotated by 90 degrees, use y instead
+        rx = 0.0
+        n = 0
+        if py1 != py0:
+            rx+= (y-py0)/(py1-py0)
+            n+=1
+        if py2 != py3:
+            rx+= (y-py3)/(py2-py3)
+            n+=1
+        rx = rx/n if n>0 else np.nan
+    if not (np.isfinite(rx) and np.isfinite(ry)):
+        # the cell has collapsed into a line (or a point),
+        # take the least squares solution of the mapping at the center.
+        j11 = a1+0.5*a3
+        j12 = a2+0.5*a3
+        j21 = b1+0.5*b3
+        j22 = b2+0.5*b3
+        dx = x-(a0+0.5*a1+0.5*a2+0.25*a3)
+        dy = y-(b0+0.5*b1+0.5*b2+0.25*b3)
+        norm = j11*j11+j12*j12+j21*j21+j22*j22
+        if norm>0:
+            rx = 0.5+(j11*dx+j21*dy)/norm
+            ry = 0.5+(j12*dx+j22*dy)/norm
+        else:
+            rx = 0.5
+            ry = 0.5
+    return rx,ry
+
+@njit(parallel = True)
+def _bilinear_inverse(x,y,px,py):
+    n = len(x)
+    rx = np.empty(n)
+    ry = np.empty(n)
+    for i in prange(n):
+        x0 = px[0,i]
+        rx[i],ry[i] = _bilinear_inverse_one(to_180(x[i]-x0),y[i],
+                                            0.0,to_180(px[1,i]-x0),
+                                            to_180(px[2,i]-x0),to_180(px[3,i]-x0),
+                                            py[0,i],py[1,i],py[2,i],py[3,i])
+        rx[i]-= 0.5
+        ry[i]-= 0.5
+    return rx,ry
+
+def find_rx_ry_oceanparcel(x,y,px,py):
+    '''
+    the relative position (-0.5 to 0.5) of the points (x,y)
+    in the cells with corners px,py (4,N),
+    by inverting the bilinear mapping of the cell.
+    '''
+    return _bilinear_inverse(np.ascontiguousarray(x,'float64'),
+                             np.ascontiguousarray(y,'float64'),
+                             np.ascontiguousarray(px,'float64'),
+                             np.ascontiguousarray(py,'float64'))
 
 def weight_f_node(rx,ry):
     return np.vstack([(0.5-rx)*(0.5-ry),
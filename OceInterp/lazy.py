@@ -0,0 +1,79 @@
+import uuid
+import numpy as np
+
+from OceInterp.eulerian import position
+from OceInterp.stream import spatial_order,batch_indexes,_take
+
+# Optional dependency
+try:
+    import dask
+    import dask.array as da
+except ImportError:  # pragma: no cover
+    dask = None
+
+# Lazy Eulerian interpolation:
+# the query points are cut into partitions of nearby points
+# (in the spatial order of OceInterp.stream),
+# each partition is a single dask task that locates,
+# reads (only the chunks it needs, through smart_read) and weights its points.
+# The results are put back in the order of the points at the end.
+# Nothing is computed until the returned dask arrays are.
+
+default_partition_size = 100000
+
+def _interp_partition(od,varList,kernelList,x,y,z,t,reorder):
+    pt = position()
+    pt.from_latlon(x = x,y = y,z = z,t = t,data = od,reorder = reorder)
+    R = []
+    for i,var in enumerate(varList):
+        result = pt.interpolate(var,kernelList[i])
+        if isinstance(var,list):
+            R += [np.asarray(r,'float64') for r in result]
+        else:
+            R.append(np.asarray(result,'float64'))
+    return R
+
+def eulerian_lazy(od,varList,kernelList,x,y,z,t,
+                  partition_size = default_partition_size,reorder = True):
+    '''
+    the Eulerian part of OceInterp, returning dask arrays
+    chunked by partition_size points.
+    '''
+    if dask is None:
+        raise ImportError('dask is needed for lazy interpolation')
+    N = max([len(np.atleast_1d(i)) for i in [x,y,z,t] if i is not None])
+    partition_size = int(max(1,partition_size))
+    n_part = -(-N//partition_size)
+    if n_part>1:
+        parts = list(batch_indexes(spatial_order(x,y,n_part),partition_size))
+    else:
+        parts = [np.arange(N)]
+    # the dataset is put into the graph once, under a fixed name,
+    # tokenizing it would mean hashing the whole grid.
+    od_d = dask.delayed(od,name = 'ocedata-'+uuid.uuid4().hex)
+    task = dask.delayed(_interp_partition,pure = False,nout = None)
+
+    n_out = sum([len(var) if isinstance(var,list) else 1 for var in varList])
+    pieces = [[] for i in range(n_out)]
+    for which in parts:
+        part = task(od_d,varList,kernelList,
+                    _take(x,which),_take(y,which),
+                    _take(z,which),_take(t,which),reorder)
+        for k in range(n_out):
+            pieces[k].append(da.from_delayed(part[k],shape = (len(which),),dtype = 'float64'))
+    flat = [da.concatenate(p) for p in pieces]
+    if n_part>1:
+        # back to the order of the points
+        back = np.argsort(np.concatenate(parts))
+        flat = [f[back] for f in flat]
+
+    R = []
+    k = 0
+    for var in varList:
+        if isinstance(var,list):
+            R.append(flat[k:k+len(var)])
+            k+=len(var)
+        else:
+            R.append(flat[k])
+            k+=1
+    return R
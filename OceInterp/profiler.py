@@ -0,0 +1,140 @@
+import time
+import logging
+import functools
+
+from OceInterp.RuntimeConf import rcParam
+
+# Named timers and counters on the hot paths.
+# Nothing is recorded unless rcParam['profile'] is True,
+# when it is off a timer costs a dictionary lookup.
+# Timers are inclusive, a timer running inside another one
+# is counted in both.
+
+logger = logging.getLogger(__name__)
+
+timers = dict()# name: [total seconds, calls]
+counters = dict()# name: total
+_last = dict()
+
+class _timer(object):
+    __slots__ = ['name','tic']
+    def __init__(self,name):
+        self.name = name
+    def __enter__(self):
+        self.tic = time.perf_counter()
+        return self
+    def __exit__(self,*arg):
+        record = timers.setdefault(self.name,[0.0,0])
+        record[0]+=time.perf_counter()-self.tic
+        record[1]+=1
+        return False
+
+class _null_timer(object):
+    __slots__ = []
+    def __enter__(self):
+        return self
+    def __exit__(self,*arg):
+        return False
+
+_null = _null_timer()
+
+def timer(name):
+    '''
+    with timer('read'):
+        ...
+    '''
+    if rcParam['profile']:
+        return _timer(name)
+    return _null
+
+def timed(name):
+    '''
+    decorator version of timer
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*arg,**kwarg):
+            if not rcParam['profile']:
+                return func(*arg,**kwarg)
+            with _timer(name):
+                return func(*arg,**kwarg)
+        return wrapper
+    return decorator
+
+def count(name,value = 1):
+    if rcParam['profile']:
+        counters[name] = counters.get(name,0)+value
+
+def reset():
+    timers.clear()
+    counters.clear()
+
+def report(as_frame = False):
+    '''
+    what has been recorded since the last reset,
+    a dict of {'timers':{name:{'total','calls','mean'}},'counters':{name:value}}
+    or a pandas.DataFrame with one row per name.
+    '''
+    R = {
+        'timers':{name:{'total':total,'calls':calls,'mean':total/max(calls,1)}
+                  for name,(total,calls) in timers.items()},
+        'counters':dict(counters),
+    }
+    if as_frame:
+        return _frame(R)
+    return R
+
+def _frame(R):
+    import pandas as pd
+    rows = dict()
+    for name,item in R['timers'].items():
+        rows[name] = dict(item)
+    for name,value in R['counters'].items():
+        rows[name] = {'count':value}
+    df = pd.DataFrame.from_dict(rows,orient = 'index',
+                                columns = ['total','calls','mean','count'])
+    return df.sort_values('total',ascending = False,na_position = 'last')
+
+def start_call():
+    '''
+    called at the start of OceInterp
+    '''
+    if rcParam['profile']:
+        reset()
+
+def end_call():
+    '''
+    called at the end of OceInterp,
+    keeps the report for last_report and logs it.
+    '''
+    global _last
+    if not rcParam['profile']:
+        return
+    _last = report()
+    if logger.isEnabledFor(logging.INFO):
+        lines = [f"{name:>12s} {item['total']:9.4f}s {item['calls']:7d} calls"
+                 for name,item in sorted(_last['timers'].items(),
+                                         key = lambda x:-x[1]['total'])]
+        lines+= [f'{name:>12s} {value}' for name,value in _last['counters'].items()]
+        logger.info('OceInterp profile\n'+'\n'.join(lines))
+
+def profiled(func):
+    '''
+    decorator, func is one OceInterp call
+    '''
+    @functools.wraps(func)
+    def wrapper(*arg,**kwarg):
+        start_call()
+        try:
+            return func(*arg,**kwarg)
+        finally:
+            end_call()
+    return wrapper
+
+def last_report(as_frame = False):
+    '''
+    the report of the last OceInterp call made with rcParam['profile'] on
+    '''
+    if as_frame:
+        return _frame(_last)
+    return _last
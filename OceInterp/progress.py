@@ -0,0 +1,108 @@
+import time
+import logging
+
+from OceInterp.RuntimeConf import rcParam
+
+# Progress of a Lagrangian run (particle.to_list_of_time).
+# particle.progress is one of these, the integration tells it
+# how many particle steps and wall crossings it has done,
+# and at most once every rcParam['progress_interval'] seconds
+# a status dict is handed to the callback (or logged).
+
+logger = logging.getLogger(__name__)
+
+def log_status(status):
+    '''
+    the default callback, one line at INFO level.
+    '''
+    logger.info('stop %d/%d, %.0f steps/s, %.0f crossings/s, %d left, eta %.0fs',
+                status['stop'],status['n_stops'],
+                status['steps_per_s'],status['crossings_per_s'],
+                status['left'],status['eta'])
+
+class progress(object):
+    '''
+    callback: a function taking the status dict,
+        with keys stop, n_stops, t, left, steps, crossings,
+        elapsed, steps_per_s, crossings_per_s and eta (seconds).
+    interval: the least number of seconds between two callbacks,
+        defaults to rcParam['progress_interval'].
+    '''
+    def __init__(self,callback = None,interval = None):
+        self.callback = callback or log_status
+        if interval is None:
+            interval = rcParam['progress_interval']
+        self.interval = interval
+        self.start(0)
+
+    def start(self,n_stops):
+        self.n_stops = n_stops
+        self.stop = 0
+        self.t = None
+        self.left = 0
+        self.steps = 0
+        self.crossings = 0
+        self.tic = time.perf_counter()
+        self.last = self.tic
+
+    def step(self,n_steps,n_crossings):
+        '''
+        n_steps particles were moved, n_crossings of them hit a wall.
+        '''
+        self.steps+=int(n_steps)
+        self.crossings+=int(n_crossings)
+        self.left = int(n_crossings)
+        self._maybe_report()
+
+    def end_stop(self,i,t):
+        self.stop = i+1
+        self.t = float(t)
+        self.left = 0
+        self._maybe_report(force = self.stop == self.n_stops)
+
+    def status(self):
+        elapsed = time.perf_counter()-self.tic
+        rate = elapsed if elapsed>0 else float('inf')
+        if self.stop>0:
+            eta = elapsed/self.stop*(self.n_stops-self.stop)
+        else:
+            eta = float('inf')
+        return {
+            'stop':self.stop,
+            'n_stops':self.n_stops,
+            't':self.t,
+            'left':self.left,
+            'steps':self.steps,
+            'crossings':self.crossings,
+            'elapsed':elapsed,
+            'steps_per_s':self.steps/rate,
+            'crossings_per_s':self.crossings/rate,
+            'eta':eta,
+        }
+
+    def _maybe_report(self,force = False):
+        now = time.perf_counter()
+        if force or now-self.last>=self.interval:
+            self.last = now
+            self.callback(self.status())
+
+def make_progress(thing):
+    '''
+    what particle(progress = thing) becomes:
+    None means rcParam['progress'],
+    False means no progress report,
+    True means logging through log_status,
+    a function is the callback,
+    and a progress object is used as it is.
+    '''
+    if thing is None:
+        thing = rcParam['progress']
+    if thing is False or thing is None:
+        return None
+    if thing is True:
+        return progress()
+    if isinstance(thing,progress):
+        return thing
+    if callable(thing):
+        return progress(callback = thing)
+    raise ValueError('progress should be None, a bool, a function or a progress object')
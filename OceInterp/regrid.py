@@ -0,0 +1,222 @@
+import uuid
+
+from OceInterp.eulerian import position,location_fields
+from OceInterp.OceData import OceData
+from OceInterp.OceInterp import _var_kernel_lists
+
+import numpy as np
+
+# Optional dependency
+try:
+    import dask
+    import dask.array as da
+except ImportError:  # pragma: no cover
+    dask = None
+
+# Regridding onto the product of 1d target axes.
+# The result is cut into blocks of whole target rows,
+# each block is located (and its horizontal kernels found) once,
+# by its own task, and shared by the chunks of that block
+# at every depth and time.
+# A chunk interpolates its rows one depth at a time
+# using views of the horizontal arrays, nothing is tiled.
+# The weights are still computed for every depth,
+# the kernel shrinks near land differently on every level.
+
+class _row_block(position):
+    '''
+    the target points i0 to i1 of base,
+    sharing the arrays of base
+    and the horizontal kernels in h_cache.
+    '''
+    def __init__(self,base,i0,i1,h_cache):
+        self.__dict__.update(base.subset(slice(i0,i1),fields = location_fields).__dict__)
+        self.base = base
+        self.i0 = i0
+        self.i1 = i1
+        self.h_cache = h_cache
+
+    def fatten_h(self,knw):
+        key = np.asarray(knw.kernel).tobytes()
+        if key not in self.h_cache.keys():
+            self.h_cache[key] = self.base.fatten_h(knw)
+        return tuple([None if a is None else a[self.i0:self.i1]
+                      for a in self.h_cache[key]])
+
+def _locate_rows(od,lon,lat,kernelList):
+    '''
+    the horizontal position of the target rows lat (all of lon),
+    and a cache of their horizontal kernels.
+    '''
+    LON,LAT = np.meshgrid(lon,lat)
+    hpt = position().from_latlon(x = LON.ravel(),y = LAT.ravel(),data = od)
+    h_cache = {}
+    for knw in kernelList:
+        for a_knw in (knw if isinstance(knw,list) else [knw]):
+            _row_block(hpt,0,0,h_cache).fatten_h(a_knw)
+    return hpt,h_cache
+
+def _target_shape(lon,lat,z,t):
+    shape = []
+    if t is not None:
+        shape.append(len(t))
+    if z is not None:
+        shape.append(len(z))
+    return tuple(shape)+(len(lat),len(lon))
+
+def _check_axes(od,varList,z,t):
+    '''
+    a variable that depends on time (depth) needs t (z).
+    '''
+    names = []
+    for var in varList:
+        names += list(var) if isinstance(var,list) else [var]
+    for name in names:
+        info = od.describe(name)
+        if info['time'] and t is None:
+            raise ValueError(f'{name} depends on time, t must be given')
+        if info['vertical'] is not None and z is None:
+            raise ValueError(f'{name} depends on depth, z must be given')
+
+def _regrid_chunk(located,varList,kernelList,nlon,zs,this_t):
+    '''
+    the values of the located rows (see _locate_rows) at depths zs
+    (None for no depth) and time this_t, one flat list of arrays
+    of shape (len(zs),nrow,nlon) (or (nrow,nlon) without depth).
+    '''
+    hpt,h_cache = located
+    pt = _row_block(hpt,0,hpt.N,h_cache)
+    nrow = hpt.N//nlon
+    if this_t is not None:
+        pt.set_t(np.full(pt.N,float(this_t)))
+    levels = [None] if zs is None else zs
+    n_out = sum([len(var) if isinstance(var,list) else 1 for var in varList])
+    R = [np.empty((len(levels),nrow,nlon)) for k in range(n_out)]
+    for kz,this_z in enumerate(levels):
+        if this_z is not None:
+            pt.set_v(np.full(pt.N,float(this_z)))
+        k = 0
+        for i,var in enumerate(varList):
+            result = pt.interpolate(var,kernelList[i])
+            if not isinstance(var,list):
+                result = [result]
+            for r in result:
+                R[k][kz] = np.asarray(r,'float64').reshape(nrow,nlon)
+                k+=1
+    if zs is None:
+        R = [r[0] for r in R]
+    return R
+
+def OceRegrid(od,varList,lon,lat,z = None,t = None,
+              kernelList = None,
+              max_points = 1e6,
+              lazy = True,
+              **kernel_kwarg):
+    '''
+    Interpolate onto a structured target grid,
+    the product of the 1d axes lon,lat(,z,t).
+    The target grid is cut into blocks of whole rows of lat,
+    about max_points points each. The horizontal location and kernel
+    of a block are found once and shared by every depth and time.
+    The result is chunked over the target grid,
+    each chunk is one block of rows at one time
+    and as many depths as fit in max_points points.
+    -------
+    od: OceInterp.OceData object or xarray.Dataset
+        the dataset to work on
+    varList: str or lst
+        (list of) variable/pair of variables, same as OceInterp
+    lon,lat: 1d numpy.ndarray
+        target longitude and latitude in degrees
+    z: 1d numpy.ndarray or None
+        target depth in meters, the deeper, the more negative.
+        Needed if a variable has a depth dimension.
+    t: 1d numpy.ndarray or None
+        target time, same unit as in OceInterp.
+        Needed if a variable has a time dimension.
+    max_points: int
+        the size of a chunk, in target points,
+        and of the blocks of rows that are located together
+    lazy: bool
+        return dask arrays, each chunk being one task,
+        otherwise numpy arrays computed chunk by chunk.
+
+    The results are in the order of varList, each of shape
+    (len(t),len(z),len(lat),len(lon)), with the t and z axis
+    dropped if they are None.
+    '''
+    if not isinstance(od,OceData):
+        od = OceData(od)
+    if lazy and dask is None:
+        raise ImportError('dask is needed for lazy regridding, use lazy = False')
+    varList,kernelList = _var_kernel_lists(varList,kernelList,kernel_kwarg)
+    _check_axes(od,varList,z,t)
+    lon = np.asarray(lon,'float64')
+    lat = np.asarray(lat,'float64')
+    nlat,nlon = len(lat),len(lon)
+    shape = _target_shape(lon,lat,z,t)
+
+    ts = [None] if t is None else list(t)
+    nz = 1 if z is None else len(z)
+    nrow = int(max(1,min(nlat,max_points//nlon)))
+    nzb = int(max(1,min(nz,max_points//(nrow*nlon))))
+    n_out = sum([len(var) if isinstance(var,list) else 1 for var in varList])
+    row_blocks = [(j0,min(nlat,j0+nrow)) for j0 in range(0,nlat,nrow)]
+    z_blocks = [(k0,min(nz,k0+nzb)) for k0 in range(0,nz,nzb)]
+
+    if lazy:
+        # the dataset goes into the graph once, under a fixed name,
+        # tokenizing it would mean hashing the whole grid.
+        od_d = dask.delayed(od,name = 'regrid-data-'+uuid.uuid4().hex)
+        locate = dask.delayed(_locate_rows,pure = False)
+        task = dask.delayed(_regrid_chunk,pure = False,nout = None)
+        # chunks[k][it][kb][jb]
+        chunks = [[[[None for jb in row_blocks] for kb in z_blocks] for it in ts]
+                  for k in range(n_out)]
+    else:
+        flat = [np.full(shape,np.nan) for k in range(n_out)]
+
+    for jb,(j0,j1) in enumerate(row_blocks):
+        if lazy:
+            located = locate(od_d,lon,lat[j0:j1],kernelList)
+        else:
+            located = _locate_rows(od,lon,lat[j0:j1],kernelList)
+        for it,this_t in enumerate(ts):
+            for kb,(k0,k1) in enumerate(z_blocks):
+                zs = None if z is None else np.asarray(z[k0:k1],'float64')
+                if lazy:
+                    block = (j1-j0,nlon) if z is None else (k1-k0,j1-j0,nlon)
+                    part = task(located,varList,kernelList,nlon,zs,this_t)
+                    for k in range(n_out):
+                        chunks[k][it][kb][jb] = da.from_delayed(part[k],shape = block,dtype = 'float64')
+                    continue
+                part = _regrid_chunk(located,varList,kernelList,nlon,zs,this_t)
+                where = []
+                if t is not None:
+                    where.append(it)
+                if z is not None:
+                    where.append(slice(k0,k1))
+                where = tuple(where)+(slice(j0,j1),slice(None))
+                for k in range(n_out):
+                    flat[k][where] = part[k]
+
+    if lazy:
+        flat = []
+        for k in range(n_out):
+            if z is None:
+                nested = [da.concatenate(c[0],axis = -2) for c in chunks[k]]
+            else:
+                nested = [da.concatenate([da.concatenate(c_z,axis = -2) for c_z in c],axis = 0)
+                          for c in chunks[k]]
+            flat.append(nested[0] if t is None else da.stack(nested))
+
+    R = []
+    k = 0
+    for var in varList:
+        if isinstance(var,list):
+            R.append(flat[k:k+len(var)])
+            k+=len(var)
+        else:
+            R.append(flat[k])
+            k+=1
+    return R
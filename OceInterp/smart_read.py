@@ -2,6 +2,9 @@ import numpy as np
 import xarray as xr
 from collections import OrderedDict as orderdic
 
+from OceInterp.profiler import timed,count
+
+@timed('read')
 def smart_read(da,ind):
 #     print('read called')
     the_shape = ind[0].shape
@@ -10,9 +13,12 @@ def smart_read(da,ind):
     xarray_more_efficient = 8
     if da.chunks is None:
         npck = np.array(da)
+        count('read_bytes',npck.nbytes)
         return npck[ind].reshape(the_shape)
     if np.prod([len(i) for i in da.chunks])<=memory_chunk:# if the number of chunks is small don't bother 
         npck = np.array(da)
+        count('read_bytes',npck.nbytes)
+        count('read_chunks',int(np.prod([len(i) for i in da.chunks])))
         return npck[ind].reshape(the_shape)
     cksz = orderdic(da.chunksizes)
     keys = list(cksz.keys())
@@ -39,6 +45,7 @@ def smart_read(da,ind):
     # this is the time limiting step for localized long query.
     ckus,inverse = np.unique(ckbl,axis = 0,return_inverse = True)
     # ckus is the individual chunks used
+    count('read_chunks',len(ckus))
     if len(ckus) <=xarray_more_efficient:
 #         print('use smart')
         for i,k in enumerate(ckus):
@@ -53,10 +60,14 @@ def smart_read(da,ind):
             prs = np.zeros(len(keys)).astype(int)
             prs[:last+1] = pre
             npck = eval(f'np.array(da[{",".join(ind_str)}])')
+            count('read_bytes',npck.nbytes)
             subind = tuple([ind[dim][which]-prs[dim] for dim in range(len(ind))])
             result[which] = npck[subind]
         return result.reshape(the_shape)
     else:
 #         print('use xarray')
         xrind = tuple([xr.DataArray(dim, dims=["x"]) for dim in ind])
-        return np.array(da[xrind]).reshape(the_shape)
\ No newline at end of file
+        # the chunks are read by dask, only the values are counted
+        result = np.array(da[xrind])
+        count('read_bytes',result.nbytes)
+        return result.reshape(the_shape)
\ No newline at end of file
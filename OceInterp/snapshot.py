@@ -0,0 +1,134 @@
+import numpy as np
+
+from OceInterp.eulerian import position
+from OceInterp.stream import point_bytes
+
+# What particle.to_list_of_time returns for every stop.
+# Only the location of the particles is kept,
+# in (n_stops,N) arrays, one row per stop.
+# snapshots[i] is a position of row i (like the full copies used to be),
+# the rest of what interpolate needs (cs,sn,izl,rzl) is derived on the way.
+# snapshots.interpolate does all the rows as one set of points.
+
+snapshot_fields = ['lon','lat','dep','t',
+                   'face','iy','ix','iz','it',
+                   'rx','ry','rz','rt']
+
+class snapshots(object):
+    '''
+    ocedata: OceData
+    N: number of particles
+    n_stops: number of rows
+    fields: the per particle arrays kept,
+        snapshot_fields plus whatever else is given.
+    '''
+    def __init__(self,ocedata,N,n_stops,fields = None):
+        self.ocedata = ocedata
+        self.N = N
+        self.n_stops = n_stops
+        self.fields = list(snapshot_fields)
+        for name in (fields or []):
+            # the recorder lists are always kept
+            if name not in self.fields and not name.endswith('list'):
+                self.fields.append(name)
+        self.stacked = dict()
+        self.dtypes = dict()
+        self.lists = [dict() for i in range(n_stops)]
+        self.n = 0
+
+    def append(self,p):
+        '''
+        copy the location of particle p into the next row
+        '''
+        if self.n>=self.n_stops:
+            raise IndexError('all the rows are already filled')
+        for name in self.fields:
+            item = p.__dict__.get(name)
+            if item is None:
+                self.stacked[name] = None
+                continue
+            if name not in self.stacked.keys():
+                item = np.asarray(item)
+                self.dtypes[name] = item.dtype
+                # integer indices fit in int32
+                dtype = 'int32' if item.dtype.kind in 'iu' else item.dtype
+                self.stacked[name] = np.empty((self.n_stops,)+item.shape,dtype)
+            self.stacked[name][self.n] = item
+        for name,item in p.__dict__.items():
+            if name.endswith('list') and isinstance(item,list):
+                self.lists[self.n][name] = [list(j) for j in item]
+        self.n+=1
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self[i]
+
+    def __getitem__(self,i):
+        if isinstance(i,slice):
+            return [self[j] for j in range(*i.indices(self.n))]
+        if i<0:
+            i+=self.n
+        if i<0 or i>=self.n:
+            raise IndexError('snapshot index out of range')
+        p = self._position({name:(None if a is None else a[i])
+                            for name,a in self.stacked.items()},self.N)
+        p.__dict__.update(self.lists[i])
+        return p
+
+    def rows(self,i0,i1):
+        '''
+        a position of all the particles in rows i0 to i1,
+        row after row.
+        '''
+        n = i1-i0
+        return self._position({name:(None if a is None else a[i0:i1].reshape((n*self.N,)+a.shape[2:]))
+                               for name,a in self.stacked.items()},n*self.N)
+
+    def interpolate(self,varName,knw,batch_memory = None,**kwarg):
+        '''
+        the same as [snap.interpolate(varName,knw) for snap in snapshots],
+        but the snapshots are put together and interpolated at once,
+        or in groups of rows using roughly batch_memory bytes.
+        '''
+        if self.n == 0:
+            return []
+        if batch_memory is None:
+            n_rows = self.n
+        else:
+            n_rows = int(max(1,batch_memory//(point_bytes([knw])*self.N)))
+        R = []
+        for i0 in range(0,self.n,n_rows):
+            i1 = min(self.n,i0+n_rows)
+            result = self.rows(i0,i1).interpolate(varName,knw,**kwarg)
+            if isinstance(result,(tuple,list)):
+                split = [np.reshape(r,(i1-i0,self.N)) for r in result]
+                R += [type(result)([s[j] for s in split]) for j in range(i1-i0)]
+            else:
+                R += list(np.reshape(result,(i1-i0,self.N)))
+        return R
+
+    def _position(self,arrays,N):
+        p = position()
+        p.ocedata = self.ocedata
+        p.tp = self.ocedata.tp
+        p.N = N
+        p.sort_order = None
+        p.unsort = None
+        for name,a in arrays.items():
+            if a is not None and name in self.dtypes.keys():
+                a = a.astype(self.dtypes[name],copy = False)
+            p.__dict__[name] = a
+        if p.face is not None:
+            p.cs = self.ocedata.CS[p.face,p.iy,p.ix]
+            p.sn = self.ocedata.SN[p.face,p.iy,p.ix]
+        else:
+            p.cs = self.ocedata.CS[p.iy,p.ix]
+            p.sn = self.ocedata.SN[p.iy,p.ix]
+        p.izl,p.rzl,p.dzl,p.bzl = self.ocedata.find_rel_vl(p.dep)
+        return p
+
+    def nbytes(self):
+        return sum([a.nbytes for a in self.stacked.values() if a is not None])
@@ -0,0 +1,454 @@
+import os
+import json
+import numpy as np
+import scipy
+from scipy.spatial import cKDTree
+from numba import njit,prange
+
+from OceInterp.utils import create_tree,spherical2cartesian
+from OceInterp.lat2ind import bisect_nearest
+
+# Spatial indexes answer one question: which grid point (flat index
+# into XC/YC) is the closest to a given (lon,lat).
+# Every index has a query(x,y) method returning the 1d index,
+# OceData(index = ...) decides which one to build.
+# save(path) and load(path) are used by the grid cache (OceInterp.grid_cache).
+
+class TreeIndex(object):
+    '''
+    The original index,
+    a single cKDTree built over the cartesian coordinates of all the points.
+    Accurate and fast to query, but slow to build and memory hungry
+    for large grids.
+    '''
+    def __init__(self,XC,YC,leafsize = 16):
+        self.h_shape = XC.shape
+        self.tree = create_tree(XC,YC,leafsize = leafsize)
+
+    def query(self,x,y):
+        x,y,z = spherical2cartesian(y,x)
+        _,index1d = self.tree.query(
+                    np.array([x,y,z]).T
+                )
+        return index1d
+
+    def save(self,path):
+        '''
+        the tree is stored as the flat arrays of its state
+        (points, node buffer, indices), never pickled,
+        so that loading it runs no code and the arrays can be memory-mapped.
+        '''
+        layout = []
+        points = None
+        for i,item in enumerate(self.tree.__getstate__()):
+            if isinstance(item,np.ndarray):
+                np.save(os.path.join(path,f'tree{i}.npy'),item,allow_pickle = False)
+                layout.append({'array':f'tree{i}.npy'})
+                if item.shape == self.tree.data.shape and item.dtype == self.tree.data.dtype:
+                    points = f'tree{i}.npy'
+            else:
+                layout.append({'value':item})
+        with open(os.path.join(path,'tree.json'),'w') as f:
+            json.dump({'h_shape':list(self.h_shape),
+                       'leafsize':int(self.tree.leafsize),
+                       'scipy':scipy.__version__,
+                       'points':points,
+                       'layout':layout},f)
+
+    @classmethod
+    def load(cls,path):
+        index = cls.__new__(cls)
+        with open(os.path.join(path,'tree.json')) as f:
+            meta = json.load(f)
+        index.h_shape = tuple(meta['h_shape'])
+        state = tuple(np.load(os.path.join(path,item['array']),mmap_mode = 'r')
+                      if 'array' in item.keys() else item['value']
+                      for item in meta['layout'])
+        if meta['scipy'] == scipy.__version__:
+            index.tree = cKDTree.__new__(cKDTree)
+            index.tree.__setstate__(state)
+        else:
+            # the layout of the state may have changed, rebuild from the points
+            points = np.load(os.path.join(path,meta['points']),mmap_mode = 'r')
+            index.tree = cKDTree(points,leafsize = meta['leafsize'])
+        return index
+
+@njit
+def _unit_xyz(lon,lat):
+    lon = np.deg2rad(lon)
+    lat = np.deg2rad(lat)
+    return np.cos(lat)*np.cos(lon),np.cos(lat)*np.sin(lon),np.sin(lat)
+
+@njit
+def _bucket_keys(lon,lat,h,K):
+    '''
+    which bucket each point is in, -1 for nan
+    '''
+    M = 2*K+1
+    n = len(lon)
+    keys = np.empty(n,np.int64)
+    for i in range(n):
+        if np.isnan(lon[i]) or np.isnan(lat[i]):
+            keys[i] = -1
+            continue
+        x,y,z = _unit_xyz(np.float64(lon[i]),np.float64(lat[i]))
+        kx = int(np.floor(x/h))+K
+        ky = int(np.floor(y/h))+K
+        kz = int(np.floor(z/h))+K
+        keys[i] = (kx*M+ky)*M+kz
+    return keys
+
+@njit
+def _slot(key,bits):
+    # fibonacci hashing
+    return ((key*np.int64(-7046029254386353131))>>(64-bits))&((1<<bits)-1)
+
+@njit
+def _build_table(ukeys,bits):
+    '''
+    open addressing hash table from bucket key to bucket number
+    '''
+    size = 1<<bits
+    table_key = np.full(size,-1,np.int64)
+    table_val = np.full(size,-1,np.int32)
+    for j in range(len(ukeys)):
+        s = _slot(ukeys[j],bits)
+        while table_key[s]!=-1:
+            s = (s+1)&(size-1)
+        table_key[s] = ukeys[j]
+        table_val[s] = j
+    return table_key,table_val
+
+@njit
+def _lookup(key,table_key,table_val,bits):
+    size = 1<<bits
+    s = _slot(key,bits)
+    while True:
+        k = table_key[s]
+        if k == key:
+            return table_val[s]
+        if k == -1:
+            return -1
+        s = (s+1)&(size-1)
+
+@njit(parallel = True)
+def _bucket_query(qlon,qlat,table_key,table_val,bits,starts,order,xyz,edge,h,K,max_ring):
+    nq = len(qlon)
+    M = 2*K+1
+    index1d = np.full(nq,-1,np.int64)
+    for i in prange(nq):
+        if np.isnan(qlon[i]) or np.isnan(qlat[i]):
+            continue
+        x,y,z = _unit_xyz(qlon[i],qlat[i])
+        kx = int(np.floor(x/h))+K
+        ky = int(np.floor(y/h))+K
+        kz = int(np.floor(z/h))+K
+        best = np.inf
+        besti = -1
+        found = False
+        for r in range(max_ring+1):
+            # only visit the shell of buckets at "distance" r
+            for dx in range(-r,r+1):
+                for dy in range(-r,r+1):
+                    for dz in range(-r,r+1):
+                        if max(abs(dx),abs(dy),abs(dz))!=r:
+                            continue
+                        j = _lookup(((kx+dx)*M+(ky+dy))*M+(kz+dz),
+                                    table_key,table_val,bits)
+                        if j<0:
+                            continue
+                        for k in range(starts[j],starts[j+1]):
+                            d = (xyz[k,0]-x)**2+(xyz[k,1]-y)**2+(xyz[k,2]-z)**2
+                            if d<best or (d == best and order[k]<order[besti]):
+                                best = d
+                                besti = k
+            # anything outside the buckets we have searched
+            # is further than r*h away
+            if besti>=0 and best<=(r*h)**2:
+                found = True
+                break
+        if not found:
+            # further than max_ring*h from every point, so outside the grid,
+            # the nearest point is on the edge of the grid.
+            for e in range(len(edge)):
+                k = edge[e]
+                d = (xyz[k,0]-x)**2+(xyz[k,1]-y)**2+(xyz[k,2]-z)**2
+                if d<best or (d == best and order[k]<order[besti]):
+                    best = d
+                    besti = k
+        index1d[i] = order[besti]
+    return index1d
+
+def _spacing(XC,YC,q = 50):
+    '''
+    the q-th percentile (100 for the largest) of the chord distance
+    (on a unit sphere) between neighboring points along both horizontal axes.
+    '''
+    lon = np.deg2rad(XC.astype('float64'))
+    lat = np.deg2rad(YC.astype('float64'))
+    x = np.cos(lat)*np.cos(lon)
+    y = np.cos(lat)*np.sin(lon)
+    z = np.sin(lat)
+    d = [np.sqrt(np.diff(x,axis = axis)**2+np.diff(y,axis = axis)**2+np.diff(z,axis = axis)**2).ravel()
+         for axis in [-1,-2] if XC.shape[axis]>1]
+    if len(d) == 0:
+        return np.nan
+    return float(np.nanpercentile(np.concatenate(d),q))
+
+def _edge_points(XC,YC):
+    '''
+    flat index of the points on the edge of the grid (of every face),
+    or next to a nan point.
+    '''
+    valid = np.isfinite(XC)&np.isfinite(YC)
+    pad = [(0,0)]*(valid.ndim-2)+[(1,1),(1,1)]
+    v = np.pad(valid,pad,constant_values = False)
+    inner = (v[...,2:,1:-1]&v[...,:-2,1:-1]&v[...,1:-1,2:]&v[...,1:-1,:-2])
+    return np.flatnonzero(valid&~inner)
+
+class BucketIndex(object):
+    '''
+    A coarse bucket grid with a refine step.
+    The points are hashed into cubic buckets of size h
+    (in units of earth radius) according to their position on the unit sphere.
+    A query looks at the buckets around the point (coarse step),
+    and compute the exact distance to every point in them (refine step),
+    widening the search until the nearest point is guaranteed to be found.
+    Queries with no point within max_ring buckets are outside the grid
+    (e.g. off a regional domain), for them only the points
+    on the edge of the grid are searched.
+    The answer is the same as the one from TreeIndex,
+    except for query points almost equally far from two grid points.
+
+    What is stored is a float32 copy of the unit vectors sorted by bucket,
+    the permutation and a hash table of the buckets,
+    which is a lot smaller and much faster to build than the cKDTree.
+    '''
+    def __init__(self,XC,YC,h = None,max_ring = None):
+        self.h_shape = XC.shape
+        if h is None:
+            # about 10 points in each bucket
+            h = 3*_spacing(XC,YC)
+            if not h>0:
+                h = 1e-2
+        self.h = h
+        self.K = int(np.ceil(1/h))+1
+        lon = np.ascontiguousarray(XC).ravel()
+        lat = np.ascontiguousarray(YC).ravel()
+        keys = _bucket_keys(lon,lat,self.h,self.K)
+        order = np.argsort(keys,kind = 'stable')
+        keys = keys[order]
+        valid = keys>=0
+        order = order[valid]
+        keys = keys[valid]
+        new = np.ones(len(keys),bool)
+        new[1:] = keys[1:]!=keys[:-1]
+        ukeys = keys[new]
+        self.starts = np.append(np.flatnonzero(new),len(keys)).astype('int64')
+        if len(order)<np.iinfo(np.int32).max:
+            order = order.astype('int32')
+        self.order = order
+        x,y,z = _unit_xyz(lon[order].astype('float64'),lat[order].astype('float64'))
+        self.xyz = np.empty((len(order),3),'float32')
+        self.xyz[:,0] = x
+        self.xyz[:,1] = y
+        self.xyz[:,2] = z
+        # a table at most half full
+        self.bits = max(int(np.ceil(np.log2(2*len(ukeys)+1))),1)
+        self.table_key,self.table_val = _build_table(ukeys,self.bits)
+        # position (in the sorted arrays) of the points on the edge
+        where = np.empty(len(lon),'int64')
+        where[order] = np.arange(len(order))
+        self.edge = where[_edge_points(XC,YC)]
+        if max_ring is None:
+            # A query inside the grid is within half a cell diagonal
+            # (less than the largest spacing) of a grid point,
+            # and the rings search at least r*h around the query,
+            # so ceil(largest spacing/h) rings always find it.
+            # A query with nothing within max_ring*h is outside the grid,
+            # only the edge points are searched then.
+            wide = _spacing(XC,YC,q = 100)
+            if not wide>0:
+                wide = h
+            max_ring = int(np.ceil(wide/h))+1
+        self.max_ring = max_ring
+
+    def query(self,x,y):
+        x = np.ascontiguousarray(x,dtype = 'float64').ravel()
+        y = np.ascontiguousarray(y,dtype = 'float64').ravel()
+        return _bucket_query(x,y,self.table_key,self.table_val,self.bits,
+                             self.starts,self.order,self.xyz,self.edge,
+                             self.h,self.K,self.max_ring)
+
+    array_names = ['starts','order','xyz','edge','table_key','table_val']
+    def save(self,path):
+        for name in self.array_names:
+            np.save(os.path.join(path,name+'.npy'),self.__dict__[name])
+        meta = dict(h_shape = list(self.h_shape),h = self.h,K = self.K,
+                    bits = self.bits,max_ring = self.max_ring)
+        with open(os.path.join(path,'bucket.json'),'w') as f:
+            json.dump(meta,f)
+
+    @classmethod
+    def load(cls,path):
+        '''
+        the arrays are memory-mapped, processes on the same node share them.
+        '''
+        index = cls.__new__(cls)
+        with open(os.path.join(path,'bucket.json')) as f:
+            meta = json.load(f)
+        meta['h_shape'] = tuple(meta['h_shape'])
+        index.__dict__.update(meta)
+        for name in cls.array_names:
+            index.__dict__[name] = np.asarray(np.load(os.path.join(path,name+'.npy'),mmap_mode = 'r'))
+        return index
+
+@njit
+def _nearest_on_axis(axis,value,uniform,periodic):
+    '''
+    index of the nearest element on a sorted 1d axis,
+    distance measured in longitude if periodic.
+    '''
+    n = len(axis)
+    if uniform:
+        # O(1) guess, checked against the neighbours below
+        i = int(np.floor((value-axis[0])/(axis[n-1]-axis[0])*(n-1)+0.5)) if n>1 else 0
+        i = min(max(i,0),n-1)
+    else:
+        i = bisect_nearest(axis,value)
+    best = -1
+    bestd = np.inf
+    for c in (i-1,i,i+1,0,n-1):
+        if c<0 or c>=n:
+            continue
+        d = value-axis[c]
+        if periodic:
+            d = (d+180)%360-180
+        d = abs(d)
+        if d<bestd or (d == bestd and c<best):
+            bestd = d
+            best = c
+    return best
+
+@njit(parallel = True)
+def _rectilinear_query(x,y,lon,lat,lon_uniform,lat_uniform):
+    n = len(x)
+    nx = len(lon)
+    index1d = np.full(n,-1,np.int64)
+    for i in prange(n):
+        if np.isnan(x[i]) or np.isnan(y[i]):
+            continue
+        # longitude relative to the first column, in [0,360)
+        rel = (x[i]-lon[0])%360+lon[0]
+        ix = _nearest_on_axis(lon,rel,lon_uniform,True)
+        iy = _nearest_on_axis(lat,y[i],lat_uniform,False)
+        index1d[i] = iy*nx+ix
+    return index1d
+
+def _is_uniform(axis):
+    '''
+    close enough to uniform for the O(1) guess
+    to be at most one point away from the answer.
+    '''
+    n = len(axis)
+    if n<3:
+        return True
+    linear = axis[0]+(axis[-1]-axis[0])*np.arange(n)/(n-1)
+    spacing = abs(axis[-1]-axis[0])/(n-1)
+    return bool(np.abs(axis-linear).max()<0.25*spacing)
+
+def is_rectilinear(XC,YC):
+    '''
+    whether the horizontal grid is a product of a 1d longitude
+    and a 1d latitude, both monotonic.
+    '''
+    if XC.ndim!=2:
+        return False
+    if not (np.all(XC == XC[:1]) and np.all(YC == YC[:,:1])):
+        return False
+    lon = (XC[0].astype('float64')-XC[0,0])%360
+    lat = YC[:,0].astype('float64')
+    if not np.all(np.diff(lon)>0):
+        return False
+    if not (np.all(np.diff(lat)>0) or np.all(np.diff(lat)<0)):
+        return False
+    return True
+
+class RectilinearIndex(object):
+    '''
+    For box or x_periodic grids that are just a lon/lat product.
+    Only the 1d longitude and latitude are kept,
+    a query is a binary search on each of them
+    (or plain arithmetic when the spacing is uniform),
+    there is nothing to build.
+    Longitude is compared modulo 360,
+    so it does not matter how it is wrapped.
+    '''
+    def __init__(self,XC,YC):
+        if not is_rectilinear(XC,YC):
+            raise ValueError('XC,YC is not a rectilinear grid, use another index')
+        self.h_shape = XC.shape
+        lon = XC[0].astype('float64')
+        self.lon = lon[0]+(lon-lon[0])%360
+        self.lat = YC[:,0].astype('float64')
+        self.lon_uniform = _is_uniform(self.lon)
+        self.lat_uniform = _is_uniform(self.lat)
+
+    def query(self,x,y):
+        x = np.ascontiguousarray(x,dtype = 'float64').ravel()
+        y = np.ascontiguousarray(y,dtype = 'float64').ravel()
+        return _rectilinear_query(x,y,self.lon,self.lat,
+                                  self.lon_uniform,self.lat_uniform)
+
+    array_names = ['lon','lat']
+    def save(self,path):
+        for name in self.array_names:
+            np.save(os.path.join(path,name+'.npy'),self.__dict__[name])
+        meta = dict(h_shape = list(self.h_shape),
+                    lon_uniform = self.lon_uniform,lat_uniform = self.lat_uniform)
+        with open(os.path.join(path,'rectilinear.json'),'w') as f:
+            json.dump(meta,f)
+
+    @classmethod
+    def load(cls,path):
+        index = cls.__new__(cls)
+        with open(os.path.join(path,'rectilinear.json')) as f:
+            meta = json.load(f)
+        meta['h_shape'] = tuple(meta['h_shape'])
+        index.__dict__.update(meta)
+        for name in cls.array_names:
+            index.__dict__[name] = np.load(os.path.join(path,name+'.npy'))
+        return index
+
+index_dict = {
+    'tree':TreeIndex,
+    'bucket':BucketIndex,
+    'rectilinear':RectilinearIndex,
+}
+
+def auto_index_type(XC,YC):
+    '''
+    rectilinear if possible, otherwise the tree
+    '''
+    if is_rectilinear(XC,YC):
+        return 'rectilinear'
+    return 'tree'
+
+def create_index(XC,YC,index = 'tree'):
+    '''
+    index can be a name in index_dict, 'auto' (see auto_index_type),
+    a class that is constructed with (XC,YC),
+    or an index object that is already built.
+    '''
+    if isinstance(index,str):
+        if index == 'auto':
+            index = auto_index_type(XC,YC)
+        if index not in index_dict.keys():
+            raise NotImplementedError(f'index must be one of {list(index_dict.keys())}')
+        return index_dict[index](XC,YC)
+    elif isinstance(index,type):
+        return index(XC,YC)
+    elif hasattr(index,'query'):
+        return index
+    else:
+        raise Exception('index type not recognized.')
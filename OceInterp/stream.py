@@ -0,0 +1,124 @@
+import os
+import numpy as np
+
+from OceInterp.eulerian import position
+
+# Streaming Eulerian interpolation:
+# position.interpolate creates several (n,m,nz,nt) arrays for every variable,
+# which does not fit in memory for 1e8 points.
+# Here the points are split into batches small enough for a memory budget,
+# ordered in space so that each batch reads a compact part of the dataset,
+# and the results are written into preallocated (possibly on-disk) arrays.
+
+# (n,m,nz,nt) arrays alive at the same time in position.interpolate:
+# 4 int64 indexes, the mask, the data and the weight.
+arrays_per_node = 7
+bytes_per_value = 8
+
+def _kernel_size(knw):
+    if isinstance(knw,list) or isinstance(knw,tuple):
+        return 2*max([_kernel_size(k) for k in knw])
+    m = len(knw.kernel)
+    nz = 1 if knw.vkernel == 'nearest' else 2
+    nt = 1 if knw.tkernel == 'nearest' else 2
+    return m*nz*nt
+
+def point_bytes(kernelList):
+    '''
+    rough peak memory needed per point,
+    variables are interpolated one at a time.
+    '''
+    nodes = max([_kernel_size(k) for k in kernelList])
+    return nodes*arrays_per_node*bytes_per_value
+
+def spatial_order(x,y,n_batch):
+    '''
+    sort the points into latitude bands,
+    and by longitude within each band,
+    so that a batch covers a compact area.
+    '''
+    if x is None or y is None:
+        return np.arange(max(len(np.atleast_1d(x)),len(np.atleast_1d(y))))
+    n_band = max(1,int(np.sqrt(n_batch)))
+    band = np.floor((np.asarray(y)+90)/180*n_band)
+    return np.lexsort((np.asarray(x)%360,band))
+
+def batch_indexes(order,batch_size):
+    '''
+    a generator of the indexes of the points in each batch
+    '''
+    for i in range(0,len(order),batch_size):
+        yield np.sort(order[i:i+batch_size])
+
+def _take(a,which):
+    if a is None:
+        return None
+    return np.asarray(a)[which]
+
+def interp_batches(od,varList,kernelList,x,y,z,t,batches,reorder = False):
+    '''
+    a generator of (which points, results) for each batch
+    '''
+    for which in batches:
+        pt = position()
+        pt.from_latlon(x = _take(x,which),y = _take(y,which),
+                       z = _take(z,which),t = _take(t,which),data = od,
+                       reorder = reorder)
+        R = []
+        for i,var in enumerate(varList):
+            R.append(pt.interpolate(var,kernelList[i]))
+        yield which,R
+
+def _var_file_name(var):
+    return str(var).replace('/','_')+'.npy'
+
+def allocate_output(varList,N,out = None):
+    '''
+    out can be
+    None: numpy arrays in memory,
+    a directory name: .npy files that are memory-mapped (see np.load),
+    a list shaped like the result: arrays to write into.
+    '''
+    if isinstance(out,list):
+        return out
+    def one(var):
+        if out is None:
+            return np.full(N,np.nan)
+        os.makedirs(out,exist_ok = True)
+        mm = np.lib.format.open_memmap(os.path.join(out,_var_file_name(var)),
+                                       mode = 'w+',dtype = 'float64',shape = (N,))
+        mm[:] = np.nan
+        return mm
+    R = []
+    for var in varList:
+        if isinstance(var,list):
+            R.append([one(v) for v in var])
+        else:
+            R.append(one(var))
+    return R
+
+def eulerian_stream(od,varList,kernelList,x,y,z,t,
+                    memory_limit,out = None,reorder = False):
+    '''
+    the Eulerian part of OceInterp, batch by batch,
+    using about memory_limit bytes at a time.
+    '''
+    N = max([len(np.atleast_1d(i)) for i in [x,y,z,t] if i is not None])
+    batch_size = int(max(1,memory_limit//point_bytes(kernelList)))
+    n_batch = -(-N//batch_size)
+    order = spatial_order(x,y,n_batch)
+    R = allocate_output(varList,N,out)
+    for which,result in interp_batches(od,varList,kernelList,x,y,z,t,
+                                       batch_indexes(order,batch_size),
+                                       reorder = reorder):
+        for i,var in enumerate(varList):
+            if isinstance(var,list):
+                for j in range(len(var)):
+                    R[i][j][which] = result[i][j]
+            else:
+                R[i][which] = result[i]
+    for r in R:
+        for a in (r if isinstance(r,list) else [r]):
+            if isinstance(a,np.memmap):
+                a.flush()
+    return R
@@ -0,0 +1,353 @@
+import numpy as np
+import xarray as xr
+
+from OceInterp.lat2ind import deg2m
+
+# Synthetic datasets for benchmarks and tests that need no network.
+# The variables are named like no_alias in OceData,
+# and the grids are the three that topology recognizes:
+# 13-face LLC, x_periodic and box.
+# The geometry is described by a function of the fractional index (u,v)
+# (and face), cell centers are at half integers and corners at integers,
+# every other grid variable is derived from it.
+
+grid_types = ['LLC','x_periodic','box']
+velocity_types = ['solid_body','shear','gyre']
+
+def _llc_lonlat(face,u,v,n,lon_w = -111.,lat_s = -80.,lat_cap = 60.):
+    '''
+    faces 0-5 are two columns of 3 faces from lat_s to lat_cap,
+    face 6 is the arctic cap made of square rings,
+    faces 7-12 are the other two columns, rotated.
+    '''
+    u = np.asarray(u,'float64')
+    v = np.asarray(v,'float64')
+    span = lat_cap-lat_s
+    if face<6:
+        column,k = divmod(face,3)
+        lon = lon_w+90*column+90*u/n
+        lat = lat_s+span*(k*n+v)/(3*n)
+    elif face == 6:
+        p = u/n-0.5
+        q = v/n-0.5
+        r = np.maximum(np.abs(p),np.abs(q))
+        rr = np.where(r == 0,1,r)
+        bottom = q<=-np.abs(p)
+        right = (p>=np.abs(q))&~bottom
+        top = (q>=np.abs(p))&~bottom&~right
+        lon = np.where(bottom,lon_w+90+90*(p+rr)/(2*rr),
+              np.where(right,lon_w+180+90*(q+rr)/(2*rr),
+              np.where(top,lon_w+270+90*(rr-p)/(2*rr),
+                           lon_w+360+90*(rr-q)/(2*rr))))
+        lat = 90-(90-lat_cap)*r/0.5
+    else:
+        column = 2 if face<10 else 3
+        k = (face-7)%3
+        lon = lon_w+90*column+90*v/n
+        lat = lat_cap-span*(k*n+u)/(3*n)
+    return (lon+180)%360-180,lat
+
+def _rect_lonlat(u,v,lon0,lat0,dlon,dlat):
+    lon = lon0+dlon*np.asarray(u,'float64')
+    lat = lat0+dlat*np.asarray(v,'float64')
+    return (lon+180)%360-180,lat
+
+def _distance(lon0,lat0,lon1,lat1):
+    '''
+    distance in meters, locally flat, like the rest of the package.
+    '''
+    dlon = (lon1-lon0+180)%360-180
+    dlat = lat1-lat0
+    return np.hypot(dlon*np.cos(np.deg2rad((lat0+lat1)/2)),dlat)*deg2m
+
+def _horizontal(f,ny,nx):
+    '''
+    all the horizontal grid variables of one face,
+    f(u,v) returns the lon,lat at fractional index u (x) and v (y).
+    '''
+    iy,ix = np.meshgrid(np.arange(ny,dtype = 'float64'),
+                        np.arange(nx,dtype = 'float64'),indexing = 'ij')
+    h = dict()
+    h['XC'],h['YC'] = f(ix+0.5,iy+0.5)
+    h['XG'],h['YG'] = f(ix,iy)
+    h['dxG'] = _distance(*f(ix,iy),*f(ix+1,iy))
+    h['dyG'] = _distance(*f(ix,iy),*f(ix,iy+1))
+    h['dxC'] = _distance(*f(ix,iy+0.5),*f(ix+1,iy+0.5))
+    h['dyC'] = _distance(*f(ix+0.5,iy),*f(ix+0.5,iy+1))
+    h['rA'] = h['dxC']*h['dyC']
+    # direction of the local x axis
+    x0,y0 = f(ix+0.4,iy+0.5)
+    x1,y1 = f(ix+0.6,iy+0.5)
+    ex = ((x1-x0+180)%360-180)*np.cos(np.deg2rad(h['YC']))
+    ey = y1-y0
+    norm = np.hypot(ex,ey)
+    h['CS'] = ex/norm
+    h['SN'] = ey/norm
+    # where the velocities are
+    h['XU'],h['YU'] = f(ix,iy+0.5)
+    h['XV'],h['YV'] = f(ix+0.5,iy)
+    return h
+
+def _smooth_field(lon,lat,seed,n_wave = 6):
+    '''
+    a sum of a few random waves on the sphere, roughly in [-1,1].
+    '''
+    rng = np.random.default_rng(seed)
+    lam = np.deg2rad(lon)
+    phi = np.deg2rad(lat)
+    field = np.zeros_like(lam)
+    for i in range(n_wave):
+        k = rng.integers(1,4)
+        l = rng.integers(1,4)
+        a,b = rng.uniform(0,2*np.pi,2)
+        field+= np.cos(k*lam+a)*np.cos(l*phi+b)
+    return field/np.sqrt(n_wave)
+
+def _velocity(kind,lon,lat,speed):
+    '''
+    eastward and northward velocity (m/s) of the analytic fields
+    '''
+    phi = np.deg2rad(lat)
+    lam = np.deg2rad(lon)
+    if kind == 'solid_body':
+        # rotation around the earth axis
+        return speed*np.cos(phi),np.zeros_like(phi)
+    elif kind == 'shear':
+        # zonal jets changing direction with latitude
+        return speed*np.sin(2*phi),np.zeros_like(phi)
+    elif kind == 'gyre':
+        # from the streamfunction psi = sin(2 lam) sin(2 phi)^2,
+        # u = -dpsi/dphi, v = dpsi/dlam/cos(phi), divergence free
+        ue = -speed*np.sin(2*lam)*np.sin(4*phi)
+        vn = 4*speed*np.cos(2*lam)*np.sin(phi)**2*np.cos(phi)
+        return ue,vn
+    raise ValueError(f'velocity should be one of {velocity_types}')
+
+def _to_local(ue,vn,cs,sn):
+    '''
+    inverse of local_to_latlon
+    '''
+    return ue*cs+vn*sn,-ue*sn+vn*cs
+
+def _closed_edges(grid,n_face,ny,nx):
+    '''
+    a boolean array of the cells next to a closed boundary,
+    a kernel there would have to step off the grid.
+    '''
+    edge = np.zeros((n_face,ny,nx),bool)
+    if grid == 'LLC':
+        from OceInterp.topology import llc_face_connect
+        for face in range(13):
+            up,down,left,right = llc_face_connect[face]
+            if up == 42:
+                edge[face,-3:] = True
+            if down == 42:
+                edge[face,:3] = True
+            if left == 42:
+                edge[face,:,:3] = True
+            if right == 42:
+                edge[face,:,-3:] = True
+    else:
+        edge[:,:3] = True
+        edge[:,-3:] = True
+        if grid == 'box':
+            edge[:,:,:3] = True
+            edge[:,:,-3:] = True
+    return edge
+
+def synthetic_dataset(grid = 'LLC',
+                      size = None,
+                      nz = 10,
+                      nt = 4,
+                      land_fraction = 0.3,
+                      velocity = 'solid_body',
+                      speed = 0.2,
+                      unsteady = 0.,
+                      chunks = None,
+                      path = None,
+                      layer_thickness = 10.,
+                      seed = 0,
+                      lon0 = -30.,lat0 = 10.,resolution = 0.5,
+                      lat_range = (-70.,70.),
+                     ):
+    '''
+    Build an xarray.Dataset that OceData can read.
+    -------
+    grid: 'LLC','x_periodic' or 'box'
+    size: int or (ny,nx)
+        LLC: number of cells along a face side (default 24),
+        others: (ny,nx) (default (60,120) and (40,60)).
+        x_periodic needs nx>50 to be recognized by topology.
+    nz,nt: int
+        number of levels and of time steps (daily).
+    land_fraction: float
+        fraction of the surface that is land,
+        the sea floor is smooth and gets deeper away from the coast,
+        so deeper levels have more land.
+        Cells next to a closed boundary are always land.
+    velocity: 'solid_body','shear' or 'gyre'
+        the analytic horizontal flow in UVELMASS,VVELMASS (m/s),
+        WVELMASS is 0.
+    speed: float
+        the velocity scale in m/s
+    unsteady: float
+        relative amplitude of the change of the flow in time
+    chunks: dict or None
+        passed to Dataset.chunk
+    path: str or None
+        if given, write to path (.zarr or .nc) and return the dataset
+        opened from there.
+    lon0,lat0,resolution: float
+        south west corner and cell size in degrees of the box grid
+    lat_range: tuple
+        latitude range of the x_periodic grid
+    '''
+    if grid not in grid_types:
+        raise ValueError(f'grid should be one of {grid_types}')
+    if grid == 'LLC':
+        n = 24 if size is None else int(size)
+        n_face,ny,nx = 13,n,n
+        hs = [_horizontal(lambda u,v,face = face:_llc_lonlat(face,u,v,n),n,n)
+              for face in range(13)]
+        h = {key:np.stack([hh[key] for hh in hs]) for key in hs[0].keys()}
+        hdims = ('face','Y','X')
+    else:
+        if size is None:
+            size = (60,120) if grid == 'x_periodic' else (40,60)
+        ny,nx = size
+        n_face = 1
+        if grid == 'x_periodic':
+            dlat = (lat_range[1]-lat_range[0])/ny
+            f = lambda u,v:_rect_lonlat(u,v,-180.,lat_range[0],360/nx,dlat)
+        else:
+            f = lambda u,v:_rect_lonlat(u,v,lon0,lat0,resolution,resolution)
+        h = {key:item[None] for key,item in _horizontal(f,ny,nx).items()}
+        hdims = ('Y','X')
+
+    Zl = -np.arange(nz)*layer_thickness
+    Z = Zl-layer_thickness/2
+    time = (np.datetime64('2000-01-01')+np.arange(nt)*np.timedelta64(1,'D')).astype('datetime64[ns]')
+
+    # bathymetry
+    field = _smooth_field(h['XC'],h['YC'],seed)
+    field[_closed_edges(grid,n_face,ny,nx)] = -np.inf
+    finite = np.isfinite(field)
+    # the closed boundaries already count as land
+    q = (land_fraction*field.size-np.sum(~finite))/np.sum(finite)
+    coast = np.quantile(field[finite],min(max(q,0),1))
+    if q<=0:
+        coast = np.nextafter(coast,-np.inf)
+    top = field[finite].max()
+    depth = np.where(field>coast,
+                     nz*layer_thickness*(0.2+0.8*(field-coast)/max(top-coast,1e-10)),
+                     0.)
+    maskC = (Z.reshape(-1,1,1,1)>-depth[None]).astype('float64')
+
+    # fields
+    salt = 35+np.sin(np.deg2rad(h['XC']))*np.cos(np.deg2rad(h['YC']))
+    salt = salt[None]+0.01*Z.reshape(-1,1,1,1)
+    etan = np.cos(np.deg2rad(h['YC']))
+    factor = 1+unsteady*np.sin(2*np.pi*np.arange(nt)/max(nt,1))
+    ue,vn = _velocity(velocity,h['XU'],h['YU'],speed)
+    uloc,_ = _to_local(ue,vn,h['CS'],h['SN'])
+    ue,vn = _velocity(velocity,h['XV'],h['YV'],speed)
+    _,vloc = _to_local(ue,vn,h['CS'],h['SN'])
+    # no flow into land
+    uwet = maskC*np.concatenate([maskC[...,:1],maskC[...,:-1]],axis = -1)
+    vwet = maskC*np.concatenate([maskC[...,:1,:],maskC[...,:-1,:]],axis = -2)
+    U = factor.reshape(-1,1,1,1,1)*(uloc[None]*uwet)[None]
+    V = factor.reshape(-1,1,1,1,1)*(vloc[None]*vwet)[None]
+
+    def squeeze(a):
+        if grid == 'LLC':
+            return a
+        return a.reshape(a.shape[:-3]+a.shape[-2:])
+
+    ds = xr.Dataset(coords = dict(
+        X = ('X',np.arange(nx)),Y = ('Y',np.arange(ny)),
+        Xp1 = ('Xp1',np.arange(nx)),Yp1 = ('Yp1',np.arange(ny)),
+        Z = ('Z',Z),Zl = ('Zl',Zl),time = ('time',time)))
+    if grid == 'LLC':
+        ds = ds.assign_coords(face = ('face',np.arange(13)))
+    gdims = tuple(['Yp1' if d == 'Y' else 'Xp1' if d == 'X' else d for d in hdims])
+    udims = tuple(['Xp1' if d == 'X' else d for d in hdims])
+    vdims = tuple(['Yp1' if d == 'Y' else d for d in hdims])
+    for key in ['XC','YC','CS','SN','rA','dxC','dyC']:
+        ds[key] = (hdims,squeeze(h[key]))
+    ds['XG'] = (gdims,squeeze(h['XG']))
+    ds['YG'] = (gdims,squeeze(h['YG']))
+    ds['dxG'] = (vdims,squeeze(h['dxG']))
+    ds['dyG'] = (udims,squeeze(h['dyG']))
+    ds['drF'] = ('Z',np.ones(nz)*layer_thickness)
+    ds['drC'] = ('Zl',np.ones(nz)*layer_thickness)
+    ds['Depth'] = (hdims,squeeze(depth))
+    ds['maskC'] = (('Z',)+hdims,squeeze(maskC))
+    ds['SALT'] = (('time','Z')+hdims,squeeze(np.broadcast_to(salt*maskC,(nt,)+maskC.shape).copy()))
+    ds['ETAN'] = (('time',)+hdims,squeeze(np.broadcast_to(etan*maskC[0],(nt,)+etan.shape).copy()))
+    ds['UVELMASS'] = (('time','Z')+udims,squeeze(U))
+    ds['VVELMASS'] = (('time','Z')+vdims,squeeze(V))
+    ds['WVELMASS'] = (('time','Zl')+hdims,np.zeros((nt,nz)+squeeze(etan).shape))
+    ds.attrs['grid'] = grid
+    ds.attrs['velocity'] = velocity
+
+    if chunks is not None:
+        ds = ds.chunk(chunks)
+    if path is not None:
+        return save_dataset(ds,path)
+    return ds
+
+def save_dataset(ds,path):
+    '''
+    write ds to path (.zarr or .nc) and open it again from there
+    '''
+    if str(path).endswith('.zarr'):
+        ds.to_zarr(path,mode = 'w')
+        return xr.open_zarr(path)
+    ds.to_netcdf(path)
+    return xr.open_dataset(path,chunks = {} if ds.chunks else None)
+
+def sample_points(ds,N,seed = 0,depth = True,time = True,near_edge = None):
+    '''
+    N random points (x,y,z,t) in the wet cells of ds,
+    away from closed boundaries.
+    z is above the bottom level and t within the time range in seconds,
+    as OceInterp takes them.
+    near_edge: None, True or False
+        True: only within 5 cells of a face edge,
+        where the kernels cross to other faces,
+        False: only further than that.
+    '''
+    rng = np.random.default_rng(seed)
+    grid = ds.attrs.get('grid','LLC' if 'face' in ds.dims else 'box')
+    wet = np.asarray(ds['maskC'][0])>0
+    if grid != 'LLC':
+        wet = wet[None]
+    wet = wet&~_closed_edges(grid,*wet.shape)
+    if near_edge is not None:
+        band = np.ones(wet.shape,bool)
+        band[:,5:-5,5:-5] = False
+        wet = wet&(band if near_edge else ~band)
+    cells = np.flatnonzero(wet)
+    pick = cells[rng.integers(0,len(cells),N)]
+    XC = np.asarray(ds['XC']).ravel()[pick]
+    YC = np.asarray(ds['YC']).ravel()[pick]
+    dx = np.asarray(ds['dxC']).ravel()[pick]/deg2m
+    # jitter within a fraction of the cell
+    y = YC+rng.uniform(-0.2,0.2,N)*dx
+    x = XC+rng.uniform(-0.2,0.2,N)*dx/np.maximum(np.cos(np.deg2rad(YC)),0.05)
+    x = (x+180)%360-180
+    z = None
+    t = None
+    if depth:
+        # between the surface and the sea floor, above the bottom level
+        Z = np.asarray(ds['Z'])
+        if 'Depth' in ds.variables:
+            bottom = np.asarray(ds['Depth']).ravel()[pick]
+        else:
+            bottom = np.asarray((ds['maskC']*ds['drF']).sum('Z')).ravel()[pick]
+        floor = np.minimum(bottom,-Z[-2] if len(Z)>1 else -Z[0])
+        z = -rng.uniform(0,1,N)*floor
+    if time:
+        ts = np.asarray(ds['time']).astype(float)/1e9
+        t = rng.uniform(ts[0],ts[-1],N)
+    return x,y,z,t
@@ -71,7 +71,11 @@ def box_ind_tend(ind,tend,iymax,ixmax):
         return (-1,-1)
     return (iy,ix)
 @njit
-def x_per_ind_tend(ind,tend,iymax,ixmax):
+def x_per_ind_tend(ind,tend,iymax,ixmax,gridoffset = 0):
+    '''
+    there is only one face, so gridoffset makes no difference,
+    it is taken so that f-node moves (find_px_py) wrap like the others.
+    '''
     iy,ix = ind
     if tend == 0:
         iy+=1
@@ -84,7 +88,7 @@ def x_per_ind_tend(ind,tend,iymax,ixmax):
     if (iy>iymax) or (iy<0):
         return (-1,-1)
     if ix>ixmax:
-        return (iy,ix-ixmax)
+        return (iy,ix-ixmax-1)
     if ix<0:
         return (iy,ixmax+ix+1)
     return (iy,ix)
@@ -216,6 +220,48 @@ def llc_get_uv_mask_from_face(faces):
                 VfromVvel[i] = np.cos(rot)
         return UfromUvel,UfromVvel,VfromUvel, VfromVvel
 
+def _llc_rotation_table():
+    '''
+    for every pair of faces (face,nface),
+    the cos and sin of how much nface is rotated from face,
+    always a multiple of 90 degrees so they are stored as integers.
+    Also returns whether the two faces are next to each other.
+    '''
+    table = np.zeros((13,13,2),'int8')
+    table[:,:,0] = 1
+    adjacent = np.eye(13,dtype = bool)
+    for face in range(13):
+        for nface in range(13):
+            if face == nface or nface not in llc_face_connect[face]:
+                continue
+            edge = np.where(llc_face_connect[face] == nface)[0][0]
+            nedge = np.where(llc_face_connect[nface] == face)[0][0]
+            rot = np.pi-directions[edge]+directions[nedge]
+            table[face,nface] = np.round([np.cos(rot),np.sin(rot)])
+            adjacent[face,nface] = True
+    return table,adjacent
+
+llc_face_rotation,llc_face_adjacent = _llc_rotation_table()
+
+def llc_four_matrix_for_uv(fface):
+    '''
+    llc_get_uv_mask_from_face for every row of the n*m fface at once,
+    every node is compared with the first node of its row.
+    Nodes off the grid (face -1) are masked anyway,
+    they are left unrotated instead of wrapping around to face 12.
+    '''
+    fface = np.asarray(fface).astype(int)
+    face0 = np.broadcast_to(fface[:,:1],fface.shape)
+    legal = (fface>=0)&(face0>=0)
+    face0 = np.where(legal,face0,0)
+    fface = np.where(legal,fface,0)
+    if not llc_face_adjacent[face0,fface].all():
+        raise ValueError('the kernel reaches a face that is not next to the face of the point')
+    rot = llc_face_rotation[face0,fface]
+    cos = rot[...,0].astype(float)
+    sin = rot[...,1].astype(float)
+    return cos,sin,-sin,cos.copy()
+
 class topology():
     def __init__(self,od,typ = None):
         h_shape = od['XC'].shape 
@@ -301,6 +347,10 @@ class topology():
             return tuple([-1 for i in ind])# the origin is invalid
         if not set(moves).issubset({0,1,2,3}):
             raise Exception('Illegal move. Must be 0,1,2,3')
+        # moves is changed below when crossing onto a rotated face,
+        # the caller's list (one per kernel node, shared by all the points)
+        # must not be, or the points after it walk in the wrong direction.
+        moves = list(moves)
         if self.typ in ['LLC','cubed_sphere']:
             face,iy,ix = ind
             for k in range(len(moves)):
@@ -387,6 +437,8 @@ class topology():
             
     def four_matrix_for_uv(self,fface):
         # apply get_uv_mask for the n*m matrix
+        if self.typ =='LLC':
+            return llc_four_matrix_for_uv(fface)
         UfromUvel,UfromVvel,VfromUvel, VfromVvel = [np.zeros(fface.shape) for i in range(4)]
         for i in range(fface.shape[0]):
             UfromUvel[i],UfromVvel[i],VfromUvel[i], VfromVvel[i] = self.get_uv_mask_from_face(fface[i])
@@ -0,0 +1,116 @@
+'''
+the steps of position.interpolate, one at a time
+'''
+import numpy as np
+
+from OceInterp.kernelNweight import KnW
+from OceInterp.kernel_and_weight import find_pk_4d
+from OceInterp.lagrangian import uknw,vknw
+from OceInterp.smart_read import smart_read
+
+from benchmarks import common
+
+knw_4d = KnW(vkernel = 'linear',tkernel = 'linear')
+
+class Fatten:
+    params = [['LLC','x_periodic'],['interior','edge'],[10**4,10**5]]
+    param_names = ['grid','points','N']
+
+    def setup(self,grid,points,N):
+        self.pt = common.position(grid,N,near_edge = (points == 'edge'))
+
+    def time_fatten(self,grid,points,N):
+        self.pt.fatten(knw_4d,fourD = True)
+
+    def peakmem_fatten(self,grid,points,N):
+        self.pt.fatten(knw_4d,fourD = True)
+
+class SmartRead:
+    '''
+    numpy: not chunked,
+    few_chunks: so few chunks the whole array is read,
+    smart: the points touch a few chunks, which are read one by one,
+    xarray: the points touch many chunks, xarray does the indexing.
+    '''
+    params = [['numpy','few_chunks','smart','xarray']]
+    param_names = ['strategy']
+    chunks = {
+        'numpy':None,
+        'few_chunks':{'time':2},
+        'smart':{'time':1,'face':1},
+        'xarray':{'time':1,'face':1},
+    }
+
+    def setup(self,strategy):
+        pt = common.position('LLC',10**4,chunks = self.chunks[strategy])
+        if strategy == 'smart':
+            pt = pt.subset(pt.face == 1)
+        self.da = pt.ocedata['SALT']
+        self.ind = pt.fatten(KnW(),required = self.da.dims)
+
+    def time_smart_read(self,strategy):
+        smart_read(self.da,self.ind)
+
+    def peakmem_smart_read(self,strategy):
+        smart_read(self.da,self.ind)
+
+class Masks:
+    params = [['LLC','x_periodic','box'],[10**4,10**5]]
+    param_names = ['grid','N']
+
+    def setup(self,grid,N):
+        self.pt = common.position(grid,N)
+        self.masked = self.pt.get_masked(knw_4d)
+
+    def time_get_masked(self,grid,N):
+        self.pt.get_masked(knw_4d)
+
+    def time_find_pk_4d(self,grid,N):
+        find_pk_4d(self.masked,russian_doll = knw_4d.inheritance)
+
+    def peakmem_find_pk_4d(self,grid,N):
+        find_pk_4d(self.masked,russian_doll = knw_4d.inheritance)
+
+class GetWeight:
+    params = [['interp','linear','dz','dt','dx','dy'],[10**4,10**5]]
+    param_names = ['kernel','N']
+    kernels = {
+        'interp':dict(),
+        'linear':dict(vkernel = 'linear',tkernel = 'linear'),
+        'dz':dict(vkernel = 'dz'),
+        'dt':dict(tkernel = 'dt'),
+        'dx':dict(hkernel = 'dx',h_order = 1,inheritance = None),
+        'dy':dict(hkernel = 'dy',h_order = 1,inheritance = None),
+    }
+
+    def setup(self,kernel,N):
+        self.knw = KnW(**self.kernels[kernel])
+        pt = common.position('LLC',N)
+        pt.fatten(self.knw,fourD = True)
+        self.pk4d = find_pk_4d(pt.get_masked(self.knw),russian_doll = self.knw.inheritance)
+        self.rx,self.ry = pt.rx,pt.ry
+        self.rz = pt.rz if self.knw.vkernel == 'nearest' else pt.rz_lin
+        self.rt = pt.rt if self.knw.tkernel == 'nearest' else pt.rt_lin
+
+    def time_get_weight(self,kernel,N):
+        self.knw.get_weight(self.rx,self.ry,rz = self.rz,rt = self.rt,pk4d = self.pk4d)
+
+    def peakmem_get_weight(self,kernel,N):
+        self.knw.get_weight(self.rx,self.ry,rz = self.rz,rt = self.rt,pk4d = self.pk4d)
+
+class Interpolate:
+    params = [['LLC','x_periodic','box'],['scalar','vector'],[10**4,10**5]]
+    param_names = ['grid','variable','N']
+
+    def setup(self,grid,variable,N):
+        self.pt = common.position(grid,N)
+        if variable == 'scalar':
+            self.var,self.knw = 'SALT',knw_4d
+        else:
+            self.var,self.knw = ['UVELMASS','VVELMASS'],[uknw,vknw]
+
+    def time_interpolate(self,grid,variable,N):
+        self.pt.interpolate(self.var,self.knw)
+
+    def peakmem_interpolate(self,grid,variable,N):
+        self.pt.interpolate(self.var,self.knw)
@@ -0,0 +1,33 @@
+'''
+building OceData and locating points horizontally
+'''
+import OceInterp as oi
+
+from benchmarks import common
+
+class OceDataConstruction:
+    params = [['LLC','x_periodic','box'],['tree','auto']]
+    param_names = ['grid','index']
+
+    def setup(self,grid,index):
+        self.ds = common.dataset(grid)
+
+    def time_construct(self,grid,index):
+        oi.OceData(self.ds,index = index)
+
+    def peakmem_construct(self,grid,index):
+        oi.OceData(self.ds,index = index)
+
+class FindRelH:
+    params = [['LLC','x_periodic','box'],[10**3,10**4,10**5]]
+    param_names = ['grid','N']
+
+    def setup(self,grid,N):
+        self.od = common.ocedata(grid)
+        self.x,self.y,_,_ = common.points(grid,N)
+
+    def time_find_rel_h(self,grid,N):
+        self.od.find_rel_h(self.x,self.y)
+
+    def peakmem_find_rel_h(self,grid,N):
+        self.od.find_rel_h(self.x,self.y)
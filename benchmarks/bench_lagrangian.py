@@ -0,0 +1,24 @@
+'''
+particle integration
+'''
+import OceInterp as oi
+
+from benchmarks import common
+
+class ToListOfTime:
+    params = [['LLC'],[10**3,10**4,10**5,10**6]]
+    param_names = ['grid','N']
+    timeout = 3600
+
+    def setup(self,grid,N):
+        od = common.ocedata(grid)
+        x,y,z,t = common.points(grid,N)
+        self.t0 = od.ts[0]
+        self.stop = od.ts[0]+43200.
+        self.pt = oi.particle(x = x,y = y,z = z,t = self.t0+0*x,data = od)
+
+    def time_to_list_of_time(self,grid,N):
+        self.pt.to_list_of_time([self.stop])
+
+    def peakmem_to_list_of_time(self,grid,N):
+        self.pt.to_list_of_time([self.stop])
@@ -0,0 +1,41 @@
+'''
+datasets and point sets shared by the benchmarks,
+built once per process.
+'''
+import numpy as np
+
+import OceInterp as oi
+from OceInterp.synthetic import synthetic_dataset,sample_points
+
+# small enough to build in a few seconds,
+# large enough that the hot paths dominate.
+sizes = {
+    'LLC':48,
+    'x_periodic':(120,240),
+    'box':(100,150),
+}
+nz = 10
+nt = 4
+
+_datasets = {}
+_ocedata = {}
+
+def dataset(grid = 'LLC',chunks = None):
+    key = (grid,str(chunks))
+    if key not in _datasets.keys():
+        _datasets[key] = synthetic_dataset(grid,sizes[grid],nz = nz,nt = nt,
+                                           velocity = 'gyre',chunks = chunks)
+    return _datasets[key]
+
+def ocedata(grid = 'LLC',chunks = None):
+    key = (grid,str(chunks))
+    if key not in _ocedata.keys():
+        _ocedata[key] = oi.OceData(dataset(grid,chunks))
+    return _ocedata[key]
+
+def points(grid,N,near_edge = None,seed = 0):
+    return sample_points(dataset(grid),int(N),seed = seed,near_edge = near_edge)
+
+def position(grid,N,near_edge = None,chunks = None):
+    x,y,z,t = points(grid,N,near_edge = near_edge)
+    return oi.position().from_latlon(x = x,y = y,z = z,t = t,data = ocedata(grid,chunks))
@@ -0,0 +1,216 @@
+'''
+A small runner for the asv-style benchmarks in this directory.
+
+Every benchmarks/bench_*.py holds classes with
+setup(*params), time_* and peakmem_* methods and params/param_names,
+the way asv writes them.
+time_* is timed and peakmem_* records the peak memory allocated
+during the call (tracemalloc), both after one warm up call
+so that numba compilation is not counted.
+setup is called again before every measurement.
+
+The results are saved per commit in
+benchmarks/results/<machine>/<commit>.json
+(ignored by git, they only mean something on the machine that made them).
+
+python -m benchmarks.run [-b regex] [--quick] [--repeat 3]
+python -m benchmarks.run compare <commit> <commit> [--factor 1.2]
+'''
+import os
+import re
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import importlib
+import itertools
+import subprocess
+import tracemalloc
+import contextlib
+
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+default_results = os.path.join(here,'results')
+
+def _git(*arg):
+    try:
+        return subprocess.run(['git']+list(arg),cwd = here,capture_output = True,
+                              text = True,check = True).stdout.strip()
+    except (OSError,subprocess.CalledProcessError):
+        return ''
+
+def current_commit():
+    commit = _git('rev-parse','--short=10','HEAD') or 'unknown'
+    if _git('status','--porcelain','--untracked-files=no'):
+        commit+='-dirty'
+    return commit
+
+def machine():
+    return platform.node() or 'unknown'
+
+def discover(pattern = None):
+    '''
+    (name,class,method name) of every benchmark matching pattern
+    '''
+    found = []
+    for file in sorted(os.listdir(here)):
+        if not (file.startswith('bench_') and file.endswith('.py')):
+            continue
+        module = importlib.import_module('benchmarks.'+file[:-3])
+        for cname,cls in sorted(vars(module).items()):
+            if not isinstance(cls,type) or cls.__module__ != module.__name__:
+                continue
+            for mname in sorted(dir(cls)):
+                if not (mname.startswith('time_') or mname.startswith('peakmem_')):
+                    continue
+                name = f'{file[:-3]}.{cname}.{mname}'
+                if pattern is None or re.search(pattern,name):
+                    found.append((name,cls,mname))
+    return found
+
+def param_sets(cls,quick = False):
+    params = getattr(cls,'params',[])
+    if len(params) == 0:
+        return [()]
+    if not isinstance(params[0],(list,tuple)):
+        params = [params]
+    if quick:
+        # only the smallest of every numerical parameter
+        params = [[min(p)] if all(isinstance(i,(int,float)) for i in p) else p
+                  for p in params]
+    return list(itertools.product(*params))
+
+def _setup(obj,p):
+    if hasattr(obj,'setup'):
+        with contextlib.redirect_stdout(io.StringIO()):
+            obj.setup(*p)
+
+def _call(obj,mname,p):
+    with contextlib.redirect_stdout(io.StringIO()):
+        getattr(obj,mname)(*p)
+
+def measure(cls,mname,p,repeat = 3):
+    obj = cls()
+    _setup(obj,p)
+    # warm up
+    _call(obj,mname,p)
+    _setup(obj,p)
+    if mname.startswith('peakmem_'):
+        tracemalloc.start()
+        try:
+            _call(obj,mname,p)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {'peakmem':peak}
+    times = []
+    for i in range(repeat):
+        if i>0:
+            _setup(obj,p)
+        tic = time.perf_counter()
+        _call(obj,mname,p)
+        times.append(time.perf_counter()-tic)
+    return {'min':min(times),'median':float(np.median(times))}
+
+def _key(p):
+    return ', '.join([str(i) for i in p])
+
+def run(pattern = None,quick = False,repeat = 3,results = default_results):
+    versions = {}
+    for lib in ['numpy','numba','xarray','dask']:
+        try:
+            versions[lib] = importlib.import_module(lib).__version__
+        except ImportError:
+            pass
+    record = {
+        'commit':current_commit(),
+        'date':time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine':machine(),
+        'python':platform.python_version(),
+        'versions':versions,
+        'results':{},
+    }
+    for name,cls,mname in discover(pattern):
+        record['results'][name] = {}
+        for p in param_sets(cls,quick = quick):
+            try:
+                value = measure(cls,mname,p,repeat = repeat)
+            except NotImplementedError:
+                continue
+            except Exception as e:
+                value = {'failed':f'{type(e).__name__}: {e}'}
+            record['results'][name][_key(p)] = value
+            print(f'{name}({_key(p)}): {_format(value)}',flush = True)
+
+    folder = os.path.join(results,record['machine'])
+    os.makedirs(folder,exist_ok = True)
+    path = os.path.join(folder,record['commit']+'.json')
+    with open(path,'w') as f:
+        json.dump(record,f,indent = 1)
+    print(f'saved to {path}')
+    return record
+
+def _format(value):
+    if 'failed' in value:
+        return 'failed '+value['failed']
+    if 'peakmem' in value:
+        return f"{value['peakmem']/1e6:.1f} MB"
+    return f"{value['min']*1e3:.2f} ms"
+
+def _number(value):
+    if 'peakmem' in value:
+        return value['peakmem']
+    if 'min' in value:
+        return value['min']
+    return None
+
+def load(commit,results = default_results):
+    folder = os.path.join(results,machine())
+    candidates = [f for f in os.listdir(folder) if f.startswith(commit)]
+    if len(candidates) != 1:
+        raise ValueError(f'{len(candidates)} results in {folder} match {commit}')
+    with open(os.path.join(folder,candidates[0])) as f:
+        return json.load(f)
+
+def compare(old,new,factor = 1.2,results = default_results):
+    '''
+    print new/old for every benchmark in both,
+    return the regressions (slower or bigger by more than factor).
+    '''
+    old = load(old,results)
+    new = load(new,results)
+    regressions = []
+    for name,by_param in new['results'].items():
+        for p,value in by_param.items():
+            before = old['results'].get(name,{}).get(p)
+            if before is None:
+                continue
+            a,b = _number(before),_number(value)
+            if a is None or b is None or a == 0:
+                continue
+            ratio = b/a
+            flag = '+' if ratio>factor else '-' if ratio<1/factor else ' '
+            if flag == '+':
+                regressions.append((name,p,ratio))
+            print(f'{flag} {ratio:6.2f} {_format(before):>12s} {_format(value):>12s}  {name}({p})')
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'run or compare the benchmarks')
+    parser.add_argument('command',nargs = '*',help = 'nothing to run, or compare <old> <new>')
+    parser.add_argument('-b','--bench',default = None,help = 'regex of benchmark names')
+    parser.add_argument('--quick',action = 'store_true',help = 'only the smallest sizes')
+    parser.add_argument('--repeat',type = int,default = 3)
+    parser.add_argument('--factor',type = float,default = 1.2)
+    parser.add_argument('--results',default = default_results)
+    arg = parser.parse_args()
+    if len(arg.command) == 0:
+        run(arg.bench,quick = arg.quick,repeat = arg.repeat,results = arg.results)
+    elif arg.command[0] == 'compare' and len(arg.command) == 3:
+        regressions = compare(arg.command[1],arg.command[2],factor = arg.factor,results = arg.results)
+        sys.exit(1 if regressions else 0)
+    else:
+        parser.error('unknown command')
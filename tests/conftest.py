@@ -0,0 +1,36 @@
+import os
+import sys
+import pytest
+
+# run from anywhere, without installing the package
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from OceInterp.synthetic import synthetic_dataset
+from OceInterp.OceData import OceData
+
+# Everything here runs offline on the small synthetic grids of
+# OceInterp.synthetic, the tests in old_tests need the real ECCO data.
+
+@pytest.fixture(scope = 'session')
+def llc_ds():
+    return synthetic_dataset('LLC',size = 24)
+
+@pytest.fixture(scope = 'session')
+def xper_ds():
+    return synthetic_dataset('x_periodic',size = (40,72))
+
+@pytest.fixture(scope = 'session')
+def box_ds():
+    return synthetic_dataset('box',size = (40,60))
+
+@pytest.fixture(scope = 'session')
+def llc(llc_ds):
+    return OceData(llc_ds)
+
+@pytest.fixture(scope = 'session')
+def xper(xper_ds):
+    return OceData(xper_ds)
+
+@pytest.fixture(scope = 'session')
+def box(box_ds):
+    return OceData(box_ds)
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from OceInterp.OceData import OceData
+from OceInterp.lagrangian import particle
+from OceInterp.synthetic import synthetic_dataset,sample_points
+
+class Crash(Exception):
+    pass
+
+@pytest.fixture(scope = 'module')
+def gyre():
+    ds = synthetic_dataset('LLC',size = 24,velocity = 'gyre',speed = 1.)
+    return ds,OceData(ds)
+
+def test_resume_after_crash(gyre,tmp_path):
+    ds,od = gyre
+    x,y,z,t = sample_points(ds,300,seed = 5)
+    ts = np.array(ds.time).astype(float)/1e9
+    stops = np.linspace(ts[0],ts[-1],9)[1:]
+    def new():
+        return particle(x = x,y = y,z = z,t = np.ones_like(x)*ts[0],data = od,save_raw = True)
+    path = str(tmp_path/'particles.npz')
+
+    full_stops,full = new().to_list_of_time(stops)
+
+    # die in the middle of the run
+    p = new()
+    to_next_stop = p.to_next_stop
+    ncall = [0]
+    def crashing(t1):
+        ncall[0]+=1
+        if ncall[0] == 6:
+            raise Crash
+        to_next_stop(t1)
+    p.to_next_stop = crashing
+    with pytest.raises(Crash):
+        p.to_list_of_time(stops,checkpoint = path)
+
+    resumed_stops,resumed = new().to_list_of_time(None,checkpoint = path,resume = True)
+    assert 0<len(resumed)<len(full)
+    k = len(full)-len(resumed)
+    assert np.array_equal(resumed_stops,full_stops[k:])
+    for a,b in zip(full[k:],resumed):
+        for name in ['lon','lat','dep','t','rx','ry','iz']:
+            assert np.array_equal(getattr(a,name),getattr(b,name),equal_nan = True),name
@@ -0,0 +1,46 @@
+import numpy as np
+
+from OceInterp.OceData import OceData
+from OceInterp.synthetic import synthetic_dataset
+
+def test_describe(llc):
+    info = llc.describe('SALT')
+    assert info['dims'] == ('time','Z','face','Y','X')
+    assert info['vertical'] == 'Z'
+    assert info['time']
+    assert info['mask'] == 'C'
+    assert info['bottom_scheme'] == 'no_flux'
+    assert (info['rx_shift'],info['ry_shift']) == (0.,0.)
+    assert info['mask_axes'] == (1,2,3,4)
+    assert info['shape'] == llc._ds['SALT'].shape
+    assert info['chunks'] is None
+
+    u = llc.describe('UVELMASS')
+    assert u['raw_dims'][-1] == 'Xp1'
+    assert u['dims'][-1] == 'X'
+    assert (u['rx_shift'],u['ry_shift']) == (0.5,0.)
+    v = llc.describe('VVELMASS')
+    assert (v['rx_shift'],v['ry_shift']) == (0.,0.5)
+
+    w = llc.describe('WVELMASS')
+    assert w['vertical'] == 'Zl'
+    assert w['mask'] == 'Wvel'
+    assert w['bottom_scheme'] is None
+
+    eta = llc.describe('ETAN')
+    assert eta['vertical'] is None
+    assert eta['mask_axes'] == (1,2,3)
+
+    # worked out once
+    assert llc.describe('SALT') is info
+    assert llc.var_info['SALT'] is info
+
+def test_forget_on_set():
+    ds = synthetic_dataset('box',size = (20,30))
+    od = OceData(ds)
+    before = od.describe('SALT')
+    od['SALT'] = ds['SALT'].chunk({'time':1})
+    assert 'SALT' not in od.var_info
+    after = od.describe('SALT')
+    assert after is not before
+    assert after['chunks'][0] == ds.sizes['time']
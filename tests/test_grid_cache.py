@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from OceInterp.OceData import OceData
+from OceInterp.grid_cache import grid_fingerprint
+from OceInterp.synthetic import synthetic_dataset
+
+def count_tasks(f,*arg,**kwarg):
+    callbacks = pytest.importorskip('dask.callbacks')
+    class Count(callbacks.Callback):
+        n = 0
+        def _posttask(self,*a):
+            Count.n+=1
+    with Count():
+        f(*arg,**kwarg)
+    return Count.n
+
+def chunked(size):
+    pytest.importorskip('dask')
+    ds = synthetic_dataset('LLC',size = size)
+    return ds.chunk({'Y':6,'X':6,'Yp1':6,'Xp1':6,'Z':5})
+
+def test_fingerprint_is_cheap():
+    # a few corner chunks, not the whole grid or the masks,
+    # however large the grid is
+    small = count_tasks(grid_fingerprint,OceData(chunked(24)))
+    ds = chunked(48)
+    assert count_tasks(grid_fingerprint,OceData(ds)) == small
+    assert small<ds['XC'].data.npartitions
+
+def test_fingerprint(llc_ds):
+    od = OceData(llc_ds)
+    fp = grid_fingerprint(od)
+    assert grid_fingerprint(OceData(llc_ds.copy())) == fp
+    # the masks are protected by their own checksum
+    ds = llc_ds.copy()
+    ds['maskC'] = ds['maskC']*0
+    assert grid_fingerprint(OceData(ds)) == fp
+    ds = llc_ds.copy()
+    ds['Z'] = ds['Z']*2
+    assert grid_fingerprint(OceData(ds)) != fp
+    ds = llc_ds.copy()
+    ds['XC'] = ds['XC']+1
+    assert grid_fingerprint(OceData(ds)) != fp
+    assert grid_fingerprint(od,key = 'mine') == grid_fingerprint(OceData(ds),key = 'mine') != fp
+
+def test_warm_open(llc_ds,tmp_path):
+    cold = OceData(llc_ds,cache_dir = str(tmp_path))
+    warm = OceData(llc_ds,cache_dir = str(tmp_path))
+    assert warm.cache.path == cold.cache.path
+    assert isinstance(np.load(warm.cache.grid_path()+'/XC.npy',mmap_mode = 'r'),np.memmap)
+    for var in ['XC','YC','Z','dZl','CS','SN']:
+        assert np.array_equal(warm[var],cold[var])
+    x = np.linspace(-170,170,50)
+    y = np.linspace(-70,80,50)
+    assert np.array_equal(warm.index.query(x,y),cold.index.query(x,y))
+    keyed = OceData(llc_ds,cache_dir = str(tmp_path),cache_key = 'llc24')
+    assert keyed.cache.path != cold.cache.path
+
+@pytest.fixture
+def dump_masks(monkeypatch):
+    import OceInterp.get_masks as gm
+    from OceInterp.RuntimeConf import rcParam
+    monkeypatch.setitem(rcParam,'dump_masks_to_local',True)
+    monkeypatch.setattr(gm,'derived_masks',{})
+    calls = []
+    unmask_interface = gm.unmask_interface
+    def counting(level,tend,edge):
+        calls.append(tend)
+        return unmask_interface(level,tend,edge)
+    monkeypatch.setattr(gm,'unmask_interface',counting)
+    def fresh():
+        # forget the masks derived in this process
+        gm.derived_masks.clear()
+        calls.clear()
+        return calls
+    return fresh
+
+def test_mask_cache(llc_ds,tmp_path,dump_masks):
+    calls = dump_masks()
+    od = OceData(llc_ds,cache_dir = str(tmp_path))
+    maskU = od.masks.get('U').to_array()
+    assert len(calls)>0
+    # read back from the cache, not derived again
+    calls = dump_masks()
+    assert np.array_equal(OceData(llc_ds,cache_dir = str(tmp_path)).masks.get('U').to_array(),maskU)
+    assert len(calls) == 0
+    assert od.cache.load_mask('maskU','not the checksum') is None
+
+def test_corrupt_mask_cache(llc_ds,tmp_path,dump_masks):
+    dump_masks()
+    od = OceData(llc_ds,cache_dir = str(tmp_path))
+    maskU = od.masks.get('U').to_array()
+    fname = od.cache.mask_path()+'/maskU.npz'
+    with open(fname,'wb') as f:
+        f.write(b'not a mask')
+    calls = dump_masks()
+    again = OceData(llc_ds,cache_dir = str(tmp_path))
+    assert np.array_equal(again.masks.get('U').to_array(),maskU)
+    assert len(calls)>0
+    # and the cache is fixed
+    assert again.cache.load_mask('maskU',again.masks.checksum()) is not None
+
+def test_mask_cache_other_maskC(llc_ds,tmp_path,dump_masks):
+    dump_masks()
+    OceData(llc_ds,cache_dir = str(tmp_path)).masks.get('U')
+    # same grid, one more dry level everywhere
+    ds = llc_ds.copy()
+    maskC = np.array(ds['maskC'])
+    maskC[-1] = 0
+    ds['maskC'] = (ds['maskC'].dims,maskC)
+    calls = dump_masks()
+    od = OceData(ds,cache_dir = str(tmp_path))
+    assert len(calls) == 0
+    maskU = od.masks.get('U').to_array()
+    assert len(calls)>0
+    assert not maskU[-1].any()
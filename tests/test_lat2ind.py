@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from OceInterp.lat2ind import bisect_nearest,find_ind_z,find_ind_t,find_rel_z,find_rel_time
+
+def axes():
+    rng = np.random.default_rng(0)
+    # non-uniform, like the vertical grid of a model
+    z = -np.cumsum(rng.uniform(1,200,50))
+    t = np.cumsum(rng.uniform(1,10,30))*3600
+    # repeated values, ties go to the first
+    rep = np.array([0.,1.,1.,1.,2.,4.,4.,8.])
+    return {'z descending':z,'t ascending':t,
+            'repeated':rep,'repeated descending':rep[::-1].copy()}
+
+@pytest.mark.parametrize('name',list(axes().keys()))
+def test_bisect_matches_argmin(name):
+    array = axes()[name]
+    lo,hi = array.min(),array.max()
+    span = hi-lo
+    rng = np.random.default_rng(1)
+    values = np.concatenate([
+        rng.uniform(lo-span/10,hi+span/10,2000),
+        array,
+        # exactly half way between two neighbours
+        (array[1:]+array[:-1])/2,
+    ])
+    for value in values:
+        assert bisect_nearest(array,value) == np.argmin(np.abs(array-value))
+
+def test_bisect_nan():
+    assert bisect_nearest(axes()['t ascending'],np.nan) == 0
+
+def test_locators_match_argmin():
+    z = axes()['z descending']
+    t = axes()['t ascending']
+    rng = np.random.default_rng(2)
+    depth = rng.uniform(z[-2],0,500)
+    time = rng.uniform(t[1],t[-1],500)
+    def argmin_z(value):
+        idx = np.argmin(np.abs(z-value))
+        return idx+1 if z[idx]>value else idx
+    def argmin_t(value):
+        idx = np.argmin(np.abs(t-value))
+        return idx-1 if t[idx]>value else idx
+    assert [find_ind_z(z,d)[0] for d in depth] == [argmin_z(d) for d in depth]
+    assert [find_ind_t(t,s)[0] for s in time] == [argmin_t(s) for s in time]
+    dz = np.abs(np.diff(np.concatenate([[0.],z])))
+    iz,rz,_,bz = find_rel_z(depth,z,dz)
+    assert np.array_equal(iz,[argmin_z(d) for d in depth])
+    assert np.allclose(rz,(depth-bz)/dz[iz.astype(int)])
+    it,rt,dt,bt = find_rel_time(time,t)
+    assert np.array_equal(it,[argmin_t(s) for s in time])
+    assert ((0<=rt)&(rt<1)).all()
@@ -0,0 +1,45 @@
+import numpy as np
+
+import OceInterp as oi
+from OceInterp.eulerian import position
+from OceInterp.lat2ind import find_px_py
+
+def test_wrap_column_corners(xper):
+    # the east corners of the last column are the west corners of the first
+    ny,nx = xper.XG.shape
+    iy = np.arange(1,ny-1)
+    px,py = find_px_py(xper.XG,xper.YG,xper.tp,iy,np.full(len(iy),nx-1))
+    assert np.allclose(px[0],xper.XG[iy,nx-1])
+    assert np.allclose(px[1],xper.XG[iy,0])
+    assert np.allclose(px[2],xper.XG[iy+1,0])
+    assert np.allclose(py[3],xper.YG[iy+1,nx-1])
+
+def test_wrap_column_rx(xper):
+    # 179.5 is 2 degrees east of the center of the 5 degree cell at 177.5,
+    # this used to be nan (and a crash in particle runs)
+    y = np.linspace(-20,20,9)
+    p = position().from_latlon(x = np.full(9,179.5),y = y,data = xper)
+    assert (p.ix == xper.XC.shape[-1]-1).all()
+    assert np.allclose(p.rx,0.4)
+    assert np.isfinite(p.ry).all()
+
+def test_corner_table_is_lazy(xper_ds):
+    od = oi.OceData(xper_ds)
+    position().from_latlon(x = np.array([10.]),y = np.array([5.]),data = od)
+    assert od.__dict__.get('_corners') is None
+    table = od.corners()
+    ind = np.indices(od.XG.shape).reshape(2,-1)
+    px,py = find_px_py(od.XG,od.YG,od.tp,*ind)
+    assert np.array_equal(table[0],px) and np.array_equal(table[1],py)
+
+def test_particles_cross_the_wrap(xper):
+    # solid body rotation, eastward everywhere
+    N = 9
+    y = np.linspace(-20,20,N)
+    x = np.full(N,179.5)
+    z = np.full(N,-5.)
+    t = np.array([xper.ts[0],xper.ts[-1]])
+    stops,R = oi.OceInterp(xper,['__particle.lon','__particle.lat'],x,y,z,t,lagrangian = True)
+    lon,lat = R[0][-1],R[1][-1]
+    assert np.isfinite(lon).all() and np.isfinite(lat).all()
+    assert ((lon>-180)&(lon<-179)).all()
@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+
+from OceInterp.OceData import OceData
+from OceInterp.get_masks import MaskManager,DerivedMask
+from OceInterp.compact_mask import KmtMask,PackedMask,compact_mask,column_kmt
+
+def old_derivation(maskC,tp,gridtype):
+    '''
+    how get_masks used to derive maskU,maskV,maskWvel,
+    one dry point at a time through tp.ind_tend_vec.
+    '''
+    if gridtype == 'Wvel':
+        temp = np.zeros_like(maskC)
+        temp[1:] = maskC[:-1]
+        return np.logical_or(temp,maskC).astype(int)
+    tend = {'U':2,'V':1}[gridtype]
+    mask = maskC.copy()
+    indexes = np.array(np.where(maskC == 0)).T
+    nind = tp.ind_tend_vec(indexes.T[1:],np.ones_like(indexes.T[0],int)*tend)
+    nind = np.vstack([indexes.T[0],nind])
+    switch = indexes[np.where(maskC[tuple(nind)])]
+    mask[tuple(switch.T)] = 1
+    return mask
+
+def random_index(shape,n,seed = 0):
+    rng = np.random.default_rng(seed)
+    return tuple([rng.integers(0,s,n) for s in shape])
+
+class Levels(object):
+    '''
+    a mask that can only be read one level at a time.
+    '''
+    def __init__(self,mask):
+        self.mask = mask
+        self.shape = mask.shape
+        self.read = []
+
+    def __getitem__(self,k):
+        assert isinstance(k,int)
+        self.read.append(k)
+        return self.mask[k]
+
+@pytest.mark.parametrize('name',['llc_ds','xper_ds','box_ds'])
+@pytest.mark.parametrize('gridtype',['U','V','Wvel'])
+def test_derived_mask_level_by_level(request,name,gridtype):
+    ds = request.getfixturevalue(name)
+    od = OceData(ds)
+    maskC = np.array(ds['maskC'])
+    expected = old_derivation(maskC,od.tp,gridtype)
+    levels = Levels(maskC)
+    derived = DerivedMask(levels,od.tp,gridtype)
+    assert levels.read == []
+    for k in range(maskC.shape[0]):
+        assert np.array_equal(derived[k],expected[k])
+    # every level of maskC is read once
+    assert levels.read == list(range(maskC.shape[0]))
+    assert np.array_equal(np.asarray(derived),expected)
+
+@pytest.mark.parametrize('name',['llc_ds','xper_ds','box_ds'])
+@pytest.mark.parametrize('gridtype',['C','U','V','Wvel'])
+def test_mask_manager_matches_get_masks(request,name,gridtype):
+    ds = request.getfixturevalue(name)
+    od = OceData(ds)
+    maskC = np.array(ds['maskC'])
+    if gridtype == 'C':
+        expected = maskC
+    else:
+        expected = old_derivation(maskC,od.tp,gridtype)
+    compact = MaskManager(od).get(gridtype)
+    assert np.array_equal(compact.to_array(),expected!=0)
+    ind = random_index(maskC.shape,5000)
+    assert np.array_equal(MaskManager(od).lookup(ind,gridtype = gridtype),expected[ind]!=0)
+
+def test_kmt_and_packed(llc_ds):
+    maskC = np.array(llc_ds['maskC'])
+    # the synthetic sea floor is wet from the surface down
+    kmt = column_kmt(maskC)
+    assert kmt is not None
+    assert isinstance(compact_mask(maskC),KmtMask)
+    ind = random_index(maskC.shape,20000,seed = 1)
+    for mask in [KmtMask(maskC),PackedMask(maskC)]:
+        assert np.array_equal(mask.to_array(),maskC!=0)
+        assert np.array_equal(mask.lookup(ind),maskC[ind]!=0)
+    # index arrays of any shape, broadcast like numpy
+    ind2 = tuple([i.reshape(100,200) for i in ind])
+    assert np.array_equal(KmtMask(maskC).lookup(ind2),maskC[ind2]!=0)
+
+def test_packed_for_any_mask(llc_ds):
+    rng = np.random.default_rng(2)
+    mask = (rng.random(np.shape(llc_ds['maskC']))>0.5).astype('float32')
+    assert column_kmt(mask) is None
+    compact = compact_mask(mask)
+    assert isinstance(compact,PackedMask)
+    with pytest.raises(ValueError):
+        KmtMask(mask)
+    ind = random_index(mask.shape,20000,seed = 3)
+    assert np.array_equal(compact.lookup(ind),mask[ind]!=0)
+
+def test_masks_derived_once(llc_ds,monkeypatch):
+    import OceInterp.get_masks as gm
+    monkeypatch.setattr(gm,'derived_masks',{})
+    calls = []
+    unmask_interface = gm.unmask_interface
+    def counting(level,tend,edge):
+        calls.append(tend)
+        return unmask_interface(level,tend,edge)
+    monkeypatch.setattr(gm,'unmask_interface',counting)
+    nz = llc_ds['maskC'].shape[0]
+    first = OceData(llc_ds).masks.get('U')
+    assert len(calls) == nz
+    # a second OceData on the same grid shares the derived mask
+    second = OceData(llc_ds.copy()).masks.get('U')
+    assert second is first
+    assert len(calls) == nz
+
+def test_no_dense_mask(llc_ds,monkeypatch):
+    import tracemalloc
+    import OceInterp.get_masks as gm
+    # compile everything first
+    OceData(llc_ds).masks.get('U')
+    monkeypatch.setattr(gm,'derived_masks',{})
+    masks = OceData(llc_ds).masks
+    nbytes = llc_ds['maskC'].nbytes
+    tracemalloc.start()
+    for gridtype in ['C','U','V','Wvel']:
+        masks.get(gridtype)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # a few levels at a time, never the whole 3-D mask
+    assert peak<nbytes/2
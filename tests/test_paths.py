@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import OceInterp as oi
+from OceInterp.synthetic import sample_points
+
+# the streamed, reordered and lazy paths give the same numbers
+# as interpolating everything at once.
+
+varList = ['SALT',['UVELMASS','VVELMASS'],'ETAN']
+
+def flat(R):
+    out = []
+    for var,r in zip(varList,R):
+        out += [np.asarray(a) for a in r] if isinstance(var,list) else [np.asarray(r)]
+    return out
+
+@pytest.fixture(scope = 'module')
+def points(llc_ds):
+    return sample_points(llc_ds,3000,seed = 4)
+
+@pytest.fixture(scope = 'module')
+def reference(llc,points):
+    x,y,z,t = points
+    return flat(oi.OceInterp(llc,varList,x,y,z,t))
+
+@pytest.mark.parametrize('kwarg',[
+    dict(batch_memory = 2e5),
+    dict(reorder = True),
+    dict(reorder = True,batch_memory = 2e5),
+])
+def test_eager_paths(llc,points,reference,kwarg):
+    x,y,z,t = points
+    R = flat(oi.OceInterp(llc,varList,x,y,z,t,**kwarg))
+    for a,b in zip(R,reference):
+        assert np.array_equal(a,b,equal_nan = True)
+
+def test_stream_to_files(llc,points,reference,tmp_path):
+    x,y,z,t = points
+    R = flat(oi.OceInterp(llc,varList,x,y,z,t,batch_memory = 2e5,out = str(tmp_path)))
+    assert any([name.endswith('.npy') for name in [p.name for p in tmp_path.iterdir()]])
+    for a,b in zip(R,reference):
+        assert np.array_equal(a,b,equal_nan = True)
+
+def test_lazy(llc,points,reference):
+    dask = pytest.importorskip('dask')
+    x,y,z,t = points
+    R = oi.OceInterp(llc,varList,x,y,z,t,lazy = True,batch_memory = 2e5)
+    R = flat(dask.compute(R)[0])
+    for a,b in zip(R,reference):
+        assert np.array_equal(a,b,equal_nan = True)
+
+def test_lazy_partitions_are_compact(llc,points,monkeypatch):
+    dask = pytest.importorskip('dask')
+    import OceInterp.lazy as lazy
+    spans = []
+    interp_partition = lazy._interp_partition
+    def recording(od,varList,kernelList,x,y,z,t,reorder):
+        spans.append(np.ptp(y))
+        return interp_partition(od,varList,kernelList,x,y,z,t,reorder)
+    monkeypatch.setattr(lazy,'_interp_partition',recording)
+    x,y,z,t = points
+    R = oi.OceInterp(llc,['SALT'],x,y,z,t,lazy = True,batch_memory = 2e5)
+    dask.compute(R,scheduler = 'sync')
+    # scattered points, but each partition only covers a band of latitude
+    assert len(spans)>4
+    assert np.median(spans)<0.6*np.ptp(y)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+import OceInterp as oi
+from OceInterp.RuntimeConf import rcParam
+from OceInterp.synthetic import synthetic_dataset,sample_points
+
+@pytest.fixture(scope = 'module')
+def gyre():
+    ds = synthetic_dataset('LLC',size = 24,velocity = 'gyre',speed = 1.)
+    return ds,oi.OceData(ds)
+
+def in_both(f,monkeypatch):
+    R = {}
+    for precision in ['float64','float32']:
+        monkeypatch.setitem(rcParam,'precision',precision)
+        R[precision] = f()
+    return R['float64'],R['float32']
+
+def test_lagrangian_float32(gyre,monkeypatch):
+    ds,od = gyre
+    x,y,z,_ = sample_points(ds,500,seed = 1)
+    t = np.linspace(od.ts[0],od.ts[-1],13)
+    names = ['lon','lat','rx','ry']
+    def run():
+        stops,R = oi.OceInterp(od,['__particle.'+name for name in names],x,y,z,t,
+                               lagrangian = True,return_in_between = False)
+        return [np.asarray(r,'float64') for r in R]
+    (lon64,lat64,rx64,ry64),(lon32,lat32,rx,ry) = in_both(run,monkeypatch)
+    # no particle slips through a cell wall,
+    # the ones on a wall are a few meters off in float32
+    for a,b in [(rx64,rx),(ry64,ry)]:
+        assert (np.abs(b)<=np.maximum(np.abs(a),0.5)+1e-4).all()
+    # over 3 days, the float32 particles stay within 1e-2 degree
+    dlon = ((lon32-lon64+180)%360-180)*np.cos(np.deg2rad(lat64))
+    d = np.sqrt(dlon**2+(lat32-lat64)**2)
+    assert np.nanpercentile(d,99)<1e-3
+    assert np.nanmax(d)<1e-2
+
+def test_eulerian_float32(llc,llc_ds,monkeypatch):
+    x,y,z,t = sample_points(llc_ds,3000,seed = 2)
+    varList = ['SALT',['UVELMASS','VVELMASS'],'ETAN','WVELMASS']
+    def run():
+        R = oi.OceInterp(llc,varList,x,y,z,t)
+        return [R[0],R[1][0],R[1][1],R[2],R[3]]
+    R64,R32 = in_both(run,monkeypatch)
+    for a,b in zip(R64,R32):
+        assert np.array_equal(np.isnan(a),np.isnan(b))
+        scale = np.nanmax(np.abs(a))
+        assert np.nanmax(np.abs(a-b))<=1e-6*scale
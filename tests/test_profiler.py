@@ -0,0 +1,40 @@
+import numpy as np
+
+import OceInterp as oi
+from OceInterp import profiler
+from OceInterp.RuntimeConf import rcParam
+from OceInterp.synthetic import sample_points
+
+def test_counters(llc,llc_ds,monkeypatch):
+    x,y,z,t = sample_points(llc_ds,400,seed = 3)
+    monkeypatch.setitem(rcParam,'profile',True)
+    oi.OceInterp(llc,['SALT',['UVELMASS','VVELMASS']],x,y,z,t)
+    R = profiler.last_report()
+    # the points are located once for all the variables
+    assert R['counters']['points'] == len(x)
+    assert R['counters']['read_bytes']>0
+    for name in ['locate','fatten','mask','weight','contract']:
+        assert R['timers'][name]['calls']>0,name
+        assert R['timers'][name]['total']>=0
+    df = profiler.last_report(as_frame = True)
+    assert df.loc['points','count'] == len(x)
+
+    # each call starts afresh
+    oi.OceInterp(llc,['SALT'],x[:100],y[:100],z[:100],t[:100])
+    assert profiler.last_report()['counters']['points'] == 100
+
+def test_lagrangian_steps(llc,llc_ds,monkeypatch):
+    x,y,z,_ = sample_points(llc_ds,100,seed = 4)
+    t = np.linspace(llc.ts[0],llc.ts[-1],3)
+    monkeypatch.setitem(rcParam,'profile',True)
+    oi.OceInterp(llc,['__particle.lon'],x,y,z,t,lagrangian = True)
+    R = profiler.last_report()
+    assert R['counters']['steps']>0
+    assert R['timers']['step']['calls'] == R['counters']['steps']
+
+def test_off(llc,llc_ds,monkeypatch):
+    x,y,z,t = sample_points(llc_ds,100,seed = 3)
+    monkeypatch.setitem(rcParam,'profile',False)
+    profiler.reset()
+    oi.OceInterp(llc,['SALT'],x,y,z,t)
+    assert profiler.report() == {'timers':{},'counters':{}}
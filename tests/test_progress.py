@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from OceInterp import progress as pg
+from OceInterp.RuntimeConf import rcParam
+from OceInterp.lagrangian import particle
+from OceInterp.synthetic import sample_points
+
+class clock(object):
+    def __init__(self):
+        self.now = 0.
+    def __call__(self):
+        return self.now
+
+def test_interval(monkeypatch):
+    fake = clock()
+    monkeypatch.setattr(pg.time,'perf_counter',fake)
+    seen = []
+    p = pg.progress(callback = seen.append,interval = 5.)
+    p.start(3)
+    for second in range(1,13):
+        fake.now = float(second)
+        p.step(10,2)
+    # at most one report every 5 seconds
+    assert [s['elapsed'] for s in seen] == [5.,10.]
+    assert seen[-1]['steps'] == 100
+    assert seen[-1]['crossings'] == 20
+    assert seen[-1]['steps_per_s'] == 10.
+    p.end_stop(0,100.)
+    assert len(seen) == 2
+    fake.now = 15.
+    p.end_stop(1,200.)
+    assert seen[-1]['stop'] == 2
+    assert seen[-1]['left'] == 0
+    assert seen[-1]['eta'] == pytest.approx(7.5)
+    # the last stop is always reported
+    fake.now = 16.
+    p.end_stop(2,300.)
+    assert seen[-1]['stop'] == 3
+    assert seen[-1]['eta'] == 0.
+
+def test_make_progress(monkeypatch):
+    monkeypatch.setitem(rcParam,'progress',False)
+    assert pg.make_progress(None) is None
+    assert pg.make_progress(False) is None
+    monkeypatch.setitem(rcParam,'progress_interval',3.)
+    p = pg.make_progress(True)
+    assert p.callback is pg.log_status
+    assert p.interval == 3.
+    assert pg.make_progress(p) is p
+    assert pg.make_progress(print).callback is print
+    with pytest.raises(ValueError):
+        pg.make_progress('yes')
+
+def test_particle(llc,llc_ds):
+    x,y,z,_ = sample_points(llc_ds,100,seed = 4)
+    stops = np.linspace(llc.ts[0],llc.ts[-1],4)[1:]
+    seen = []
+    p = particle(x = x,y = y,z = z,t = np.ones_like(x)*llc.ts[0],data = llc,
+                 progress = pg.progress(callback = seen.append,interval = 0.))
+    p.to_list_of_time(stops)
+    ends = [s for s in seen if s['left'] == 0]
+    assert ends[-1]['stop'] == ends[-1]['n_stops']
+    assert ends[-1]['t'] == stops[-1]
+    assert ends[-1]['steps']>=len(x)
+    steps = [s['steps'] for s in seen]
+    assert steps == sorted(steps)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import OceInterp as oi
+
+varList = ['SALT',['UVELMASS','VVELMASS'],'ETAN']
+
+def flat(R):
+    # a pair of variables comes back as a pair of arrays
+    out = []
+    for var,r in zip(varList,R):
+        out += [np.asarray(a) for a in r] if isinstance(var,list) else [np.asarray(r)]
+    return out
+
+@pytest.mark.parametrize('name,lon,lat',[
+    ('box',np.linspace(-28,-3,23),np.linspace(12,28,17)),
+    ('llc',np.linspace(-180,179,30),np.linspace(-60,80,17)),
+])
+def test_regrid_matches_meshgrid(request,name,lon,lat):
+    od = request.getfixturevalue(name)
+    z = np.array([-3.,-12.,-18.])
+    t = od.ts[1]+np.array([0,3600*5.])
+    T,Z,LAT,LON = np.meshgrid(t,z,lat,lon,indexing = 'ij')
+    ref = flat(oi.OceInterp(od,varList,LON.ravel(),LAT.ravel(),Z.ravel(),T.ravel()))
+    # small chunks, so that blocks of rows and depths are exercised
+    lazy = oi.OceRegrid(od,varList,lon,lat,z,t,max_points = 100)
+    assert lazy[0].shape == (2,3,len(lat),len(lon))
+    assert len(lazy[0].chunks[2])>1
+    eager = oi.OceRegrid(od,varList,lon,lat,z,t,max_points = 400,lazy = False)
+    for a,b,c in zip(flat(lazy),flat(eager),ref):
+        assert isinstance(b,np.ndarray)
+        assert np.array_equal(a.ravel(),c,equal_nan = True)
+        assert np.array_equal(b.ravel(),c,equal_nan = True)
+
+def test_regrid_2d(box):
+    lon = np.linspace(-28,-3,11)
+    lat = np.linspace(12,28,7)
+    t = od_t = box.ts[1:3]
+    eta, = oi.OceRegrid(box,'ETAN',lon,lat,t = t)
+    assert eta.shape == (2,7,11)
+    T,LAT,LON = np.meshgrid(od_t,lat,lon,indexing = 'ij')
+    ref, = oi.OceInterp(box,['ETAN'],LON.ravel(),LAT.ravel(),None,T.ravel())
+    assert np.array_equal(np.asarray(eta).ravel(),ref,equal_nan = True)
+
+def test_regrid_needs_axes(box):
+    lon = np.linspace(-28,-3,5)
+    lat = np.linspace(12,28,4)
+    with pytest.raises(ValueError,match = 'time'):
+        oi.OceRegrid(box,'ETAN',lon,lat)
+    with pytest.raises(ValueError,match = 'depth'):
+        oi.OceRegrid(box,'SALT',lon,lat,t = box.ts[1:2])
+
+def test_regrid_locates_by_block(box,monkeypatch):
+    import OceInterp.regrid as regrid
+    rows = []
+    locate_rows = regrid._locate_rows
+    def counting(od,lon,lat,kernelList):
+        rows.append(len(lat))
+        return locate_rows(od,lon,lat,kernelList)
+    monkeypatch.setattr(regrid,'_locate_rows',counting)
+    lon = np.linspace(-28,-3,23)
+    lat = np.linspace(12,28,17)
+    salt, = oi.OceRegrid(box,'SALT',lon,lat,np.array([-3.,-12.]),box.ts[1:3],max_points = 100)
+    # nothing is located while the graph is built
+    assert rows == []
+    salt.compute(scheduler = 'sync')
+    # every block of rows is located once, by its own task
+    assert sum(rows) == len(lat)
+    assert max(rows)*len(lon)<=100
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from OceInterp.kernelNweight import KnW
+from OceInterp.lagrangian import particle,uknw,vknw
+from OceInterp.snapshot import snapshots,snapshot_fields
+from OceInterp.synthetic import sample_points
+
+@pytest.fixture(scope = 'module')
+def run(llc,llc_ds):
+    x,y,z,_ = sample_points(llc_ds,200,seed = 6)
+    stops = np.linspace(llc.ts[0],llc.ts[-1],5)[1:]
+    p = particle(x = x,y = y,z = z,t = np.ones_like(x)*llc.ts[0],data = llc)
+    out,snaps = p.to_list_of_time(stops,return_in_between = False)
+    return p,stops,snaps
+
+def test_rows(run):
+    p,stops,snaps = run
+    assert isinstance(snaps,snapshots)
+    assert len(snaps) == len(stops)
+    for name in snapshot_fields:
+        a = snaps.stacked[name]
+        if a is None:
+            continue
+        assert a.shape == (len(stops),p.N)
+        if a.dtype.kind in 'iu':
+            assert a.dtype == np.int32
+    for snap,t in zip(snaps,stops):
+        assert np.allclose(snap.t,t)
+    # the last row is where the particles are now
+    last = snaps[-1]
+    for name in snapshot_fields:
+        if getattr(p,name) is None:
+            continue
+        a = getattr(last,name)
+        assert a.dtype == np.asarray(getattr(p,name)).dtype,name
+        assert np.array_equal(a,getattr(p,name),equal_nan = True),name
+    assert np.array_equal(last.cs,p.cs)
+    assert np.array_equal(last.izl,p.izl)
+    assert len(snaps[1:3]) == 2
+    # and it interpolates the same as the particle itself
+    assert np.array_equal(last.interpolate('SALT',KnW()),p.interpolate('SALT',KnW()),equal_nan = True)
+    with pytest.raises(IndexError):
+        snaps[len(stops)]
+
+def test_small(run):
+    p,stops,snaps = run
+    # a fraction of what a full particle copy per stop used to be
+    assert snaps.nbytes()<=100*p.N*len(stops)
+
+def test_full(llc,run):
+    p,stops,snaps = run
+    R = snapshots(llc,p.N,1)
+    R.append(p)
+    with pytest.raises(IndexError):
+        R.append(p)
+
+@pytest.mark.parametrize('batch_memory',[None,1])
+def test_batched(run,batch_memory):
+    p,stops,snaps = run
+    for var,knw in [('SALT',KnW()),(['UVELMASS','VVELMASS'],[uknw,vknw])]:
+        batched = snaps.interpolate(var,knw,batch_memory = batch_memory)
+        one_by_one = [snap.interpolate(var,knw) for snap in snaps]
+        assert len(batched) == len(one_by_one)
+        for a,b in zip(batched,one_by_one):
+            assert np.array_equal(np.asarray(a),np.asarray(b),equal_nan = True)
@@ -0,0 +1,92 @@
+import os
+import numpy as np
+import pytest
+
+from OceInterp.spatial_index import TreeIndex,BucketIndex,RectilinearIndex,is_rectilinear
+from OceInterp.synthetic import sample_points
+
+def unit(lon,lat):
+    lon = np.deg2rad(lon)
+    lat = np.deg2rad(lat)
+    return np.array([np.cos(lat)*np.cos(lon),np.cos(lat)*np.sin(lon),np.sin(lat)]).T
+
+def same_or_tie(XC,YC,x,y,a,b,tol = 1e-6):
+    '''
+    a and b pick the same point, or two points equally far from (x,y),
+    up to float32 rounding of the unit vectors.
+    '''
+    q = unit(x,y)
+    pa = unit(XC.ravel()[a],YC.ravel()[a])
+    pb = unit(XC.ravel()[b],YC.ravel()[b])
+    da = np.sqrt(((pa-q)**2).sum(axis = -1))
+    db = np.sqrt(((pb-q)**2).sum(axis = -1))
+    return (a == b)|(np.abs(da-db)<=tol*np.maximum(da,1e-3))
+
+def queries(ds,n = 3000,seed = 0):
+    # points in the water and points anywhere in the grid
+    x,y,_,_ = sample_points(ds,n,seed = seed,depth = False,time = False)
+    XC = np.asarray(ds['XC'])
+    YC = np.asarray(ds['YC'])
+    rng = np.random.default_rng(seed)
+    pick = rng.integers(0,XC.size,n)
+    x2 = XC.ravel()[pick]+rng.uniform(-1,1,n)
+    y2 = np.clip(YC.ravel()[pick]+rng.uniform(-1,1,n),-89,89)
+    return np.concatenate([x,(x2+180)%360-180]),np.concatenate([y,y2])
+
+@pytest.mark.parametrize('name',['llc_ds','xper_ds','box_ds'])
+def test_bucket_matches_tree(request,name):
+    ds = request.getfixturevalue(name)
+    XC = np.asarray(ds['XC'])
+    YC = np.asarray(ds['YC'])
+    x,y = queries(ds)
+    a = TreeIndex(XC,YC).query(x,y)
+    b = BucketIndex(XC,YC).query(x,y)
+    assert same_or_tie(XC,YC,x,y,a,b).all()
+    # near ties only
+    assert (a != b).mean()<0.01
+
+@pytest.mark.parametrize('name',['xper_ds','box_ds'])
+def test_rectilinear_matches_tree(request,name):
+    ds = request.getfixturevalue(name)
+    XC = np.asarray(ds['XC'])
+    YC = np.asarray(ds['YC'])
+    assert is_rectilinear(XC,YC)
+    x,y = queries(ds)
+    a = TreeIndex(XC,YC).query(x,y)
+    b = RectilinearIndex(XC,YC).query(x,y)
+    # the nearest lon and the nearest lat is the cell the point is in,
+    # the nearest point on the sphere can be a diagonal neighbour of it
+    inside = ((x>XC.min())&(x<XC.max())&(y>YC.min())&(y<YC.max()))
+    dlon = np.abs(np.diff(XC[0])).max()/2
+    dlat = np.abs(np.diff(YC[:,0])).max()/2
+    assert (np.abs(XC.ravel()[b]-x)[inside]<=dlon+1e-9).all()
+    assert (np.abs(YC.ravel()[b]-y)[inside]<=dlat+1e-9).all()
+    ay,ax = np.unravel_index(a,XC.shape)
+    by,bx = np.unravel_index(b,XC.shape)
+    assert (np.abs(ay-by)[inside]<=1).all() and (np.abs(ax-bx)[inside]<=1).all()
+    assert (a != b)[inside].mean()<0.05
+
+def test_bucket_outside_the_grid(box_ds):
+    # queries far off a regional grid only search its edge
+    XC = np.asarray(box_ds['XC'])
+    YC = np.asarray(box_ds['YC'])
+    rng = np.random.default_rng(1)
+    x = rng.uniform(60,180,500)
+    y = rng.uniform(-80,80,500)
+    b = BucketIndex(XC,YC).query(x,y)
+    d = ((unit(x,y)[:,None,:]-unit(XC.ravel(),YC.ravel())[None])**2).sum(axis = -1)
+    best = d.argmin(axis = 1)
+    assert same_or_tie(XC,YC,x,y,best,b).all()
+
+@pytest.mark.parametrize('cls',[TreeIndex,BucketIndex])
+def test_save_load(tmp_path,llc_ds,cls):
+    XC = np.asarray(llc_ds['XC'])
+    YC = np.asarray(llc_ds['YC'])
+    x,y = queries(llc_ds,n = 500)
+    index = cls(XC,YC)
+    index.save(str(tmp_path))
+    # nothing is pickled
+    assert not any([f.endswith('.pkl') for f in os.listdir(tmp_path)])
+    loaded = cls.load(str(tmp_path))
+    assert loaded.h_shape == index.h_shape
+    assert np.array_equal(loaded.query(x,y),index.query(x,y))
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import OceInterp as oi
+from OceInterp.topology import topology
+from OceInterp.synthetic import sample_points
+
+@pytest.mark.parametrize(
+    'ind,moves',[
+        ((0,5,0),[2,2]),
+        ((0,5,0),[2,1]),
+        ((0,0,0),[2,2]),
+    ]
+)
+def test_ind_moves_keeps_moves(llc_ds,ind,moves):
+    # crossing from face 0 to the rotated face 12
+    # used to rotate the caller's list of moves as well
+    tp = topology(llc_ds)
+    given = list(moves)
+    first = tp.ind_moves(ind,given)
+    assert given == moves
+    assert first[0] == 12
+    assert tp.ind_moves(ind,given) == first
+
+def test_ind_moves_independent_of_batch(llc):
+    # every point must get the same value alone
+    # as together with points whose kernel crosses to a rotated face
+    varList = ['SALT',['UVELMASS','VVELMASS']]
+    x,y,z,t = sample_points(llc._ds,200,seed = 3,near_edge = True)
+    together = oi.OceInterp(llc,varList,x,y,z,t)
+    for i in range(len(x)):
+        s = slice(i,i+1)
+        alone = oi.OceInterp(llc,varList,x[s],y[s],z[s],t[s])
+        assert np.allclose(alone[0],together[0][s],equal_nan = True)
+        for a,b in zip(alone[1],together[1]):
+            assert np.allclose(a,b[s],equal_nan = True)
+
+def test_four_matrix_off_grid_nodes():
+    # face -1 (off the grid) used to read the row of face 12
+    from OceInterp.topology import llc_four_matrix_for_uv
+    UfromU,UfromV,VfromU,VfromV = llc_four_matrix_for_uv(np.array([[12,-1,0],
+                                                                  [-1,3,4]]))
+    assert (UfromU[:,:2] == 1).all() and (UfromV[:,:2] == 0).all()
+    assert (UfromU[1] == 1).all() and (UfromV[1] == 0).all()
+    # 12 to 0 is a real rotation
+    assert UfromU[0,2] == 0 and UfromV[0,2] == -1
+    with pytest.raises(ValueError):
+        llc_four_matrix_for_uv(np.array([[0,7]]))